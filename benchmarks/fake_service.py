@@ -0,0 +1,159 @@
+import random
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from googleapiclient.errors import HttpError  # type: ignore
+from httplib2 import Response  # type: ignore
+
+
+class FakeRequest:
+    def __init__(self, service: "FakeService", response: Any) -> None:
+        self.service = service
+        self.response = response
+
+    def execute(self) -> Any:
+        self.service.calls += 1
+
+        if self.service.latency:
+            time.sleep(self.service.latency)
+
+        if self.service.random.random() < self.service.error_rate:
+            self.service.errors += 1
+            raise HttpError(Response({"status": 500}), b"Backend Error")
+
+        return self.response() if callable(self.response) else self.response
+
+
+class FakeSearchAnalytics:
+    def __init__(self, service: "FakeService") -> None:
+        self.service = service
+
+    def query(self, siteUrl: str, body: Dict[Any, Any]) -> FakeRequest:
+        return FakeRequest(self.service, lambda: self.service.page(body))
+
+
+class FakeSites:
+    def __init__(self, service: "FakeService") -> None:
+        self.service = service
+
+    def list(self) -> FakeRequest:
+        return FakeRequest(
+            self.service,
+            {
+                "siteEntry": [
+                    {
+                        "siteUrl": f"sc-domain:site-{idx}.com",
+                        "permissionLevel": "siteOwner",
+                    }
+                    for idx in range(self.service.sites_count)
+                ]
+            },
+        )
+
+
+class FakeSitemaps:
+    def __init__(self, service: "FakeService") -> None:
+        self.service = service
+
+    def list(self, siteUrl: str) -> FakeRequest:
+        return FakeRequest(
+            self.service,
+            {
+                "sitemap": [
+                    self.service.sitemap(siteUrl, path)
+                    for path in self.service.sitemap_paths(siteUrl)
+                ]
+            },
+        )
+
+    def get(self, siteUrl: str, feedpath: str) -> FakeRequest:
+        return FakeRequest(self.service, self.service.sitemap(siteUrl, feedpath))
+
+
+class FakeService:
+    """
+    Stands in for the object built by discovery.build, returns synthetic pages.
+
+    Pages are drawn from a small pre-generated pool so that generating rows does
+    not end up in the measurements.
+    """
+
+    def __init__(
+        self,
+        page_size: int = 25000,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        cardinality: int = 100000,
+        pool_size: int = 4,
+        sites_count: int = 10,
+        seed: int = 42,
+    ) -> None:
+        self.page_size = page_size
+        self.latency = latency
+        self.error_rate = error_rate
+        self.cardinality = cardinality
+        self.pool_size = pool_size
+        self.sites_count = sites_count
+        self.random = random.Random(seed)
+        self.calls = 0
+        self.errors = 0
+        self._pools: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+
+    def searchanalytics(self) -> FakeSearchAnalytics:
+        return FakeSearchAnalytics(self)
+
+    def sites(self) -> FakeSites:
+        return FakeSites(self)
+
+    def sitemaps(self) -> FakeSitemaps:
+        return FakeSitemaps(self)
+
+    def sitemap_paths(self, site: str) -> List[str]:
+        domain = site.split(":")[-1].strip("/")
+        return [f"https://{domain}/sitemap-{idx}.xml" for idx in range(3)]
+
+    def sitemap(self, site: str, path: str) -> Dict[str, Any]:
+        return {
+            "path": path,
+            "lastSubmitted": "2020-01-01T00:00:00.000Z",
+            "isPending": False,
+            "isSitemapsIndex": False,
+            "type": "sitemap",
+            "lastDownloaded": "2020-01-02T00:00:00.000Z",
+            "warnings": "1",
+            "errors": "0",
+            "contents": [{"type": "web", "submitted": "100", "indexed": "0"}],
+        }
+
+    def _generate(self, dimensions: Tuple[str, ...], date: str) -> Dict[str, Any]:
+        rows = []
+        for _ in range(self.page_size):
+            impressions = self.random.randint(1, 1000)
+            clicks = self.random.randint(0, impressions // 10)
+            rows.append(
+                {
+                    "keys": [
+                        (
+                            date
+                            if dim == "date"
+                            else f"{dim}-{self.random.randrange(self.cardinality)}"
+                        )
+                        for dim in dimensions
+                    ],
+                    "clicks": clicks,
+                    "impressions": impressions,
+                    "ctr": clicks / impressions,
+                    "position": self.random.uniform(1, 100),
+                }
+            )
+        return {"rows": rows, "responseAggregationType": "byProperty"}
+
+    def page(self, body: Dict[Any, Any]) -> Dict[str, Any]:
+        dimensions = tuple(body.get("dimensions", []))
+        pool = self._pools.setdefault(dimensions, [])
+
+        if len(pool) < self.pool_size:
+            pool.append(self._generate(dimensions, body.get("startDate", "2020-01-01")))
+            return pool[-1]
+
+        return pool[self.random.randrange(self.pool_size)]
@@ -0,0 +1,280 @@
+"""
+End-to-end throughput benchmarks against a fake Search Console service.
+
+    python -m benchmarks.run --sizes 100000 1000000 --compare benchmarks/results/old.json
+
+Every (size, export) case runs in its own process, so peak memory is not shared
+between cases.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from seoman.utils.profile_utils import peak_rss
+
+EXPORTS = ["csv", "tsv", "json", "xlsx", "table"]
+
+EXPORT_METHODS = {
+    "csv": "export_to_csv",
+    "tsv": "export_to_tsv",
+    "json": "export_to_json",
+    "xlsx": "export_to_excel",
+}
+
+RESULTS_PATH = Path(__file__).parent / "results"
+
+
+def run_case(
+    size: int, export: str, config: Dict[str, Any], tmpdir: str
+) -> List[Dict[str, Any]]:
+    """
+    Fetch `size` rows from the fake service then export them, in a fresh process.
+    """
+
+    import typer  # type: ignore
+
+    from seoman import auth  # noqa: F401, imports the service without a cycle
+    from seoman.service import SearchAnalytics
+    from seoman.utils.export_utils import Export
+
+    from .fake_service import FakeService
+
+    # Pages are exactly 25.000 rows, do not ask to fetch the next ones.
+    typer.confirm = lambda *args, **kwargs: False
+
+    fake = FakeService(
+        page_size=config["page_size"],
+        latency=config["latency"],
+        error_rate=config["error_rate"],
+        cardinality=config["cardinality"],
+    )
+    service = SearchAnalytics(fake, credentials=None)
+
+    stub = None
+    if config.get("concurrency"):
+        from seoman.utils.transport_utils import AsyncTransport
+
+        from .stub_server import StubServer
+
+        # Same pages, served over HTTP and fetched with the async transport.
+        stub = StubServer(fake, latency=fake.latency).start()
+        fake.latency = 0.0
+        service.transport = AsyncTransport(
+            base_url=stub.base_url, concurrency=config["concurrency"]
+        )
+
+    filename = os.path.join(tmpdir, f"benchmark-{size}.{export}")
+
+    pipeline = None
+    if config.get("workers") and export in ("csv", "json"):
+        from seoman.utils.pipeline_utils import Pipeline
+
+        # Pages are exported while fetching, the export stage is what is left after.
+        pipeline = service.data["rows"] = Pipeline(
+            filename=filename, file_format=export, workers=config["workers"]
+        )
+
+    start = date(2020, 1, 1)
+    windows = max(size // config["page_size"], 1)
+    service.update_body(
+        {
+            "startDate": str(start),
+            # The last date of the range is not requested on its own.
+            "endDate": str(start + timedelta(days=windows)),
+            "dimensions": ["date", "query", "page"],
+        }
+    )
+
+    results = []
+
+    started = time.perf_counter()
+    service.concurrent_query_asyncio(url="sc-domain:example.com", granularity="daily")
+    elapsed = time.perf_counter() - started
+    rows = (
+        pipeline.row_count
+        if pipeline is not None
+        else sum(len(page) for page in service.data.get("rows", []))
+    )
+
+    if stub is not None:
+        stub.stop()
+
+    results.append(
+        {
+            "size": size,
+            "stage": "fetch",
+            "rows": rows,
+            "seconds": elapsed,
+            "rows_per_second": rows / elapsed if elapsed else None,
+            "peak_rss_mb": peak_rss(),
+            "api_calls": fake.calls,
+            "api_errors": fake.errors,
+        }
+    )
+
+    exporter = Export(service.data)
+
+    # Spinners and tables write to the terminal, silence them on the descriptor level.
+    stdout = os.dup(1)
+    started = time.perf_counter()
+    with open(os.devnull, "w") as devnull:
+        os.dup2(devnull.fileno(), 1)
+        try:
+            if pipeline is not None:
+                pipeline.close()
+            elif export == "table":
+                # Every row, like the other exports write them.
+                exporter.export_to_table(limit=rows)
+            else:
+                getattr(exporter, EXPORT_METHODS[export])(filename=filename)
+        finally:
+            sys.stdout.flush()
+            os.dup2(stdout, 1)
+            os.close(stdout)
+    elapsed = time.perf_counter() - started
+
+    results.append(
+        {
+            "size": size,
+            "stage": export,
+            "rows": rows,
+            "seconds": elapsed,
+            "rows_per_second": rows / elapsed if elapsed else None,
+            "peak_rss_mb": peak_rss(),
+        }
+    )
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return (
+            subprocess.check_output(
+                ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL
+            )
+            .decode()
+            .strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str) -> None:
+    """
+    Print the change in throughput compared to an older result file.
+    """
+
+    with open(baseline_path) as file:
+        baseline = {
+            (result["size"], result["stage"]): result
+            for result in json.load(file)["results"]
+        }
+
+    print(f"\nCompared to {baseline_path}")
+    for result in results:
+        old = baseline.get((result["size"], result["stage"]))
+        if not old or not old.get("rows_per_second") or not result["rows_per_second"]:
+            continue
+
+        change = result["rows_per_second"] / old["rows_per_second"] - 1
+        print(f"{result['size']:>10} {result['stage']:<6} {change:+.1%} rows/sec")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[100000, 1000000, 5000000]
+    )
+    parser.add_argument("--exports", nargs="+", default=EXPORTS, choices=EXPORTS)
+    parser.add_argument("--page-size", type=int, default=25000)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds per API call."
+    )
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--cardinality", type=int, default=100000)
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=0,
+        help="Fetch through the async transport from a local stub server.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Export csv and json while fetching, in this many processes.",
+    )
+    parser.add_argument("--output", help="Where to write the results as JSON.")
+    parser.add_argument("--compare", help="Result file to compare with.")
+    args = parser.parse_args(argv)
+
+    import tempfile
+
+    config = {
+        "page_size": args.page_size,
+        "latency": args.latency,
+        "error_rate": args.error_rate,
+        "cardinality": args.cardinality,
+        "concurrency": args.concurrency,
+        "workers": args.workers,
+    }
+    results: List[Dict[str, Any]] = []
+    context = multiprocessing.get_context("spawn")
+
+    with tempfile.TemporaryDirectory(prefix="seoman-benchmark-") as tmpdir:
+        for size in args.sizes:
+            for export in args.exports:
+                # Not a multiprocessing.Pool, its daemonic workers can not start
+                # the export pipeline's processes.
+                with ProcessPoolExecutor(1, mp_context=context) as pool:
+                    case = pool.submit(run_case, size, export, config, tmpdir).result()
+
+                # Fetch is measured in every case, keep the first one.
+                for result in case:
+                    if result["stage"] == "fetch" and any(
+                        r["size"] == size and r["stage"] == "fetch" for r in results
+                    ):
+                        continue
+                    results.append(result)
+                    print(
+                        f"{result['size']:>10} {result['stage']:<6} "
+                        f"{result['seconds']:8.2f}s {result['rows_per_second'] or 0:12,.0f} rows/sec "
+                        f"{result['peak_rss_mb'] or 0:8.0f} MB"
+                    )
+
+    commit = git_commit()
+    output = args.output or str(
+        RESULTS_PATH
+        / f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{commit or 'local'}.json"
+    )
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+
+    with open(output, "w") as file:
+        json.dump(
+            {
+                "commit": commit,
+                "created": datetime.now().isoformat(),
+                "python": sys.version.split()[0],
+                "config": config,
+                "results": results,
+            },
+            file,
+            indent=4,
+        )
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""
+Local HTTP stand-in for the Search Analytics query endpoint, backed by FakeService.
+
+    python -m benchmarks.stub_server --port 8080 --latency 0.2
+
+Point an AsyncTransport at it with base_url="http://127.0.0.1:8080/webmasters/v3/".
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+from .fake_service import FakeService
+
+
+class _Server(ThreadingHTTPServer):
+    # The default listen backlog of 5 drops connections under load.
+    request_queue_size = 128
+    daemon_threads = True
+
+
+class StubServer:
+    """
+    Serves FakeService pages over HTTP/1.1 keep-alive connections from a thread.
+
+    Latency is slept per request without holding the lock, so concurrent
+    requests overlap like they do against the real API. `requests` records
+    (site, body, headers) of every query for checking what a client sent.
+
+    For testing clients, framing picks how responses are delimited:
+    "content-length", "chunked", "close" (with a Connection: close header)
+    or "eof" (neither, the connection is closed after the body). With
+    drop_reused a keep-alive connection is closed, without a response, when
+    a second request comes on it, like a server that timed it out.
+    raw_responses are written as they are to the next queries, then the
+    connection is closed.
+    """
+
+    FRAMINGS = ["content-length", "chunked", "close", "eof"]
+
+    def __init__(
+        self,
+        fake: FakeService,
+        port: int = 0,
+        latency: float = 0.0,
+        error_statuses: Optional[List[int]] = None,
+        framing: str = "content-length",
+        drop_reused: bool = False,
+        raw_responses: Optional[List[bytes]] = None,
+    ) -> None:
+        if framing not in self.FRAMINGS:
+            raise ValueError(f"Unknown framing {framing}")
+
+        self.fake = fake
+        self.latency = latency
+        # Statuses to answer the next requests with, one per request.
+        self.error_statuses = list(error_statuses or [])
+        self.framing = framing
+        self.drop_reused = drop_reused
+        self.raw_responses = list(raw_responses or [])
+        self.dropped = 0
+        self.requests: List[Tuple[str, Dict[str, Any], Dict[str, str]]] = []
+        self.connections = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        self.server = _Server(("127.0.0.1", port), self._handler())
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}/webmasters/v3/"
+
+    def _handler(self) -> Any:
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self) -> None:
+                super().setup()
+                # One handler per connection.
+                self.handled = 0
+                with stub.lock:
+                    stub.connections += 1
+
+            def _reply(self, status: int, content: Dict[str, Any]) -> None:
+                payload = json.dumps(content).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+
+                if stub.framing == "chunked":
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    for start in range(0, len(payload), 1000):
+                        chunk = payload[start : start + 1000]
+                        self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                    self.wfile.write(b"0\r\n\r\n")
+                    return
+
+                if stub.framing == "eof":
+                    self.end_headers()
+                    self.wfile.write(payload)
+                    self.close_connection = True
+                    return
+
+                self.send_header("Content-Length", str(len(payload)))
+                if stub.framing == "close":
+                    # Also makes the handler close the connection.
+                    self.send_header("Connection", "close")
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _dropped(self) -> bool:
+                """
+                Close the connection without a response, if the stub is told to.
+                """
+
+                self.handled += 1
+                with stub.lock:
+                    raw = stub.raw_responses.pop(0) if stub.raw_responses else None
+                    drop = raw is None and stub.drop_reused and self.handled > 1
+                    stub.dropped += drop
+
+                if raw is not None:
+                    self.wfile.write(raw)
+                self.close_connection = raw is not None or drop
+                return self.close_connection
+
+            def do_POST(self) -> None:
+                from urllib.parse import unquote
+
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                parts = self.path.split("/")
+
+                if parts[-1] != "query" or "sites" not in parts:
+                    self._reply(404, {"error": {"code": 404, "message": "Not Found"}})
+                    return
+
+                site = unquote(parts[parts.index("sites") + 1])
+
+                if self._dropped():
+                    return
+
+                with stub.lock:
+                    stub.requests.append((site, body, dict(self.headers.items())))
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                    status = stub.error_statuses.pop(0) if stub.error_statuses else 200
+
+                try:
+                    if stub.latency:
+                        time.sleep(stub.latency)
+
+                    if status != 200:
+                        self._reply(
+                            status,
+                            {"error": {"code": status, "message": "Stub error"}},
+                        )
+                        return
+
+                    with stub.lock:
+                        stub.fake.calls += 1
+                        page = stub.fake.page(body)
+                    self._reply(200, page)
+                finally:
+                    with stub.lock:
+                        stub.in_flight -= 1
+
+            def do_GET(self) -> None:
+                from urllib.parse import unquote
+
+                parts = [unquote(part) for part in self.path.split("/")]
+
+                if "sitemaps" not in parts or "sites" not in parts:
+                    self._reply(404, {"error": {"code": 404, "message": "Not Found"}})
+                    return
+
+                site = parts[parts.index("sites") + 1]
+                feedpath = parts[parts.index("sitemaps") + 1 :]
+
+                with stub.lock:
+                    stub.requests.append((site, {}, dict(self.headers.items())))
+                    status = stub.error_statuses.pop(0) if stub.error_statuses else 200
+
+                if stub.latency:
+                    time.sleep(stub.latency)
+
+                if status != 200:
+                    self._reply(
+                        status, {"error": {"code": status, "message": "Stub error"}}
+                    )
+                elif feedpath:
+                    self._reply(200, stub.fake.sitemap(site, feedpath[0]))
+                else:
+                    self._reply(
+                        200,
+                        {
+                            "sitemap": [
+                                stub.fake.sitemap(site, path)
+                                for path in stub.fake.sitemap_paths(site)
+                            ]
+                        },
+                    )
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+        return Handler
+
+    def start(self) -> "StubServer":
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> "StubServer":
+        return self.start()
+
+    def __exit__(self, *args: Any) -> None:
+        self.stop()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds per API call."
+    )
+    args = parser.parse_args(argv)
+
+    stub = StubServer(
+        FakeService(page_size=args.page_size), port=args.port, latency=args.latency
+    )
+    print(f"Serving on {stub.base_url}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
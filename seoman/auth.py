@@ -12,6 +12,8 @@ from google_auth_oauthlib.flow import InstalledAppFlow  # type: ignore
 from .exceptions import BrokenFileError
 from .service import SearchAnalytics
 from .utils import selector_utils
+from .utils.pool_utils import CredentialPool, PoolMember
+from .utils.quota_utils import QuotaManager, project_key
 
 
 def authenticate(
@@ -111,10 +113,17 @@ def authenticate(
 
 
 def load_service(
-    credentials: Optional[str] = f"{Path.cwd()}/credentials.json",
+    credentials: Optional[str] = f"{Path.cwd()}/credentials.json", quota: bool = False,
 ) -> SearchAnalytics:
+    """
+    quota shares the Search Analytics quota with the other seoman processes,
+    for the commands that send Search Analytics queries.
+    """
 
     service = authenticate(credentials=credentials)
+    if quota:
+        # Several seoman processes can run against the same project, from cron etc.
+        service.quota = QuotaManager(project=project_key(service.credentials))
     return service
 
 
@@ -156,3 +165,75 @@ def get_authenticated(
         bold=True,
     )
     return service
+
+
+def load_credentials(path: str) -> Any:
+    """
+    Credentials from a credentials.json seoman wrote or a service account key.
+    """
+
+    try:
+        with open(path, "r") as f:
+            info = json.load(f)
+    except FileNotFoundError:
+        raise BrokenFileError(f"{path} not found")
+    except ValueError:
+        raise BrokenFileError(f"{path} is not a JSON file")
+
+    if info.get("type") == "service_account":
+        from google.oauth2 import service_account  # type: ignore
+
+        return service_account.Credentials.from_service_account_info(
+            info, scopes=["https://www.googleapis.com/auth/webmasters.readonly"]
+        )
+
+    try:
+        return Credentials(
+            token=info["token"],
+            refresh_token=info["refresh_token"],
+            id_token=info["id_token"],
+            token_uri=info["token_uri"],
+            client_id=info["client_id"],
+            client_secret=info["client_secret"],
+            scopes=info["scopes"],
+        )
+    except KeyError as error:
+        raise BrokenFileError(f"{path} has no {error.args[0]}")
+
+
+def load_pool(service: SearchAnalytics, paths: List[str]) -> CredentialPool:
+    """
+    Pool of the credentials of the service and the ones in paths.
+    """
+
+    members = [
+        PoolMember(service.service, service.credentials, service.quota, "default")
+    ]
+
+    for path in paths:
+        credentials = load_credentials(path)
+        quota = service.quota
+
+        if quota is not None and project_key(credentials) != quota.project:
+            quota = QuotaManager(
+                path=str(quota.path),
+                project=project_key(credentials),
+                site_qpm=quota.site_qpm,
+                project_qpm=quota.project_qpm,
+            )
+
+        members.append(
+            PoolMember(
+                discovery.build(
+                    serviceName="searchconsole",
+                    version="v1",
+                    credentials=credentials,
+                    cache_discovery=False,
+                ),
+                credentials,
+                quota,
+                path,
+            )
+        )
+
+    return CredentialPool(members)
@@ -0,0 +1,327 @@
+"""
+Search Analytics without the CLI: no prompts, progress bars, prints or exits.
+
+    from seoman.client import Client
+
+    client = Client.from_credentials("credentials.json")
+    body = {
+        "startDate": "2020-03-01",
+        "endDate": "2020-03-31",
+        "dimensions": ["date", "page"],
+    }
+
+    for row in client.query("sc-domain:example.com", body, granularity="daily"):
+        print(row.dimensions["page"], row.clicks)
+
+Rows are fetched as they are iterated over. Failures raise QueryError.
+Pages of 25,000 rows are fetched until a window has no more rows, or
+rowLimit rows if the body has one.
+"""
+
+import asyncio
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, NamedTuple, Optional
+
+from . import auth
+from .exceptions import InvalidParameterError, QueryError
+from .service import SearchAnalytics
+from .utils.config_utils import ALL_GRANULARITIES
+from .utils.frame_utils import pages_to_dataframe
+from .utils.service_utils import create_body_list, is_transient_error, query_errors
+from .utils.transport_utils import AsyncTransport
+
+Batch = Dict[str, List[Any]]
+
+PAGE_SIZE = 25000
+
+
+class Row(NamedTuple):
+    """
+    A row of a report, dimensions are by name, {"date": "2020-03-01", ...}
+    """
+
+    dimensions: Dict[str, str]
+    clicks: int
+    impressions: int
+    ctr: float
+    position: float
+
+
+def to_rows(dimensions: List[str], page: List[Dict[str, Any]]) -> Iterator[Row]:
+    for row in page:
+        yield Row(
+            dict(zip(dimensions, row.get("keys", []))),
+            int(row["clicks"]),
+            int(row["impressions"]),
+            row["ctr"],
+            row["position"],
+        )
+
+
+def page_body(window: Dict[Any, Any], fetched: int) -> Optional[Dict[Any, Any]]:
+    """
+    Body of the next page of a window once fetched rows of it came, None
+    when its rowLimit is reached. rowLimit caps the rows of the whole window,
+    pages ask for 25,000 rows at most.
+    """
+
+    limit = window.get("rowLimit")
+    size = PAGE_SIZE if limit is None else min(PAGE_SIZE, limit - fetched)
+    if size <= 0:
+        return None
+
+    return {**window, "startRow": window["startRow"] + fetched, "rowLimit": size}
+
+
+def to_batch(dimensions: List[str], page: List[Dict[str, Any]]) -> Batch:
+    """
+    A page as columns, one list per dimension and metric.
+    """
+
+    batch: Batch = {name: [] for name in dimensions}
+    for idx, name in enumerate(dimensions):
+        column = batch[name]
+        for row in page:
+            column.append(row["keys"][idx])
+
+    batch["clicks"] = [int(row["clicks"]) for row in page]
+    batch["impressions"] = [int(row["impressions"]) for row in page]
+    batch["ctr"] = [row["ctr"] for row in page]
+    batch["position"] = [row["position"] for row in page]
+    return batch
+
+
+class Client:
+    """
+    Programmatic access to the Search Analytics queries.
+
+    Windows are planned the same way as the CLI plans them, and every
+    request goes through the SearchAnalytics it wraps, so its quota manager,
+    credential pool, metrics and profiler apply the same way. Pages past
+    25,000 rows are fetched as well, without asking, up to rowLimit rows
+    of every window when the body has one.
+    """
+
+    def __init__(self, service: SearchAnalytics, retries: int = 1) -> None:
+        self.service = service
+        self.retries = retries
+
+    @classmethod
+    def from_credentials(cls, path: str, **kwargs: Any) -> "Client":
+        """
+        Client for a credentials.json seoman wrote or a service account key.
+        """
+
+        from apiclient import discovery  # type: ignore
+
+        credentials = auth.load_credentials(path)
+        service = discovery.build(
+            serviceName="searchconsole",
+            version="v1",
+            credentials=credentials,
+            cache_discovery=False,
+        )
+        return cls(SearchAnalytics(service, credentials), **kwargs)
+
+    def plan(
+        self, body: Dict[Any, Any], granularity: Optional[str] = None
+    ) -> List[Dict[Any, Any]]:
+        """
+        Bodies of the windows a query is split into.
+        """
+
+        for name in ["startDate", "endDate"]:
+            if name not in body:
+                raise InvalidParameterError(f"The body has no {name}")
+
+        if body.get("rowLimit", 1) < 1:
+            raise InvalidParameterError("rowLimit is the rows of a window, at least 1")
+
+        if granularity is not None and granularity not in ALL_GRANULARITIES:
+            raise InvalidParameterError(
+                f"Unknown granularity {granularity}, use one of: "
+                + ", ".join(ALL_GRANULARITIES)
+            )
+
+        body = {"startRow": 0, **body}
+        if granularity is None:
+            return [body]
+
+        return create_body_list(body, granularity=granularity)
+
+    def _fetch(self, site: str, body: Dict[Any, Any]) -> Dict[str, Any]:
+        for attempt in range(self.retries + 1):
+            try:
+                return self.service._query(site, body)
+            except query_errors() as error:
+                if attempt == self.retries or not is_transient_error(error):
+                    raise QueryError(f"{site} {body}: {error}") from error
+            time.sleep(2 ** attempt)
+
+        raise QueryError(f"{site} {body}: no attempts made")
+
+    async def _fetch_async(self, site: str, body: Dict[Any, Any]) -> Dict[str, Any]:
+        for attempt in range(self.retries + 1):
+            try:
+                return await self.service._query_async(site, body)
+            except query_errors() as error:
+                if attempt == self.retries or not is_transient_error(error):
+                    raise QueryError(f"{site} {body}: {error}") from error
+            await asyncio.sleep(2 ** attempt)
+
+        raise QueryError(f"{site} {body}: no attempts made")
+
+    def pages(
+        self, site: str, body: Dict[Any, Any], granularity: Optional[str] = None
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Raw pages of rows as the API returns them, window by window.
+        """
+
+        for window in self.plan(body, granularity):
+            fetched = 0
+            request = page_body(window, fetched)
+            while request is not None:
+                page = self._fetch(site, request).get("rows", [])
+                yield page
+
+                if len(page) < request["rowLimit"]:
+                    break
+                fetched += len(page)
+                request = page_body(window, fetched)
+
+    def query(
+        self, site: str, body: Dict[Any, Any], granularity: Optional[str] = None
+    ) -> Iterator[Row]:
+        """
+        Rows of a query, fetched as they are iterated over.
+        """
+
+        dimensions = body.get("dimensions", [])
+        for page in self.pages(site, body, granularity):
+            yield from to_rows(dimensions, page)
+
+    def batches(
+        self, site: str, body: Dict[Any, Any], granularity: Optional[str] = None
+    ) -> Iterator[Batch]:
+        """
+        Rows of a query as columns, a batch per page.
+        """
+
+        dimensions = body.get("dimensions", [])
+        for page in self.pages(site, body, granularity):
+            yield to_batch(dimensions, page)
+
+    def dataframe(
+        self, site: str, body: Dict[Any, Any], granularity: Optional[str] = None
+    ) -> Any:
+        """
+        Rows of a query as a pandas DataFrame, see pages_to_dataframe.
+        """
+
+        return pages_to_dataframe(
+            self.pages(site, body, granularity), body.get("dimensions", [])
+        )
+
+    async def _window_async(
+        self, site: str, window: Dict[Any, Any]
+    ) -> List[List[Dict[str, Any]]]:
+        pages: List[List[Dict[str, Any]]] = []
+        fetched = 0
+        request = page_body(window, fetched)
+        while request is not None:
+            page = (await self._fetch_async(site, request)).get("rows", [])
+            pages.append(page)
+
+            if len(page) < request["rowLimit"]:
+                break
+            fetched += len(page)
+            request = page_body(window, fetched)
+
+        return pages
+
+    async def apages(
+        self,
+        site: str,
+        body: Dict[Any, Any],
+        granularity: Optional[str] = None,
+        concurrency: int = 10,
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        pages, with up to concurrency windows fetched at once over the async
+        transport. They still come in order, at most concurrency windows are
+        fetched ahead of the one being read.
+        """
+
+        if self.service.transport is None:
+            self.service.transport = AsyncTransport(
+                credentials=self.service.credentials, concurrency=concurrency
+            )
+
+        windows = iter(self.plan(body, granularity))
+        pending: List["asyncio.Task[List[List[Dict[str, Any]]]]"] = []
+
+        def schedule() -> None:
+            for window in windows:
+                pending.append(asyncio.ensure_future(self._window_async(site, window)))
+                if len(pending) >= concurrency:
+                    return
+
+        try:
+            schedule()
+            while pending:
+                pages = await pending.pop(0)
+                schedule()
+                for page in pages:
+                    yield page
+        finally:
+            for task in pending:
+                task.cancel()
+            # Cancelled tasks may still hold connections until they finish.
+            await asyncio.gather(*pending, return_exceptions=True)
+            await self.service.transport.aclose()
+
+    async def aquery(
+        self,
+        site: str,
+        body: Dict[Any, Any],
+        granularity: Optional[str] = None,
+        concurrency: int = 10,
+    ) -> AsyncIterator[Row]:
+        """
+        query for asyncio, with concurrent windows like apages.
+        """
+
+        dimensions = body.get("dimensions", [])
+        async for page in self.apages(site, body, granularity, concurrency):
+            for row in to_rows(dimensions, page):
+                yield row
+
+    async def abatches(
+        self,
+        site: str,
+        body: Dict[Any, Any],
+        granularity: Optional[str] = None,
+        concurrency: int = 10,
+    ) -> AsyncIterator[Batch]:
+        """
+        batches for asyncio, with concurrent windows like apages.
+        """
+
+        dimensions = body.get("dimensions", [])
+        async for page in self.apages(site, body, granularity, concurrency):
+            yield to_batch(dimensions, page)
+
+    def sites(self) -> List[Dict[str, Any]]:
+        """
+        Verified sites of the account.
+        """
+
+        return [
+            site
+            for site in self.service.service.sites()
+            .list()
+            .execute()
+            .get("siteEntry", [])
+            if site["permissionLevel"] != "siteUnverifiedUser"
+        ]
@@ -24,3 +24,18 @@ class FolderNotFoundError(SeomanException):
 class MissingParameterError(SeomanException):
     def __init__(self, message: str) -> None:
         super().__init__(message)
+
+
+class InvalidParameterError(SeomanException):
+    def __init__(self, message: str) -> None:
+        super().__init__(message)
+
+
+class MissingDependencyError(SeomanException):
+    def __init__(self, message: str) -> None:
+        super().__init__(message)
+
+
+class QueryError(SeomanException):
+    def __init__(self, message: str) -> None:
+        super().__init__(message)
@@ -1,25 +1,315 @@
-from typing import List
+from typing import Any, Dict, List, Optional, Tuple
 
 import typer  # type: ignore
 
 from . import auth
-from .utils.completion_utils import dimensions, export_type, month_complete, searchtype
+from .exceptions import BrokenFileError, InvalidParameterError, MissingDependencyError
+from .service import SearchAnalytics
+from .utils.completion_utils import (
+    comparisons,
+    dataset_formats,
+    derived_metrics,
+    dimensions,
+    export_type,
+    month_complete,
+    searchtype,
+    top_metrics,
+)
 from .utils.date_utils import (
+    comparison_range,
     create_date,
     days_last_util,
     get_day_granularity,
     get_today,
     process_date,
 )
+from .utils.db_utils import Store
+from .utils.metrics_utils import REGISTRY
 from .utils.path_utils import create_toml_list
+from .utils.profile_utils import Profiler
 from .utils.query_utils import query_builder, query_deleter, query_lister
 from .utils.selector_utils import create_granularity_selector, create_selector
+from .utils.transport_utils import AsyncTransport
 
 app = typer.Typer(add_completion=False, name="Seoman")
 query_app = typer.Typer(
     add_completion=False, name="Seoman", short_help="Create and run your queries."
 )
+db_app = typer.Typer(
+    add_completion=False,
+    name="Seoman",
+    short_help="Ask questions to the fetched data without using the API.",
+)
+dead_app = typer.Typer(
+    add_completion=False,
+    name="Seoman",
+    short_help="Show and fetch again the windows that failed.",
+)
+analyze_app = typer.Typer(
+    add_completion=False,
+    name="Seoman",
+    short_help="Analyze the fetched data in the local database.",
+)
 app.add_typer(query_app, name="query")
+app.add_typer(db_app, name="db")
+app.add_typer(dead_app, name="dead-letters")
+app.add_typer(analyze_app, name="analyze")
+
+
+def aggregate_results(service: SearchAnalytics, group_by: List[str]) -> None:
+    """
+    Merge the fetched windows and print the totals.
+    """
+
+    try:
+        totals = service.aggregate(group_by=[dim for dim in group_by if dim != "total"])
+    except InvalidParameterError as error:
+        typer.secho(str(error), fg=typer.colors.RED, bold=True)
+        exit()
+
+    typer.secho(
+        f"Total: {totals['clicks']} clicks, {totals['impressions']} impressions, "
+        f"{totals['ctr']:.2%} CTR, {totals['position']:.1f} average position",
+        fg=typer.colors.BRIGHT_GREEN,
+        bold=True,
+    )
+
+
+def derive_metrics(
+    service: SearchAnalytics, metrics: List[str], group_by: List[str]
+) -> None:
+    """
+    Add the derived metrics to the rows, group_by are the dimensions the rows
+    were merged by if they were.
+    """
+
+    from .utils.derived_utils import DERIVED_METRICS
+
+    try:
+        service.derive(
+            metrics=DERIVED_METRICS if "all" in metrics else metrics,
+            dimensions=[dim for dim in group_by if dim != "total"]
+            if group_by
+            else None,
+        )
+    except (InvalidParameterError, MissingDependencyError) as error:
+        typer.secho(str(error), fg=typer.colors.RED, bold=True)
+        exit()
+
+
+def keep_top(service: SearchAnalytics, n: int, by: str, post_processing: bool) -> bool:
+    """
+    Keep only the top n rows, returns whether the API can be asked for them directly.
+    """
+
+    if post_processing:
+        typer.secho(
+            "--top merges the windows by every dimension but date, it can not be used with --aggregate or --compare.",
+            fg=typer.colors.RED,
+            bold=True,
+        )
+        exit()
+
+    try:
+        return service.top(n=n, by=by)
+    except InvalidParameterError as error:
+        typer.secho(str(error), fg=typer.colors.RED, bold=True)
+        exit()
+
+
+def check_sample(sample: float, post_processing: bool) -> None:
+    """
+    Exit if the sample share is not usable.
+    """
+
+    if post_processing:
+        typer.secho(
+            "--sample estimates the totals of the whole range, it can not be used with --aggregate or --compare.",
+            fg=typer.colors.RED,
+            bold=True,
+        )
+        exit()
+
+    if not 0 < sample <= 1:
+        typer.secho(
+            f"--sample is the share of windows to fetch, between 0 and 1, not {sample}",
+            fg=typer.colors.RED,
+            bold=True,
+        )
+        exit()
+
+
+def check_max_memory(export_type: Optional[str]) -> None:
+    """
+    Exit if the export would hold every row in memory anyway.
+    """
+
+    if (export_type or "").lower() not in ["csv", "json", "tsv", "table", "feather"]:
+        typer.secho(
+            "--max-memory keeps the rows on disk, but xlsx, the default export, is written from memory. Export to csv, json or tsv instead.",
+            fg=typer.colors.RED,
+            bold=True,
+        )
+        exit()
+
+
+def report_sample(service: SearchAnalytics) -> None:
+    """
+    Print the totals estimated from the sampled windows.
+    """
+
+    if service.sample is None:
+        return
+
+    estimates = service.sample.estimate()
+
+    lower_bound = estimates["lowerBound"]
+
+    def margin(metric: str) -> str:
+        value = estimates[f"{metric}Margin"]
+        # The margin is of the sampling, a cut window is off by more than that.
+        return f" ± {value:,.0f}" if value is not None and not lower_bound else ""
+
+    typer.secho(
+        f"Sampled {estimates['windows']} of {estimates['total_windows']} windows. "
+        f"Estimated for the whole range: {'at least ' if lower_bound else ''}"
+        f"{estimates['clicks']:,.0f}{margin('clicks')} clicks, "
+        f"{estimates['impressions']:,.0f}{margin('impressions')} impressions"
+        f"{'' if lower_bound else ' (95%)'}, "
+        f"{estimates['ctr']:.2%} CTR, {estimates['position']:.1f} average position",
+        fg=typer.colors.BRIGHT_GREEN,
+        bold=True,
+    )
+
+    if lower_bound:
+        typer.secho(
+            f"{estimates['truncated_windows']} of the sampled windows had more rows than the row limit, "
+            "so the estimates are lower bounds. Use fewer dimensions or a smaller granularity.",
+            fg=typer.colors.YELLOW,
+        )
+
+
+def start_pipeline(
+    service: SearchAnalytics,
+    command: str,
+    export_type: str,
+    url: str,
+    workers: int,
+    post_processing: bool,
+) -> None:
+    """
+    Export while fetching, when the export type allows it.
+    """
+
+    if post_processing:
+        typer.secho(
+            "--workers writes the rows while fetching, it can not be used with --aggregate, --derive or --top.",
+            fg=typer.colors.RED,
+            bold=True,
+        )
+        exit()
+
+    try:
+        service.pipeline(
+            command=command, export_type=export_type, url=url, workers=workers
+        )
+    except InvalidParameterError as error:
+        typer.secho(str(error), fg=typer.colors.RED, bold=True)
+        exit()
+
+
+def limit_quota(service: SearchAnalytics, site_qpm: int, project_qpm: int) -> None:
+    """
+    Change the queries per minute shared by the seoman processes.
+    """
+
+    from .utils.quota_utils import PROJECT_QPM, SITE_QPM, QuotaManager, project_key
+
+    if service.quota is not None:
+        service.quota.close()
+
+    service.quota = QuotaManager(
+        project=project_key(service.credentials),
+        site_qpm=site_qpm or SITE_QPM,
+        project_qpm=project_qpm or PROJECT_QPM,
+    )
+
+
+def start_dataset(service: SearchAnalytics, root: str, file_format: str) -> None:
+    """
+    Also write every window as a partition under root.
+    """
+
+    from .utils.partition_utils import PartitionedWriter
+
+    try:
+        service.dataset = PartitionedWriter(root, file_format=file_format)
+    except (InvalidParameterError, MissingDependencyError) as error:
+        typer.secho(str(error), fg=typer.colors.RED, bold=True)
+        exit()
+
+
+def report_dataset(service: SearchAnalytics) -> None:
+    if service.dataset is not None:
+        typer.secho(
+            f"{service.dataset.partitions} partitions written to {service.dataset.root}",
+            bold=True,
+        )
+
+
+def start_pool(service: SearchAnalytics, paths: List[str]) -> None:
+    """
+    Spread the queries over the credentials in paths too.
+    """
+
+    try:
+        service.pool = auth.load_pool(service, paths)
+    except BrokenFileError as error:
+        typer.secho(str(error), fg=typer.colors.RED, bold=True)
+        exit()
+
+
+def start_profiling(
+    service: SearchAnalytics, profile: bool, profile_output: str, cprofile: str
+) -> None:
+    """
+    Attach a profiler if any of the profiling options is given.
+    """
+
+    if profile or profile_output or cprofile:
+        service.profiler = Profiler(cprofile=cprofile)
+
+
+def start_metrics(metrics_file: str, metrics_port: int) -> None:
+    """
+    Serve the metrics while running, and write them when seoman exits,
+    also when the command fails or is interrupted.
+    """
+
+    import atexit
+
+    if metrics_port:
+        REGISTRY.serve(port=metrics_port)
+
+    if metrics_file:
+        atexit.register(REGISTRY.write_textfile, metrics_file)
+
+
+def finish_profiling(service: SearchAnalytics, profile_output: str) -> None:
+    """
+    Print the profile report and write the requested files.
+    """
+
+    if service.profiler is None:
+        return
+
+    service.profiler.print_report()
+
+    if profile_output:
+        service.profiler.dump(profile_output)
+        typer.secho(f"Profile written to {profile_output}", bold=True)
+
+    service.profiler.dump_cprofile()
 
 
 @app.command("auth")
@@ -58,12 +348,114 @@ def manual(
         None,
         help="Set a frequency/granularity or group your queries [Example: daily, twodaily, monday, tuesday, weekdays, weekends]",
     ),
+    aggregate: List[str] = typer.Option(
+        None,
+        help="Merge the granularity windows by the given dimensions, use 'total' for totals only",
+        autocompletion=dimensions,
+    ),
+    derive: List[str] = typer.Option(
+        None,
+        help="Add derived metrics as columns: ctrDelta, positionBucket, clickShare, pageClickShare or all",
+        autocompletion=derived_metrics,
+    ),
+    top: int = typer.Option(
+        None, help="Keep only this many rows, merged by every dimension but date."
+    ),
+    sample: float = typer.Option(
+        None,
+        help="Fetch only this share of the windows, spread over the weekdays, and estimate the totals [Example: 0.05]",
+    ),
+    by: str = typer.Option(
+        "clicks",
+        help="Order --top by clicks or impressions.",
+        autocompletion=top_metrics,
+    ),
+    compare: str = typer.Option(
+        None,
+        help="Also fetch previous-period or previous-year and join both periods with the changes",
+        autocompletion=comparisons,
+    ),
+    store: bool = typer.Option(
+        False,
+        help="Load the results into the local database for 'seoman db' and answer from stored daily data when possible.",
+    ),
+    dataset: str = typer.Option(
+        None,
+        help="Also write every window to this directory as query=.../site=.../start_date=.../end_date=.../part-N files, replacing the partitions of earlier runs.",
+    ),
+    dataset_format: str = typer.Option(
+        "parquet", help="Format of the --dataset files.", autocompletion=dataset_formats
+    ),
+    profile: bool = typer.Option(
+        False,
+        help="Print where the time goes: API requests, retries, conversion, writing.",
+    ),
+    profile_output: str = typer.Option(
+        None, help="Also write the profile report to this JSON file."
+    ),
+    cprofile: str = typer.Option(
+        None, help="Dump cProfile stats of the fetch and export to this file."
+    ),
+    metrics_file: str = typer.Option(
+        None,
+        help="Write Prometheus metrics of the run to this file [Example: for node_exporter's textfile collector]",
+    ),
+    metrics_port: int = typer.Option(
+        None, help="Serve Prometheus metrics on this port while running."
+    ),
+    max_memory: int = typer.Option(
+        None,
+        help="Keep at most this many MB of rows in memory, spill the rest to disk.",
+    ),
+    concurrency: int = typer.Option(
+        None,
+        help="Send up to this many queries at once over non-blocking connections.",
+    ),
+    workers: int = typer.Option(
+        None,
+        help="Convert and write csv or json exports in this many processes while fetching.",
+    ),
+    table_rows: int = typer.Option(
+        100, help="Rows to show with --export table, 0 shows all of them."
+    ),
+    pager: bool = typer.Option(False, help="Page through every row of --export table."),
+    site_qpm: int = typer.Option(
+        None,
+        help="Queries per minute to a site, shared by every seoman process [Default is 1,200]",
+    ),
+    project_qpm: int = typer.Option(
+        None,
+        help="Queries per minute of the Cloud project, shared by every seoman process [Default is 40,000]",
+    ),
+    pool: List[str] = typer.Option(
+        None,
+        help="Also send queries with these credentials.json or service account files, in turn.",
+    ),
 ):
-
     """
     Top pages in the site
     """
-    service = auth.load_service()
+    service = auth.load_service(quota=True)
+
+    if store:
+        service.store = Store()
+
+    if dataset:
+        start_dataset(service, root=dataset, file_format=dataset_format)
+
+    if site_qpm or project_qpm:
+        limit_quota(service, site_qpm=site_qpm, project_qpm=project_qpm)
+
+    if pool:
+        start_pool(service, paths=pool)
+
+    if concurrency:
+        service.transport = AsyncTransport(
+            credentials=service.credentials, concurrency=concurrency
+        )
+
+    start_profiling(service, profile, profile_output, cprofile)
+    start_metrics(metrics_file, metrics_port)
 
     if start_date is not None:
         start = process_date(dt=start_date, which_date="start")
@@ -89,8 +481,82 @@ def manual(
     if start_row is not None:
         service.update_body({"startRow": start_row})
 
-    service.concurrent_query_asyncio(url=url, granularity=granularity or "daily")
-    service.export(export_type=export, url=url, command="manual")
+    if workers:
+        start_pipeline(
+            service,
+            "manual",
+            export,
+            url,
+            workers,
+            bool(aggregate or derive or compare or top),
+        )
+
+    previous = None
+    if compare:
+        if aggregate:
+            typer.secho(
+                "--compare merges the windows by every dimension but date, it can not be used with --aggregate.",
+                fg=typer.colors.RED,
+                bold=True,
+            )
+            exit()
+
+        try:
+            previous = comparison_range(
+                service.body["startDate"], service.body["endDate"], compare
+            )
+        except InvalidParameterError as error:
+            typer.secho(str(error), fg=typer.colors.RED, bold=True)
+            exit()
+
+    pushdown = False
+    if top:
+        pushdown = keep_top(
+            service, n=top, by=by, post_processing=bool(aggregate or compare)
+        )
+
+    if sample is not None:
+        check_sample(sample, post_processing=bool(aggregate or compare))
+
+    if max_memory:
+        check_max_memory(export)
+
+    service.concurrent_query_asyncio(
+        url=url,
+        granularity=granularity or "daily",
+        max_memory=max_memory * 1024 * 1024 if max_memory else None,
+        previous=previous,
+        single_window=pushdown,
+        sample=sample,
+    )
+    report_sample(service)
+    report_dataset(service)
+
+    if compare:
+        service.compare()
+
+    if aggregate:
+        aggregate_results(service, group_by=aggregate)
+
+    if derive:
+        derive_metrics(
+            service,
+            metrics=derive,
+            group_by=[
+                dim for dim in service.body.get("dimensions", []) if dim != "date"
+            ]
+            if compare or top
+            else aggregate,
+        )
+
+    service.export(
+        export_type=export,
+        url=url,
+        command="manual",
+        table_rows=table_rows or None,
+        pager=pager,
+    )
+    finish_profiling(service, profile_output)
 
 
 @app.command("sites")
@@ -99,6 +565,9 @@ def show_sites(
     export: str = typer.Option(
         None, help="Specify export type ", autocompletion=export_type,
     ),
+    refresh: bool = typer.Option(
+        False, help="Ask the API for the sites instead of using the cached list."
+    ),
 ):
     """
     List all the web sites or the permission level for the specific site that associated with the account.
@@ -106,7 +575,7 @@ def show_sites(
 
     service = auth.load_service()
 
-    service.sites(url=url or None)
+    service.sites(url=url or None, refresh=refresh)
 
     service.export(export_type=export, command="sites", url=url or "seoman")
 
@@ -114,7 +583,7 @@ def show_sites(
 @app.command("sitemaps")
 def show_sitemap(
     url: str = typer.Option(
-        ..., help="The site's URL [Example: http://www.example.com/]"
+        None, help="The site's URL [Example: http://www.example.com/]"
     ),
     feedpath: str = typer.Option(
         None,
@@ -123,13 +592,48 @@ def show_sitemap(
     export: str = typer.Option(
         None, help="Specify export type ", autocompletion=export_type,
     ),
+    all_sites: bool = typer.Option(
+        False,
+        "--all",
+        help="List the sitemaps of every verified site with their errors, warnings and counts.",
+    ),
+    details: bool = typer.Option(
+        False, help="With --all, also get every sitemap on its own."
+    ),
+    concurrency: int = typer.Option(20, help="With --all, requests to send at once."),
+    refresh: bool = typer.Option(
+        False, help="Ask the API for the sites instead of using the cached list."
+    ),
 ):
     """
     List sitemaps-entries or get specific the sitemaps.
     """
 
+    if not all_sites and not url:
+        typer.secho(
+            "Give a site with --url or use --all for every site.",
+            fg=typer.colors.RED,
+            bold=True,
+        )
+        exit()
+
     service = auth.load_service()
 
+    if all_sites:
+        failed = service.all_sitemaps(
+            details=details, concurrency=concurrency, refresh=refresh
+        )
+
+        for site, reason in failed.items():
+            typer.secho(
+                f"Could not list the sitemaps of {site}: {reason}", fg=typer.colors.RED,
+            )
+
+        service.export(
+            export_type=export or "table", command="sitemaps", url="all-sites"
+        )
+        return
+
     service.sitemaps(url=url or None, feedpath=feedpath or None)
 
     service.export(export_type=export, command="sitemaps", url=url or "seoman")
@@ -144,25 +648,219 @@ def show_traffic(
     export: str = typer.Option(
         None, help="Specify export type.", autocompletion=export_type,
     ),
+    refresh: bool = typer.Option(
+        False, help="Ask the API for the sites instead of using the cached list."
+    ),
 ):
     """
     Get total traffic from your sites.
     """
 
-    service = auth.load_service()
+    service = auth.load_service(quota=True)
 
     days = days or 30
     start, end = (
         days_last_util(days).get("startDate"),
         days_last_util(days).get("endDate"),
     )
-    service.get_traffic(site=site or None, days=days)
+    service.get_traffic(site=site or None, days=days, refresh=refresh)
 
     service.export(
         export_type=export or "table", command="traffic", url=f"{start}-{end}"
     )
 
 
+@app.command("backfill")
+def backfill(
+    url: List[str] = typer.Option(
+        None,
+        help="Sites to backfill, give it more than once [Default is every verified site]",
+    ),
+    months: int = typer.Option(16, help="How many months to go back."),
+    end_date: str = typer.Option(
+        None, help="Last day to fetch [Default is 2 days ago, the API lags behind]"
+    ),
+    dimensions: List[str] = typer.Option(
+        None,
+        help="Dimensions [Default is date, query, page]",
+        autocompletion=dimensions,
+    ),
+    search_type: str = typer.Option(
+        None, help="Search type ", autocompletion=searchtype
+    ),
+    workers: int = typer.Option(20, help="Requests to send at once."),
+    database: str = typer.Option(None, help="Path of the database file."),
+    dataset: str = typer.Option(
+        None,
+        help="Also write every window to this directory as query=.../site=.../start_date=.../end_date=.../part-N files, replacing the partitions of earlier runs.",
+    ),
+    dataset_format: str = typer.Option(
+        "parquet", help="Format of the --dataset files.", autocompletion=dataset_formats
+    ),
+    refresh: bool = typer.Option(
+        False, help="Ask the API for the sites instead of using the cached list."
+    ),
+    site_qpm: int = typer.Option(
+        None,
+        help="Queries per minute to a site, shared by every seoman process [Default is 1,200]",
+    ),
+    project_qpm: int = typer.Option(
+        None,
+        help="Queries per minute of the Cloud project, shared by every seoman process [Default is 40,000]",
+    ),
+    pool: List[str] = typer.Option(
+        None,
+        help="Also send queries with these credentials.json or service account files, in turn.",
+    ),
+    queue: str = typer.Option(
+        None,
+        help="Only publish the days to this queue file, for 'seoman worker' processes to fetch.",
+    ),
+    metrics_file: str = typer.Option(
+        None,
+        help="Write Prometheus metrics of the run to this file [Example: for node_exporter's textfile collector]",
+    ),
+    metrics_port: int = typer.Option(
+        None, help="Serve Prometheus metrics on this port while running."
+    ),
+):
+    """
+    Load every day of the last months of your sites into the local database.
+    """
+
+    from .utils.date_utils import get_start_date, months_before
+
+    service = auth.load_service(quota=True)
+    service.query_name = "backfill"
+    service.store = Store(path=database)
+
+    if dataset:
+        start_dataset(service, root=dataset, file_format=dataset_format)
+
+    if site_qpm or project_qpm:
+        limit_quota(service, site_qpm=site_qpm, project_qpm=project_qpm)
+
+    if pool:
+        start_pool(service, paths=pool)
+
+    start_metrics(metrics_file, metrics_port)
+
+    if not url:
+        service.sites(refresh=refresh)
+        url = [entry["siteUrl"] for entry in service.data.get("siteEntry", [])]
+
+    end = end_date or get_start_date(2)
+    service.update_body({"dimensions": list(dimensions or ["date", "query", "page"])})
+    if search_type:
+        service.update_body({"searchType": search_type})
+
+    try:
+        if queue:
+            from .utils.queue_utils import WorkQueue
+
+            tasks, _ = service.backfill_tasks(
+                sites=url, start=months_before(end, months), end=end
+            )
+            published = WorkQueue(path=queue).publish(tasks)
+            typer.secho(
+                f"{published} days were published to {queue}, the ones already queued were skipped, "
+                f"fetch them with 'seoman worker --queue {queue}'.",
+                bold=True,
+            )
+            return
+
+        counts = service.backfill(
+            sites=url, start=months_before(end, months), end=end, workers=workers,
+        )
+    except (InvalidParameterError, ValueError) as error:
+        typer.secho(str(error), fg=typer.colors.RED, bold=True)
+        exit()
+
+    report_dataset(service)
+    show_table(
+        "Backfill",
+        ["site", "days", "skipped", "failed", "rows"],
+        [
+            [site, done["days"], done["skipped"], done["failed"], done["rows"]]
+            for site, done in counts.items()
+        ],
+    )
+
+
+@app.command("worker")
+def work(
+    queue: str = typer.Option(
+        ..., help="Queue file 'seoman backfill --queue' published to."
+    ),
+    workers: int = typer.Option(20, help="Requests to send at once."),
+    lease: float = typer.Option(
+        60, help="Seconds a task is kept without a heartbeat before others take it."
+    ),
+    database: str = typer.Option(None, help="Path of the database file."),
+    dataset: str = typer.Option(
+        None,
+        help="Also write every window to this directory as query=.../site=.../start_date=.../end_date=.../part-N files, replacing the partitions of earlier runs.",
+    ),
+    dataset_format: str = typer.Option(
+        "parquet", help="Format of the --dataset files.", autocompletion=dataset_formats
+    ),
+    site_qpm: int = typer.Option(
+        None,
+        help="Queries per minute to a site, shared by every seoman process [Default is 1,200]",
+    ),
+    project_qpm: int = typer.Option(
+        None,
+        help="Queries per minute of the Cloud project, shared by every seoman process [Default is 40,000]",
+    ),
+    pool: List[str] = typer.Option(
+        None,
+        help="Also send queries with these credentials.json or service account files, in turn.",
+    ),
+    metrics_file: str = typer.Option(
+        None,
+        help="Write Prometheus metrics of the run to this file [Example: for node_exporter's textfile collector]",
+    ),
+    metrics_port: int = typer.Option(
+        None, help="Serve Prometheus metrics on this port while running."
+    ),
+):
+    """
+    Fetch the days of a backfill queue, next to the other workers on it.
+    """
+
+    from .utils.queue_utils import WorkQueue
+
+    service = auth.load_service(quota=True)
+    service.query_name = "backfill"
+    service.store = Store(path=database)
+
+    if dataset:
+        start_dataset(service, root=dataset, file_format=dataset_format)
+
+    if site_qpm or project_qpm:
+        limit_quota(service, site_qpm=site_qpm, project_qpm=project_qpm)
+
+    if pool:
+        start_pool(service, paths=pool)
+
+    start_metrics(metrics_file, metrics_port)
+
+    work_queue = WorkQueue(path=queue, lease_seconds=lease)
+    counts = service.work(work_queue, workers=workers)
+    report_dataset(service)
+
+    show_table(
+        "Worker",
+        ["site", "days", "failed", "rows"],
+        [
+            [site, done["days"], done["failed"], done["rows"]]
+            for site, done in counts.items()
+        ],
+    )
+    states = work_queue.counts()
+    show_table("Queue", list(states), [list(states.values())])
+
+
 @app.command("feedback")
 def give_feedback():
     """
@@ -197,7 +895,85 @@ def show_version():
 def run_query(
     url: str = typer.Argument(
         None, help="Enter a url to override default one(If there is one.)"
-    )
+    ),
+    aggregate: List[str] = typer.Option(
+        None,
+        help="Merge the granularity windows by the given dimensions, use 'total' for totals only",
+        autocompletion=dimensions,
+    ),
+    derive: List[str] = typer.Option(
+        None,
+        help="Add derived metrics as columns: ctrDelta, positionBucket, clickShare, pageClickShare or all",
+        autocompletion=derived_metrics,
+    ),
+    top: int = typer.Option(
+        None, help="Keep only this many rows, merged by every dimension but date."
+    ),
+    sample: float = typer.Option(
+        None,
+        help="Fetch only this share of the windows, spread over the weekdays, and estimate the totals [Example: 0.05]",
+    ),
+    by: str = typer.Option(
+        "clicks",
+        help="Order --top by clicks or impressions.",
+        autocompletion=top_metrics,
+    ),
+    store: bool = typer.Option(
+        False,
+        help="Load the results into the local database for 'seoman db' and answer from stored daily data when possible.",
+    ),
+    dataset: str = typer.Option(
+        None,
+        help="Also write every window to this directory as query=.../site=.../start_date=.../end_date=.../part-N files, replacing the partitions of earlier runs.",
+    ),
+    dataset_format: str = typer.Option(
+        "parquet", help="Format of the --dataset files.", autocompletion=dataset_formats
+    ),
+    profile: bool = typer.Option(
+        False,
+        help="Print where the time goes: API requests, retries, conversion, writing.",
+    ),
+    profile_output: str = typer.Option(
+        None, help="Also write the profile report to this JSON file."
+    ),
+    cprofile: str = typer.Option(
+        None, help="Dump cProfile stats of the fetch and export to this file."
+    ),
+    metrics_file: str = typer.Option(
+        None,
+        help="Write Prometheus metrics of the run to this file [Example: for node_exporter's textfile collector]",
+    ),
+    metrics_port: int = typer.Option(
+        None, help="Serve Prometheus metrics on this port while running."
+    ),
+    max_memory: int = typer.Option(
+        None,
+        help="Keep at most this many MB of rows in memory, spill the rest to disk.",
+    ),
+    concurrency: int = typer.Option(
+        None,
+        help="Send up to this many queries at once over non-blocking connections.",
+    ),
+    workers: int = typer.Option(
+        None,
+        help="Convert and write csv or json exports in this many processes while fetching.",
+    ),
+    table_rows: int = typer.Option(
+        100, help="Rows to show with --export table, 0 shows all of them."
+    ),
+    pager: bool = typer.Option(False, help="Page through every row of --export table."),
+    site_qpm: int = typer.Option(
+        None,
+        help="Queries per minute to a site, shared by every seoman process [Default is 1,200]",
+    ),
+    project_qpm: int = typer.Option(
+        None,
+        help="Queries per minute of the Cloud project, shared by every seoman process [Default is 40,000]",
+    ),
+    pool: List[str] = typer.Option(
+        None,
+        help="Also send queries with these credentials.json or service account files, in turn.",
+    ),
 ):
     """
     Select a query then run it.
@@ -205,7 +981,29 @@ def run_query(
     name = create_selector(
         key="name", message="Select a query.", choices=create_toml_list()
     )
-    service = auth.load_service()
+    service = auth.load_service(quota=True)
+    service.query_name = name
+
+    if store:
+        service.store = Store()
+
+    if dataset:
+        start_dataset(service, root=dataset, file_format=dataset_format)
+
+    if site_qpm or project_qpm:
+        limit_quota(service, site_qpm=site_qpm, project_qpm=project_qpm)
+
+    if pool:
+        start_pool(service, paths=pool)
+
+    if concurrency:
+        service.transport = AsyncTransport(
+            credentials=service.credentials, concurrency=concurrency
+        )
+
+    start_profiling(service, profile, profile_output, cprofile)
+    start_metrics(metrics_file, metrics_port)
+
     service.process_toml(filename=name)
 
     start_date, end_date = (
@@ -228,13 +1026,58 @@ def run_query(
         )
         exit()
 
+    if workers:
+        start_pipeline(
+            service,
+            name,
+            export_type,
+            url or toml_url,
+            workers,
+            bool(aggregate or derive or top),
+        )
+
+    pushdown = False
+    if top:
+        pushdown = keep_top(service, n=top, by=by, post_processing=bool(aggregate))
+
+    if sample is not None:
+        check_sample(sample, post_processing=bool(aggregate))
+
+    if max_memory:
+        check_max_memory(export_type)
+
     service.concurrent_query_asyncio(
-        url=url if url is not None else toml_url, granularity=granularity or "daily"
+        url=url if url is not None else toml_url,
+        granularity=granularity or "daily",
+        max_memory=max_memory * 1024 * 1024 if max_memory else None,
+        single_window=pushdown,
+        sample=sample,
     )
+    report_sample(service)
+    report_dataset(service)
+
+    if aggregate:
+        aggregate_results(service, group_by=aggregate)
+
+    if derive:
+        derive_metrics(
+            service,
+            metrics=derive,
+            group_by=[
+                dim for dim in service.body.get("dimensions", []) if dim != "date"
+            ]
+            if top
+            else aggregate,
+        )
 
     service.export(
-        export_type=export_type, url=url if url is not None else toml_url, command=name
+        export_type=export_type,
+        url=url if url is not None else toml_url,
+        command=name,
+        table_rows=table_rows or None,
+        pager=pager,
     )
+    finish_profiling(service, profile_output)
 
 
 @query_app.command("add")
@@ -248,7 +1091,8 @@ def add_query():
     _run = typer.confirm(f"{name} created successfully. Do you want to run it?")
 
     if _run:
-        service = auth.load_service()
+        service = auth.load_service(quota=True)
+        service.query_name = name
         service.process_toml(filename=name)
         start_date, end_date = (
             service.__dict__["body"]["startDate"],
@@ -303,3 +1147,205 @@ def show_query():
         choices=create_toml_list(),
     )
     query_lister(filename=selected)
+
+
+def show_table(name: str, headers: List[str], rows: List) -> None:
+    """
+    Print rows from the local database as a table.
+    """
+
+    from pytablewriter import UnicodeTableWriter  # type: ignore
+
+    writer = UnicodeTableWriter()
+    writer.table_name = name
+    writer.margin = 2
+    writer.headers = headers
+    writer.value_matrix = rows
+    writer.write_table()
+
+
+@db_app.command("sql")
+def db_sql(
+    statement: str = typer.Argument(..., help="SQL statement to run."),
+    database: str = typer.Option(None, help="Path of the database file."),
+):
+    """
+    Run an SQL statement on the local database.
+    """
+
+    try:
+        headers, rows = Store(path=database).sql(statement)
+    except InvalidParameterError as error:
+        typer.secho(str(error), fg=typer.colors.RED, bold=True)
+        exit()
+
+    show_table("Results", headers, rows)
+
+
+@db_app.command("top")
+def db_top(
+    dimension: str = typer.Argument(
+        "query", help="Dimension to rank.", autocompletion=dimensions
+    ),
+    by: str = typer.Option("clicks", help="Rank by clicks or impressions."),
+    url: str = typer.Option(None, help="Only use the rows of this site."),
+    start_date: str = typer.Option(None, help="First date [Example: 2020-03-01]"),
+    end_date: str = typer.Option(None, help="Last date [Example: 2020-03-31]"),
+    limit: int = typer.Option(20, help="Number of rows to show."),
+    search_type: str = typer.Option(
+        "web", help="Only use the rows of this search type.", autocompletion=searchtype
+    ),
+    database: str = typer.Option(None, help="Path of the database file."),
+):
+    """
+    Show the top pages, queries, countries... from the stored daily data.
+    """
+
+    try:
+        headers, rows = Store(path=database).top(
+            dimension=dimension,
+            by=by,
+            site=url,
+            start_date=start_date,
+            end_date=end_date,
+            limit=limit,
+            search_type=search_type,
+        )
+    except InvalidParameterError as error:
+        typer.secho(str(error), fg=typer.colors.RED, bold=True)
+        exit()
+
+    show_table(f"Top {dimension}", headers, rows)
+
+
+@analyze_app.command("ngrams")
+def analyze_ngrams(
+    n: List[int] = typer.Option(
+        None, help="Length of the n-grams, give it more than once [Default is 1 and 2]"
+    ),
+    by: str = typer.Option(
+        "clicks", help="Rank by clicks or impressions.", autocompletion=top_metrics
+    ),
+    url: str = typer.Option(None, help="Only use the queries of this site."),
+    start_date: str = typer.Option(None, help="First date [Example: 2020-03-01]"),
+    end_date: str = typer.Option(None, help="Last date [Example: 2020-03-31]"),
+    limit: int = typer.Option(20, help="Number of n-grams to show for every n."),
+    search_type: str = typer.Option(
+        "web",
+        help="Only use the queries of this search type.",
+        autocompletion=searchtype,
+    ),
+    database: str = typer.Option(None, help="Path of the database file."),
+):
+    """
+    Sum the clicks and impressions of the words and phrases of stored daily queries.
+    """
+
+    from .utils.ngram_utils import NgramCounter
+
+    try:
+        counter = NgramCounter(sizes=list(n or [1, 2]))
+        for batch in Store(path=database).totals(
+            "query",
+            site=url,
+            start_date=start_date,
+            end_date=end_date,
+            search_type=search_type,
+        ):
+            counter.update(batch)
+        top = counter.top(limit=limit, by=by)
+    except InvalidParameterError as error:
+        typer.secho(str(error), fg=typer.colors.RED, bold=True)
+        exit()
+
+    headers = ["ngram", "queries", "clicks", "impressions", "ctr", "position"]
+    for size, rows in top.items():
+        show_table(
+            f"Top {size}-grams of {counter.queries} queries",
+            headers,
+            [[row[header] for header in headers] for row in rows],
+        )
+
+
+@dead_app.command("show")
+def dead_letters_show():
+    """
+    Show the windows that failed after every retry.
+    """
+
+    from .utils.failure_utils import DeadLetters
+
+    entries = DeadLetters().entries()
+
+    if not entries:
+        typer.secho("No failed windows.", fg=typer.colors.BRIGHT_GREEN, bold=True)
+        return
+
+    show_table(
+        "Failed windows",
+        ["site", "query", "startDate", "endDate", "dimensions", "failed", "error"],
+        [
+            [
+                entry["site"],
+                entry["query"],
+                entry["body"].get("startDate"),
+                entry["body"].get("endDate"),
+                ", ".join(entry["body"].get("dimensions", [])),
+                entry["failed"],
+                entry["error"][:80],
+            ]
+            for entry in entries
+        ],
+    )
+
+
+@dead_app.command("retry")
+def dead_letters_retry(
+    export: str = typer.Option(
+        None, help="Also export the fetched rows ", autocompletion=export_type,
+    ),
+    store: bool = typer.Option(
+        False, help="Load the fetched rows into the local database."
+    ),
+    database: str = typer.Option(
+        None,
+        help="Path of the database file, by default the one each window was fetched into.",
+    ),
+):
+    """
+    Fetch the failed windows again, the ones that fail again are kept.
+    """
+
+    from .utils.failure_utils import DeadLetters
+
+    groups: Dict[
+        Tuple[str, str, Tuple[str, ...], Optional[str]], List[Dict[str, Any]]
+    ] = {}
+    for entry in DeadLetters().entries():
+        key = (
+            entry["site"],
+            entry["query"],
+            tuple(entry["body"].get("dimensions", [])),
+            database or entry.get("database"),
+        )
+        groups.setdefault(key, []).append(entry)
+
+    if not groups:
+        typer.secho("No failed windows.", fg=typer.colors.BRIGHT_GREEN, bold=True)
+        return
+
+    for (site, name, _, path), entries in groups.items():
+        service = auth.load_service(quota=True)
+        service.query_name = name
+
+        if store:
+            service.store = Store(path=path)
+
+        service.concurrent_query_asyncio(
+            url=site, windows=[entry["body"] for entry in entries]
+        )
+        # The ones that failed again were saved as new entries.
+        service.dead_letters.remove([entry["id"] for entry in entries])
+
+        if export and service.data.get("rows"):
+            service.export(export_type=export, url=site, command=f"{name}-retry")
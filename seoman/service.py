@@ -1,14 +1,39 @@
 import sys
-from datetime import datetime
+from datetime import datetime, timedelta
+from time import perf_counter, time
 from typing import IO, Any, Dict, List, Optional, Tuple, Union
 
 import typer  # type: ignore
 from click import progressbar  # type: ignore
 
-from .exceptions import FolderNotFoundError
+from .exceptions import (
+    FolderNotFoundError,
+    InvalidParameterError,
+    MissingDependencyError,
+)
+from .utils import metrics_utils as metrics
+from .utils.buffer_utils import RowBuffer
+from .utils.cache_utils import SitesCache, account_key
 from .utils.date_utils import create_date, days_last_util, get_today
+from .utils.db_utils import Store
 from .utils.export_utils import Export
-from .utils.service_utils import create_body_list, path_exists, regenerate_credentials
+from .utils.failure_utils import CircuitBreaker, DeadLetters
+from .utils.partition_utils import PartitionedWriter
+from .utils.pool_utils import CredentialPool, PoolMember
+from .utils.profile_utils import Profiler, stage
+from .utils.queue_utils import WorkQueue, worker_name
+from .utils.quota_utils import QuotaManager
+from .utils.sample_utils import WindowSample
+from .utils.service_utils import (
+    create_body_list,
+    is_quota_error,
+    is_transient_error,
+    path_exists,
+    query_errors,
+    regenerate_credentials,
+    sitemap_row,
+)
+from .utils.transport_utils import AsyncTransport
 
 
 class SearchAnalytics:
@@ -25,6 +50,24 @@ class SearchAnalytics:
             "rowLimit": 25000,
         }
         self.utils: Dict[str, str] = {}
+        self.store: Optional[Store] = None
+        # Every window is also written as a partition of this dataset when it is set.
+        self.dataset: Optional[PartitionedWriter] = None
+        self.profiler: Optional[Profiler] = None
+        self.sites_cache = SitesCache()
+        # Sends the Search Analytics queries concurrently when it is set.
+        self.transport: Optional[AsyncTransport] = None
+        # Every query waits for a slot of the quota shared with other processes.
+        self.quota: Optional[QuotaManager] = None
+        # Queries are spread over the credentials of several accounts when it is set.
+        self.pool: Optional[CredentialPool] = None
+        # Windows of the last run that could not be fetched, with their errors.
+        self.failed: List[Tuple[Dict[Any, Any], Optional[BaseException]]] = []
+        self.dead_letters = DeadLetters()
+        # Windows fetched by the last sampled run, with the estimated totals.
+        self.sample: Optional[WindowSample] = None
+        # Label of the metrics, the name of the toml query or the command.
+        self.query_name = "manual"
 
     def update_body(self, body: Dict[Any, Any]) -> None:
         """
@@ -33,49 +76,302 @@ class SearchAnalytics:
 
         self.body.update(**body)
 
-    @regenerate_credentials
-    def concurrent_query_asyncio(self, url: str, granularity: str = None) -> None:
+    def _request_failed(self, url: str, error: Exception, member: PoolMember) -> None:
+        metrics.API_ERRORS.inc(query=self.query_name)
+        if is_quota_error(error):
+            metrics.QUOTA_ERRORS.inc(query=self.query_name)
+            if self.pool is not None:
+                # Probably the quota of that account, the others can go on.
+                self.pool.throttle(member)
+            elif member.quota is not None:
+                member.quota.penalize(url)
+
+    def _request_done(self, started: float, response: Optional[Dict[str, Any]]) -> None:
+        elapsed = perf_counter() - started
+        rows = len(response.get("rows", [])) if response is not None else None
+
+        metrics.REQUEST_DURATION.observe(elapsed, query=self.query_name)
+        if rows is not None:
+            metrics.ROWS_FETCHED.inc(rows, query=self.query_name)
+        if self.profiler is not None:
+            self.profiler.request(elapsed, rows=rows)
+
+    def _member(self) -> PoolMember:
         """
-        Run queries concurrently.
+        Credentials to send the next query with.
         """
 
-        import asyncio
+        if self.pool is None:
+            return PoolMember(self.service, self.credentials, self.quota)
+        return self.pool.next()
+
+    def _fail_over(self, error: Exception, attempts: int) -> bool:
+        """
+        Whether a failed query should be sent again with the next credentials.
+        """
+
+        return (
+            self.pool is not None
+            and attempts < len(self.pool)
+            and is_quota_error(error)
+        )
+
+    def _query(self, url: str, body: Dict[Any, Any]) -> Dict[str, Any]:
+        """
+        Run a single Search Analytics query.
+        """
 
         from googleapiclient.errors import HttpError  # type: ignore
 
-        bodies = create_body_list(self.body, granularity=granularity)
-        extra_bodies = []
+        attempts = 0
+        while True:
+            member = self._member()
+            attempts += 1
+
+            if member.quota is not None:
+                metrics.QUOTA_WAIT.inc(member.quota.acquire(url), query=self.query_name)
 
-        async def con_query(body, query_type: str) -> None:
-            start_row = 25000
+            started = perf_counter()
+            response = None
+            metrics.API_CALLS.inc(query=self.query_name)
             try:
-                data = (
-                    self.service.searchanalytics()
+                response = (
+                    member.service.searchanalytics()
                     .query(siteUrl=url, body=body)
                     .execute()
                 )
-            except HttpError:
-                await asyncio.sleep(2)
+            except HttpError as error:
+                self._request_failed(url, error, member)
+                if not self._fail_over(error, attempts):
+                    raise
+                continue
+            finally:
+                self._request_done(started, response)
+
+            return response
+
+    async def _query_async(self, url: str, body: Dict[Any, Any]) -> Dict[str, Any]:
+        """
+        Run a single Search Analytics query through the async transport.
+        """
+
+        from googleapiclient.errors import HttpError  # type: ignore
+
+        attempts = 0
+        while True:
+            member = self._member()
+            attempts += 1
+
+            if member.quota is not None:
+                metrics.QUOTA_WAIT.inc(
+                    await member.quota.acquire_async(url), query=self.query_name
+                )
+
+            started = perf_counter()
+            response = None
+            metrics.API_CALLS.inc(query=self.query_name)
+            try:
+                response = await self.transport.query(  # type: ignore
+                    url, body, credentials=member.credentials
+                )
+            except HttpError as error:
+                self._request_failed(url, error, member)
+                if not self._fail_over(error, attempts):
+                    raise
+                continue
+            finally:
+                self._request_done(started, response)
+
+            return response
+
+    @regenerate_credentials
+    def concurrent_query_asyncio(
+        self,
+        url: str,
+        granularity: str = None,
+        max_memory: Optional[int] = None,
+        previous: Optional[Dict[str, str]] = None,
+        single_window: bool = False,
+        windows: Optional[List[Dict[Any, Any]]] = None,
+        sample: Optional[float] = None,
+    ) -> None:
+        """
+        Run queries concurrently.
+
+        With max_memory (in bytes) the rows are spilled to disk past that size.
+        previous is a second date range that is planned the same way and fetched
+        together with the first one, its rows go to self.data["previous"].
+        With single_window the whole range is asked in one query, windows are
+        bodies to fetch as they are instead of planning them. With sample only
+        that share of the windows is fetched, see self.sample for the estimates.
+
+        Windows that fail after their retry are tried once more at the end,
+        the ones that still fail are saved to the dead letters and left in
+        self.failed. While the API keeps failing every request is paused.
+        """
+
+        import asyncio
+
+        from .utils.pipeline_utils import Pipeline
+
+        started = perf_counter()
+
+        with stage(self.profiler, "plan"):
+            if windows is not None:
+                bodies = [body.copy() for body in windows]
+            elif single_window:
+                bodies = [self.body.copy()]
+            else:
+                bodies = create_body_list(self.body, granularity=granularity)
+
+            self.sample = WindowSample(bodies, sample) if sample else None
+            if self.sample is not None:
+                bodies = self.sample.selected
+
+            # Where the rows of each window go, by the id of its body.
+            targets: Dict[int, str] = {}
+
+            if previous is not None:
+                previous_bodies = create_body_list(
+                    {**self.body, **previous}, granularity=granularity
+                )
+                targets.update((id(body), "previous") for body in previous_bodies)
+                bodies.extend(previous_bodies)
+        extra_bodies = []
+        breaker = CircuitBreaker()
+        failed: List[Tuple[Dict[Any, Any], Optional[BaseException]]] = []
+
+        if max_memory is not None:
+            self.data.setdefault("rows", RowBuffer(max_memory=max_memory))
+
+        # Connection errors and timeouts are retried too, on both paths.
+        errors = query_errors()
+
+        async def query(body) -> Dict[str, Any]:
+            if self.transport is None:
+                return self._query(url, body)
+            return await self._query_async(url, body)
+
+        async def fetch(body) -> Tuple[Optional[Dict[str, Any]], bool]:
+            """
+            Rows of a window from the store or the API, and whether they were cached.
+            """
+
+            cached = (
+                self.store.rollup(site=url, body=body)
+                if self.store is not None
+                else None
+            )
+
+            if self.store is not None:
+                (metrics.CACHE_MISSES if cached is None else metrics.CACHE_HITS).inc(
+                    query=self.query_name
+                )
+                metrics.update_cache_ratio(self.query_name)
+
+            if cached is not None:
+                metrics.ROWS_FETCHED.inc(
+                    len(cached.get("rows", [])), query=self.query_name
+                )
+                return cached, True
+
+            error: Optional[BaseException] = None
+            for retry in (False, True):
+                if retry:
+                    metrics.RETRIES.inc(query=self.query_name)
+                    if self.profiler is not None:
+                        self.profiler.retry(sleep=2)
+                    await asyncio.sleep(2)
+
+                await breaker.wait()
                 try:
-                    data = (
-                        self.service.searchanalytics()
-                        .query(siteUrl=url, body=body)
-                        .execute()
-                    )
-                except HttpError:
-                    pass
+                    data = await query(body)
+                except errors as failure:
+                    error = failure
+                    if is_transient_error(failure) and breaker.failure():
+                        typer.secho(
+                            f"\nThe API keeps failing, pausing for {breaker.delay():.0f} seconds.",
+                            fg=typer.colors.YELLOW,
+                        )
+                    continue
+
+                breaker.success()
+                return data, False
+
+            if self.profiler is not None:
+                self.profiler.failure()
+            failed.append((body, error))
+            return None, False
+
+        async def append(rows: Any, page: List[Dict[str, Any]]) -> None:
+            # A pipeline blocks while its queue is full, it waits outside the loop.
+            if isinstance(rows, Pipeline):
+                await asyncio.get_running_loop().run_in_executor(
+                    None, rows.append, page
+                )
+            else:
+                rows.append(page)
+
+        async def collect(
+            body, data: Optional[Dict[str, Any]], cached: bool, query_type: str
+        ) -> None:
+            if data is None:
+                return
+
+            if self.sample is not None and targets.get(id(body), "rows") == "rows":
+                self.sample.record(body, data.get("rows", []))
 
             try:
-                self.data.setdefault("rows", []).append(data["rows"])
+                if self.store is not None and not cached:
+                    # Empty windows are stored too, so they count as fetched.
+                    self.store.insert(site=url, body=body, rows=data.get("rows", []))
+                if self.dataset is not None:
+                    self.dataset.write(site=url, body=body, rows=data.get("rows", []))
+
+                target = targets.get(id(body), "rows")
+                rows = self.data.setdefault(target, [])
+                await append(rows, data["rows"])
 
                 if len(data["rows"]) > 24999 and query_type == "first":
                     new_body = body.copy()
-                    new_body.update({"startRow": 24999})
+                    new_body.update({"startRow": body["startRow"] + len(data["rows"])})
                     extra_bodies.append(new_body)
+                    targets[id(new_body)] = target
 
-            except (KeyError, UnboundLocalError):
+            except KeyError:
                 pass
 
+        async def fetch_all(body_list: List[Dict[Any, Any]], bar, query_type: str):
+            """
+            Fetch every window at once through the transport, the windows are
+            still collected in order, as soon as the ones before them are done.
+            """
+
+            done: Dict[int, Tuple[Optional[Dict[str, Any]], bool]] = {}
+            position = 0
+            # Collecting can wait for the pipeline, one window at a time still.
+            collecting = asyncio.Lock()
+
+            async def fetch_one(idx: int, body) -> None:
+                nonlocal position
+
+                done[idx] = await fetch(body)
+                bar.update(1)
+
+                async with collecting:
+                    while position in done:
+                        await collect(
+                            body_list[position], *done.pop(position), query_type
+                        )
+                        position += 1
+
+            try:
+                await asyncio.gather(
+                    *(fetch_one(idx, body) for idx, body in enumerate(body_list))
+                )
+            finally:
+                await self.transport.aclose()  # type: ignore
+
         async def main(
             body_list: List[Dict[Any, Any]], message: str, query_type: str
         ) -> None:
@@ -86,30 +382,198 @@ class SearchAnalytics:
                 fill_char="█",
                 empty_char=" ",
             ) as bod:
+                if self.transport is not None:
+                    await fetch_all(body_list, bod, query_type=query_type)
+                    return
+
                 for body in bod:
-                    await con_query(body, query_type=query_type)
+                    await collect(body, *await fetch(body), query_type=query_type)
+
+        with stage(self.profiler, "fetch"):
+            asyncio.run(
+                main(body_list=bodies, message="Fetching data", query_type="first")
+            )
 
-        asyncio.run(
-            main(body_list=bodies, message="Fetching data", query_type="first"))
+            if failed:
+                retry_bodies = [body for body, _ in failed]
+                failed.clear()
+                asyncio.run(
+                    main(
+                        body_list=retry_bodies,
+                        message="Retrying failed windows",
+                        query_type="first",
+                    )
+                )
 
         if len(extra_bodies) >= 1:
             confirm_rows = typer.confirm(
                 f"More than 25.000 rows found for {len(extra_bodies)} query, do you want to include them too?"
             )
             if confirm_rows:
-                asyncio.run(
-                    main(
-                        body_list=extra_bodies,
-                        message="Fetching more data",
-                        query_type="second",
+                with stage(self.profiler, "fetch"):
+                    asyncio.run(
+                        main(
+                            body_list=extra_bodies,
+                            message="Fetching more data",
+                            query_type="second",
+                        )
                     )
-                )
+
+        self.failed = failed
+        if failed:
+            database = str(self.store.path) if self.store is not None else None
+            metrics.DEAD_LETTERS.inc(len(failed), query=self.query_name)
+            self.dead_letters.add(
+                site=url, query=self.query_name, failures=failed, database=database
+            )
+            typer.secho(
+                f"{len(failed)} windows failed, they were saved to {self.dead_letters.path}. "
+                f"Run '{self._retry_command()}' to fetch them again.",
+                fg=typer.colors.RED,
+                bold=True,
+            )
+
+        metrics.QUERY_DURATION.observe(perf_counter() - started, query=self.query_name)
+        if not failed:
+            metrics.LAST_SUCCESS.set(time(), query=self.query_name)
+
+    def aggregate(self, group_by: List[str], max_keys: int = 500000) -> Dict[str, Any]:
+        """
+        Merge the fetched windows by the given dimensions and return the totals.
+        """
+
+        from .utils.aggregate_utils import MergedPages
+
+        merged = MergedPages(
+            dimensions=self.body.get("dimensions", []),
+            group_by=group_by,
+            max_keys=max_keys,
+        )
+
+        if "rows" not in self.data:
+            return merged.aggregator.totals()
+
+        for rows in self.data["rows"]:
+            merged.append(rows)
+
+        # Exports read the merged rows from the aggregator, page by page.
+        self.data = {"rows": merged}
+
+        return merged.aggregator.totals()
+
+    def top(self, n: int, by: str = "clicks") -> bool:
+        """
+        Keep only the top n rows by a metric, merged by every dimension but date.
+
+        Returns whether the ordering and the limit can be left to the API. The
+        API sorts by clicks, so then the date dimension is dropped and the
+        whole range should be asked in a single window of n rows.
+        """
+
+        from .utils.aggregate_utils import TopRows
+
+        if n < 1:
+            raise InvalidParameterError("--top needs at least one row")
+
+        group_by = [dim for dim in self.body.get("dimensions", []) if dim != "date"]
+        pushdown = by == "clicks" and n <= 25000 and self.store is None
+
+        if pushdown:
+            self.update_body({"dimensions": group_by, "rowLimit": n, "startRow": 0})
+
+        self.data["rows"] = TopRows(
+            dimensions=self.body.get("dimensions", []), group_by=group_by, n=n, by=by
+        )
+        return pushdown
+
+    def to_dataframe(self) -> Any:
+        """
+        The fetched rows as a pandas DataFrame, built straight from the pages.
+        """
+
+        from .utils.frame_utils import pages_to_dataframe
+
+        return pages_to_dataframe(
+            self.data.get("rows", []), self.body.get("dimensions", [])
+        )
+
+    def compare(self) -> None:
+        """
+        Join the rows of the two periods on their keys, with the changes.
+
+        The date dimension is left out of the keys, each period is first merged
+        by the other dimensions. Both sides are hash tables, so the join is
+        linear in the number of rows. The joined rows are read from the
+        aggregations as they are exported.
+        """
+
+        from .utils.aggregate_utils import Aggregator, JoinedPages
+
+        dimensions = self.body.get("dimensions", [])
+        group_by = [dim for dim in dimensions if dim != "date"]
+        periods = []
+        pages = 0
+
+        for name in ["rows", "previous"]:
+            aggregator = Aggregator(dimensions=dimensions, group_by=group_by)
+            for rows in self.data.get(name, []):
+                aggregator.update(rows)
+                pages += 1
+            periods.append(aggregator)
+
+        self.data = {"rows": JoinedPages(periods[0], periods[1], page_count=pages)}
+
+    def derive(
+        self, metrics: List[str], dimensions: Optional[List[str]] = None
+    ) -> None:
+        """
+        Add derived metrics to the fetched rows as new columns.
+
+        dimensions are the ones of the rows, if they were aggregated.
+        """
+
+        from .utils.derived_utils import DerivedRows
+
+        if "rows" not in self.data:
+            return
+
+        self.data["rows"] = DerivedRows(
+            self.data["rows"],
+            dimensions=dimensions
+            if dimensions is not None
+            else self.body.get("dimensions", []),
+            metrics=metrics,
+        )
+
+    def pipeline(
+        self,
+        command: str,
+        export_type: str,
+        url: Optional[str] = None,
+        workers: Optional[int] = None,
+    ) -> None:
+        """
+        Convert and write the rows to the export file while they are being fetched.
+        """
+
+        from .utils.pipeline_utils import Pipeline
+
+        self.data["rows"] = Pipeline(
+            filename=self._create_filename(
+                url=url, command=command, filetype=export_type
+            ),
+            file_format=export_type,
+            workers=workers,
+            profiler=self.profiler,
+        )
 
     @regenerate_credentials
-    def sites(self, url: Union[None, str] = None) -> None:
+    def sites(self, url: Union[None, str] = None, refresh: bool = False) -> None:
         """
         List all the web sites associated with the account.
 
+        The verified sites are cached for a while, refresh asks the API again.
+
         Info: https://developers.google.com/resources/api-libraries/documentation/webmasters/v3/python/latest/webmasters_v3.sites.html
         """
 
@@ -117,6 +581,13 @@ class SearchAnalytics:
             self.data.update(self.service.sites().get(siteUrl=url).execute())
 
         else:
+            account = account_key(self.credentials)
+            cached = None if refresh else self.sites_cache.get(account)
+
+            if cached is not None:
+                self.data.update({"siteEntry": cached})
+                return
+
             self.data.update(
                 {
                     key: [
@@ -125,23 +596,26 @@ class SearchAnalytics:
                     for key, value in self.service.sites().list().execute().items()
                 }
             )
+            self.sites_cache.set(account, self.data.get("siteEntry", []))
 
     @regenerate_credentials
-    def get_traffic(self, site: str = None, days: int = 30) -> None:
+    def get_traffic(
+        self, site: str = None, days: int = 30, refresh: bool = False
+    ) -> None:
         """
         Get your site's traffic results by given days. [Default: 30]
         """
         import asyncio
 
         if site is None:
-            self.sites()
+            self.sites(refresh=refresh)
 
             async def con_query(url, idx) -> None:
                 self.data["siteEntry"][idx].update(
                     {
-                        "impression": self.service.searchanalytics()
-                        .query(siteUrl=url, body=days_last_util(days=days))
-                        .execute()["rows"][0]
+                        "impression": self._query(url, days_last_util(days=days))[
+                            "rows"
+                        ][0]
                     }
                 )
 
@@ -171,9 +645,9 @@ class SearchAnalytics:
             self.data.update(
                 {
                     "site": site,
-                    "impression": self.service.searchanalytics()
-                    .query(siteUrl=site, body=days_last_util(days=days))
-                    .execute()["rows"][0],
+                    "impression": self._query(site, days_last_util(days=days))["rows"][
+                        0
+                    ],
                 }
             )
 
@@ -191,19 +665,433 @@ class SearchAnalytics:
             )
 
         elif url:
-            self.data.update(
-                self.service.sitemaps().list(siteUrl=url).execute())
+            self.data.update(self.service.sitemaps().list(siteUrl=url).execute())
+
+    @regenerate_credentials
+    def all_sitemaps(
+        self, details: bool = False, concurrency: int = 20, refresh: bool = False
+    ) -> Dict[str, str]:
+        """
+        List the sitemaps of every verified site concurrently, as a flat report.
+
+        With details every sitemap is also fetched on its own. Returns the
+        sites whose sitemaps could not be listed, with the reason.
+        """
+
+        import asyncio
+
+        from googleapiclient.errors import HttpError  # type: ignore
+
+        self.sites(refresh=refresh)
+        sites = [entry["siteUrl"] for entry in self.data.get("siteEntry", [])]
+        transport = self.transport or AsyncTransport(
+            credentials=self.credentials, concurrency=concurrency
+        )
+        rows: Dict[str, List[Dict[str, Any]]] = {}
+        failed: Dict[str, str] = {}
+
+        async def site_sitemaps(site: str) -> None:
+            try:
+                sitemaps = (await transport.sitemaps(site)).get("sitemap", [])
+
+                if details:
+                    sitemaps = await asyncio.gather(
+                        *(
+                            transport.sitemap(site, sitemap["path"])
+                            for sitemap in sitemaps
+                        )
+                    )
+            except (HttpError, OSError, asyncio.TimeoutError) as error:
+                failed[site] = str(error) or type(error).__name__
+                return
+
+            rows[site] = [sitemap_row(site, sitemap) for sitemap in sitemaps]
+
+        async def main() -> None:
+            with progressbar(
+                length=len(sites),
+                label="Fetching sitemaps",
+                fill_char="█",
+                empty_char=" ",
+            ) as bar:
+                try:
+                    for done in asyncio.as_completed(
+                        [site_sitemaps(site) for site in sites]
+                    ):
+                        await done
+                        bar.update(1)
+                finally:
+                    await transport.aclose()
+
+        asyncio.run(main())
+
+        # Same order as the sites list, whichever finished first.
+        self.data = {"rows": [rows[site] for site in sites if site in rows]}
+        return failed
+
+    def backfill_tasks(
+        self, sites: List[str], start: str, end: str
+    ) -> Tuple[List[Tuple[int, str, Dict[Any, Any]]], Dict[str, int]]:
+        """
+        (priority, site, body) of every day from start to end of every site
+        that is not in the store completely yet, and the days skipped of
+        every site.
+
+        Newer days have lower priorities, the same day of every site comes
+        before any older day.
+        """
+
+        if self.store is None:
+            raise InvalidParameterError("A backfill needs a store to write to")
+
+        first = datetime.strptime(start, "%Y-%m-%d").date()
+        last = datetime.strptime(end, "%Y-%m-%d").date()
+        template = {**self.body, "startRow": 0, "rowLimit": 25000}
+        done = {site: self.store.complete_dates(site, template) for site in sites}
+        skipped = {site: 0 for site in sites}
+        tasks = []
+
+        for offset in range((last - first).days + 1):
+            day = last - timedelta(days=offset)
+            for site in sites:
+                if str(day) in done[site]:
+                    skipped[site] += 1
+                    continue
+                body = {**template, "startDate": str(day), "endDate": str(day)}
+                tasks.append((-day.toordinal(), site, body))
+
+        return tasks, skipped
+
+    async def _fetch_retrying(
+        self, url: str, body: Dict[Any, Any], breaker: CircuitBreaker
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[BaseException]]:
+        """
+        A page through the async transport, retried once, and the error if
+        the retry failed too. Requests wait while the breaker is open.
+        """
+
+        import asyncio
+
+        error: Optional[BaseException] = None
+        for retry in (False, True):
+            if retry:
+                metrics.RETRIES.inc(query=self.query_name)
+                if self.profiler is not None:
+                    self.profiler.retry(sleep=2)
+                await asyncio.sleep(2)
+
+            await breaker.wait()
+            try:
+                data = await self._query_async(url, body)
+            except query_errors() as failure:
+                error = failure
+                if is_transient_error(failure) and breaker.failure():
+                    typer.secho(
+                        f"\nThe API keeps failing, pausing for {breaker.delay():.0f} seconds.",
+                        fg=typer.colors.YELLOW,
+                    )
+                continue
+
+            breaker.success()
+            return data, None
+
+        if self.profiler is not None:
+            self.profiler.failure()
+        return None, error
+
+    def _save_page(
+        self, site: str, body: Dict[Any, Any], rows: List[Dict[str, Any]]
+    ) -> None:
+        """
+        Write a fetched page of a backfill to the store, and the dataset if it is set.
+        """
+
+        self.store.insert(site=site, body=body, rows=rows)  # type: ignore
+        if self.dataset is not None:
+            self.dataset.write(site=site, body=body, rows=rows)
+
+    def _retry_command(self) -> str:
+        """
+        The command that fetches the failed windows again, into the same store.
+        """
+
+        if self.store is None:
+            return "seoman dead-letters retry"
+        return f'seoman dead-letters retry --store --database "{self.store.path}"'
+
+    def _save_failures(
+        self,
+        failed: Dict[str, List[Tuple[Dict[Any, Any], Optional[BaseException]]]],
+        started: float,
+    ) -> None:
+        """
+        Keep the days that failed in self.failed and the dead letters.
+        """
+
+        self.failed = [failure for failures in failed.values() for failure in failures]
+        database = str(self.store.path) if self.store is not None else None
+        for site, failures in failed.items():
+            self.dead_letters.add(
+                site=site, query=self.query_name, failures=failures, database=database
+            )
+
+        if self.failed:
+            metrics.DEAD_LETTERS.inc(len(self.failed), query=self.query_name)
+            typer.secho(
+                f"{len(self.failed)} days failed, they were saved to {self.dead_letters.path}. "
+                f"Run '{self._retry_command()}' to fetch them again.",
+                fg=typer.colors.RED,
+                bold=True,
+            )
+
+        metrics.QUERY_DURATION.observe(perf_counter() - started, query=self.query_name)
+        if not self.failed:
+            metrics.LAST_SUCCESS.set(time(), query=self.query_name)
+
+    @regenerate_credentials
+    def backfill(
+        self, sites: List[str], start: str, end: str, workers: int = 20
+    ) -> Dict[str, Dict[str, int]]:
+        """
+        Fetch every day from start to end of every site into the store.
+
+        Every page of every day of every site is a task of a single queue that
+        the workers take from, so a site with many pages does not keep the
+        others waiting. Recent days go first, see backfill_tasks, and the next
+        page of a day goes before new days. Each page is written to the store
+        as it arrives, days already stored completely are skipped, so an
+        interrupted backfill carries on.
+
+        Returns the days fetched, skipped and failed and the rows of every site.
+        """
+
+        import asyncio
+        import itertools
+
+        started = perf_counter()
+        order = itertools.count()
+
+        with stage(self.profiler, "plan"):
+            planned, skipped = self.backfill_tasks(sites, start, end)
+            tasks = [
+                ((priority, 1, next(order)), site, body)
+                for priority, site, body in planned
+            ]
+
+        counts = {
+            site: {"days": 0, "skipped": skipped[site], "failed": 0, "rows": 0}
+            for site in sites
+        }
+        self.transport = self.transport or AsyncTransport(
+            credentials=self.credentials, concurrency=workers
+        )
+        breaker = CircuitBreaker()
+        failed: Dict[str, List[Tuple[Dict[Any, Any], Optional[BaseException]]]] = {}
+
+        async def main() -> None:
+            queue: "asyncio.PriorityQueue[Tuple[Tuple[int, int, int], str, Dict[Any, Any]]]" = (
+                asyncio.PriorityQueue()
+            )
+            for task in tasks:
+                queue.put_nowait(task)
+
+            with progressbar(
+                length=len(tasks), label="Backfilling", fill_char="█", empty_char=" ",
+            ) as bar:
+
+                async def worker() -> None:
+                    while True:
+                        priority, site, body = await queue.get()
+                        try:
+                            data, error = await self._fetch_retrying(
+                                site, body, breaker
+                            )
+                            if data is None:
+                                failed.setdefault(site, []).append((body, error))
+                                counts[site]["failed"] += 1
+                                bar.update(1)
+                                continue
+
+                            rows = data.get("rows", [])
+                            self._save_page(site, body, rows)
+                            counts[site]["rows"] += len(rows)
+
+                            if len(rows) >= body["rowLimit"]:
+                                next_page = {
+                                    **body,
+                                    "startRow": body["startRow"] + len(rows),
+                                }
+                                queue.put_nowait(
+                                    ((priority[0], 0, next(order)), site, next_page)
+                                )
+                                continue
+
+                            counts[site]["days"] += 1
+                            bar.update(1)
+                        finally:
+                            queue.task_done()
+
+                running = [
+                    asyncio.ensure_future(worker())
+                    for _ in range(max(min(workers, len(tasks)), 1))
+                ]
+                joined = asyncio.ensure_future(queue.join())
+                try:
+                    # Workers only stop by raising, that ends the backfill too.
+                    await asyncio.wait(
+                        [joined, *running], return_when=asyncio.FIRST_COMPLETED
+                    )
+                    for future in running:
+                        if future.done():
+                            future.result()
+                finally:
+                    joined.cancel()
+                    for future in running:
+                        future.cancel()
+                    await asyncio.gather(*running, return_exceptions=True)
+                    await self.transport.aclose()  # type: ignore
+
+        with stage(self.profiler, "fetch"):
+            asyncio.run(main())
+
+        self._save_failures(failed, started)
+        return counts
+
+    @regenerate_credentials
+    def work(
+        self, queue: WorkQueue, workers: int = 20, wait: float = 5.0
+    ) -> Dict[str, Dict[str, int]]:
+        """
+        Fetch the tasks of a shared queue into the store until none is left,
+        next to the other processes that work on it.
+
+        Leases are kept with a heartbeat while this process runs. Idle
+        workers wait while other processes hold tasks, in case they die and
+        their leases run out. A task that fails is given back to the queue
+        until it failed max_attempts times, then it goes to the dead letters,
+        as do the tasks whose leases ran out max_attempts times.
+
+        Returns the days fetched and failed and the rows of every site.
+        """
+
+        import asyncio
+
+        if self.store is None:
+            raise InvalidParameterError("A worker needs a store to write to")
+
+        started = perf_counter()
+        name = worker_name()
+        counts: Dict[str, Dict[str, int]] = {}
+        self.transport = self.transport or AsyncTransport(
+            credentials=self.credentials, concurrency=workers
+        )
+        breaker = CircuitBreaker()
+        failed: Dict[str, List[Tuple[Dict[Any, Any], Optional[BaseException]]]] = {}
+
+        async def main() -> None:
+            with progressbar(
+                length=queue.unfinished(),
+                label="Working",
+                fill_char="█",
+                empty_char=" ",
+            ) as bar:
+
+                def report_expired() -> None:
+                    while queue.expired:
+                        task = queue.expired.pop()
+                        failed.setdefault(task.site, []).append(
+                            (task.body, TimeoutError("lease expired"))
+                        )
+                        counts.setdefault(
+                            task.site, {"days": 0, "failed": 0, "rows": 0}
+                        )["failed"] += 1
+                        bar.update(1)
+
+                async def worker() -> None:
+                    while True:
+                        leased = queue.lease(name)
+                        report_expired()
+                        if not leased:
+                            if not queue.unfinished():
+                                return
+                            # Leased by other workers, they may still give them up.
+                            await asyncio.sleep(wait)
+                            continue
+
+                        task = leased[0]
+                        site, body = task.site, task.body
+                        done = counts.setdefault(
+                            site, {"days": 0, "failed": 0, "rows": 0}
+                        )
+                        data, error = await self._fetch_retrying(site, body, breaker)
+
+                        if data is None:
+                            reason = " ".join(str(error).split())
+                            if queue.fail(task, name, reason):
+                                failed.setdefault(site, []).append((body, error))
+                                done["failed"] += 1
+                                bar.update(1)
+                            continue
+
+                        rows = data.get("rows", [])
+                        self._save_page(site, body, rows)
+                        done["rows"] += len(rows)
+
+                        follow = []
+                        if len(rows) >= body["rowLimit"]:
+                            next_page = {
+                                **body,
+                                "startRow": body["startRow"] + len(rows),
+                            }
+                            follow.append((task.priority, site, next_page))
+
+                        if queue.complete(task, name, follow=follow) and not follow:
+                            done["days"] += 1
+                            bar.update(1)
+
+                async def heartbeat() -> None:
+                    while True:
+                        await asyncio.sleep(queue.lease_seconds / 3)
+                        queue.heartbeat(name)
+
+                beating = asyncio.ensure_future(heartbeat())
+                try:
+                    await asyncio.gather(*(worker() for _ in range(max(workers, 1))))
+                finally:
+                    beating.cancel()
+                    await asyncio.gather(beating, return_exceptions=True)
+                    await self.transport.aclose()  # type: ignore
+
+        try:
+            with stage(self.profiler, "fetch"):
+                asyncio.run(main())
+        finally:
+            self._save_failures(failed, started)
+        return counts
 
     def export(
-        self, command: str, export_type: Optional[str] = None, url: str = None,
+        self,
+        command: str,
+        export_type: Optional[str] = None,
+        url: str = None,
+        table_rows: Optional[int] = 100,
+        pager: bool = False,
     ) -> None:
         """
         Specify the export type.
+
+        Tables of reports show the first table_rows rows, or every row in a pager.
         """
 
-        export_types = ["csv", "json", "tsv", "table"]
+        from .utils.pipeline_utils import Pipeline
+
+        export_types = ["csv", "json", "tsv", "table", "feather"]
+        pipeline = self.data.get("rows") if isinstance(self.data, dict) else None
+
+        if "rows" in self.data and not self.data["rows"]:
+            if isinstance(pipeline, Pipeline):
+                pipeline.discard()
 
-        if self.data == {"rows": []}:
             typer.secho(
                 "Results are empty. Make sure you have the entered url and you have rights to run it.",
                 fg=typer.colors.RED,
@@ -211,7 +1099,16 @@ class SearchAnalytics:
             )
             sys.exit()
 
-        export_data = Export(self.data)
+        if isinstance(pipeline, Pipeline):
+            # Already written while fetching.
+            pipeline.close()
+            typer.secho(
+                f"\nAnalytics successfully created in {pipeline.file_format.upper()} format ✅",
+                bold=True,
+            )
+            return
+
+        export_data = Export(self.data, profiler=self.profiler)
 
         if command == ("sites" or "sitemaps") and export_type is None:
             export_data.export_to_table()
@@ -235,12 +1132,23 @@ class SearchAnalytics:
 
         elif export_type == "tsv":
             export_data.export_to_tsv(
-                filename=self._create_filename(
-                    url=url, command=command, filetype="tsv")
+                filename=self._create_filename(url=url, command=command, filetype="tsv")
             )
 
         elif export_type == "table":
-            export_data.export_to_table()
+            export_data.export_to_table(limit=table_rows, pager=pager)
+
+        elif export_type == "feather":
+            try:
+                export_data.export_to_feather(
+                    filename=self._create_filename(
+                        url=url, command=command, filetype="feather"
+                    ),
+                    dimensions=self.body.get("dimensions", []),
+                )
+            except (InvalidParameterError, MissingDependencyError) as error:
+                typer.secho(str(error), fg=typer.colors.RED, bold=True)
+                sys.exit()
 
         elif (
             export_type == "excel"
@@ -286,8 +1194,7 @@ class SearchAnalytics:
                     [
                         __clean_url(url),
                         command,
-                        datetime.now().strftime(
-                            "%d-%B-%Y-%H-%M") + f".{filetype}",
+                        datetime.now().strftime("%d-%B-%Y-%H-%M") + f".{filetype}",
                     ]
                 )
 
@@ -339,12 +1246,10 @@ class SearchAnalytics:
             if key == "dimensions":
                 if "all" in value:
                     self.update_body(
-                        {"dimensions": ["date", "page",
-                                        "query", "country", "device"]}
+                        {"dimensions": ["date", "page", "query", "country", "device"]}
                     )
                 else:
-                    self.body.update(
-                        {"dimensions": [dimension for dimension in value]})
+                    self.body.update({"dimensions": [dimension for dimension in value]})
 
             if key == "filters":
                 self.body.update(
@@ -0,0 +1,381 @@
+import heapq
+import os
+import pickle
+import shutil
+import tempfile
+import weakref
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ..exceptions import InvalidParameterError
+
+TOP_METRICS = ["clicks", "impressions"]
+
+# clicks, impressions, position * impressions, position, row count
+State = List[float]
+
+
+def _new_state() -> State:
+    return [0.0, 0.0, 0.0, 0.0, 0.0]
+
+
+def _merge_state(into: State, other: State) -> None:
+    for idx in range(5):
+        into[idx] += other[idx]
+
+
+def state_to_row(key: Tuple[Any, ...], state: State) -> Dict[str, Any]:
+    """
+    Turn an accumulated state back into a Search Analytics row.
+    """
+
+    clicks, impressions, weighted_position, position, count = state
+
+    row: Dict[str, Any] = {"keys": list(key)} if key else {}
+    row.update(
+        {
+            "clicks": int(clicks),
+            "impressions": int(impressions),
+            "ctr": clicks / impressions if impressions else 0.0,
+            "position": weighted_position / impressions
+            if impressions
+            else (position / count if count else 0.0),
+        }
+    )
+    return row
+
+
+class Aggregator:
+    """
+    Streaming hash aggregation over Search Analytics rows.
+
+    Rows are grouped by a subset of the query dimensions, clicks and impressions
+    are summed, CTR is recomputed from the sums and position is weighted by
+    impressions. If the number of distinct keys passes max_keys, the table is
+    spilled to disk in hash partitions that are merged back one by one.
+    """
+
+    def __init__(
+        self,
+        dimensions: List[str],
+        group_by: List[str],
+        max_keys: int = 500000,
+        partitions: int = 16,
+        spill_dir: Optional[str] = None,
+    ) -> None:
+        unknown = [dim for dim in group_by if dim not in dimensions]
+        if unknown:
+            raise InvalidParameterError(
+                f"Can not group by {', '.join(unknown)}, query dimensions are: {', '.join(dimensions) or 'none'}"
+            )
+
+        self.group_by = group_by
+        self.indexes = [dimensions.index(dim) for dim in group_by]
+        self.max_keys = max_keys
+        self.partitions = partitions
+        self.spill_dir = spill_dir
+        self.table: Dict[Tuple[Any, ...], State] = {}
+        self.total = _new_state()
+        self.rows = 0
+        self._spill_path: Optional[str] = None
+
+    @property
+    def spilled(self) -> bool:
+        return self._spill_path is not None
+
+    def update(self, rows: Iterable[Dict[str, Any]]) -> None:
+        """
+        Fold a page of rows into the table.
+        """
+
+        table, indexes, total = self.table, self.indexes, self.total
+
+        for row in rows:
+            keys = row.get("keys", [])
+            key = tuple(keys[idx] for idx in indexes)
+
+            clicks, impressions, position = (
+                row.get("clicks", 0),
+                row.get("impressions", 0),
+                row.get("position", 0),
+            )
+
+            state = table.get(key)
+            if state is None:
+                state = table[key] = _new_state()
+
+            state[0] += clicks
+            state[1] += impressions
+            state[2] += position * impressions
+            state[3] += position
+            state[4] += 1
+
+            total[0] += clicks
+            total[1] += impressions
+            total[2] += position * impressions
+            total[3] += position
+            total[4] += 1
+
+            self.rows += 1
+
+        if len(table) > self.max_keys:
+            self._spill()
+
+    def _partition_file(self, partition: int) -> str:
+        return os.path.join(self._spill_path, f"part-{partition}.pickle")  # type: ignore
+
+    def _spill(self) -> None:
+        """
+        Move the in-memory table to the partition files.
+        """
+
+        if self._spill_path is None:
+            self._spill_path = tempfile.mkdtemp(
+                prefix="seoman-agg-", dir=self.spill_dir
+            )
+            # Remove the partitions when the aggregator is garbage collected or at exit.
+            weakref.finalize(self, shutil.rmtree, self._spill_path, True)
+
+        buckets: List[List[Tuple[Tuple[Any, ...], State]]] = [
+            [] for _ in range(self.partitions)
+        ]
+        for key, state in self.table.items():
+            buckets[hash(key) % self.partitions].append((key, state))
+
+        for partition, bucket in enumerate(buckets):
+            if bucket:
+                with open(self._partition_file(partition), "ab") as file:
+                    pickle.dump(bucket, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+        self.table = {}
+
+    def _read_partition(self, partition: int) -> Dict[Tuple[Any, ...], State]:
+        table: Dict[Tuple[Any, ...], State] = {}
+        path = self._partition_file(partition)
+
+        if not os.path.exists(path):
+            return table
+
+        with open(path, "rb") as file:
+            while True:
+                try:
+                    bucket = pickle.load(file)
+                except EOFError:
+                    break
+
+                for key, state in bucket:
+                    if key in table:
+                        _merge_state(table[key], state)
+                    else:
+                        table[key] = state
+
+        return table
+
+    def states(self) -> Iterator[Tuple[Tuple[Any, ...], State]]:
+        """
+        Yield the keys with their states, one partition at a time if the table
+        was spilled.
+        """
+
+        if not self.spilled:
+            yield from self.table.items()
+            return
+
+        # Partitions are kept until close, so the states can be read again.
+        self._spill()
+        for partition in range(self.partitions):
+            yield from self._read_partition(partition).items()
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        """
+        Yield the merged rows.
+        """
+
+        for key, state in self.states():
+            yield state_to_row(key, state)
+
+    def totals(self) -> Dict[str, Any]:
+        """
+        Totals over every row seen so far.
+        """
+
+        return state_to_row((), self.total)
+
+    def close(self) -> None:
+        """
+        Remove the spilled partitions.
+        """
+
+        if self._spill_path is not None:
+            shutil.rmtree(self._spill_path, ignore_errors=True)
+            self._spill_path = None
+
+
+class MergedPages:
+    """
+    Pages of rows merged by the given dimensions as they are appended.
+
+    Iterating reads the merged rows back from the Aggregator, page_size at
+    a time, from its spilled partitions if it spilled, so the merged rows
+    are never all in memory either.
+    """
+
+    def __init__(
+        self,
+        dimensions: List[str],
+        group_by: List[str],
+        max_keys: int = 500000,
+        page_size: int = 25000,
+    ) -> None:
+        self.aggregator = Aggregator(
+            dimensions=dimensions, group_by=group_by, max_keys=max_keys
+        )
+        self.page_size = page_size
+        self.page_count = 0
+
+    def append(self, page: List[Dict[str, Any]]) -> None:
+        self.aggregator.update(page)
+        self.page_count += 1
+
+    def __len__(self) -> int:
+        return self.page_count
+
+    def __iter__(self) -> Iterator[List[Dict[str, Any]]]:
+        page: List[Dict[str, Any]] = []
+        for row in self.aggregator:
+            page.append(row)
+            if len(page) == self.page_size:
+                yield page
+                page = []
+
+        if page:
+            yield page
+
+
+def compare_row(
+    key: Tuple[Any, ...], current: Optional[State], previous: Optional[State]
+) -> Dict[str, Any]:
+    """
+    Row with the metrics of both periods and their changes.
+    """
+
+    row = state_to_row(key, current or _new_state())
+    other = state_to_row((), previous or _new_state())
+
+    for metric in ["clicks", "impressions", "ctr", "position"]:
+        row[f"previous{metric.capitalize()}"] = other[metric]
+    for metric in ["clicks", "impressions", "ctr", "position"]:
+        row[f"{metric}Change"] = row[metric] - other[metric]
+
+    return row
+
+
+def join_periods(current: Aggregator, previous: Aggregator) -> Iterator[Dict[str, Any]]:
+    """
+    Full outer join of two aggregations on their keys.
+
+    If one of them was spilled, both are spilled and joined partition by
+    partition. They need the same number of partitions, so that a key is in
+    the same partition on both sides. Neither is changed, so they can be
+    joined again.
+    """
+
+    if not current.spilled and not previous.spilled:
+        pairs: Iterable[Tuple[Dict[Any, State], Dict[Any, State]]] = [
+            (current.table, previous.table)
+        ]
+    else:
+        current._spill()
+        previous._spill()
+        pairs = (
+            (current._read_partition(partition), previous._read_partition(partition))
+            for partition in range(current.partitions)
+        )
+
+    for current_table, previous_table in pairs:
+        for key, state in current_table.items():
+            yield compare_row(key, state, previous_table.get(key))
+
+        for key, state in previous_table.items():
+            if key not in current_table:
+                yield compare_row(key, None, state)
+
+
+class JoinedPages:
+    """
+    Pages of the rows of two periods joined by join_periods.
+
+    The join runs again every time the pages are iterated, from the
+    aggregations, so the joined rows are never all in memory.
+    """
+
+    def __init__(
+        self,
+        current: Aggregator,
+        previous: Aggregator,
+        page_count: int,
+        page_size: int = 25000,
+    ) -> None:
+        self.current = current
+        self.previous = previous
+        self.page_count = page_count
+        self.page_size = page_size
+
+    def __len__(self) -> int:
+        return self.page_count
+
+    def __iter__(self) -> Iterator[List[Dict[str, Any]]]:
+        page: List[Dict[str, Any]] = []
+        for row in join_periods(self.current, self.previous):
+            page.append(row)
+            if len(page) == self.page_size:
+                yield page
+                page = []
+
+        if page:
+            yield page
+
+
+class TopRows:
+    """
+    Pages are merged by key as they are appended, only the top n rows by a
+    metric are kept in the end.
+
+    Memory is bounded by the distinct keys, that the Aggregator spills if
+    needed, plus a heap of n rows. The rows are never materialized.
+    """
+
+    def __init__(
+        self,
+        dimensions: List[str],
+        group_by: List[str],
+        n: int,
+        by: str = "clicks",
+        max_keys: int = 500000,
+    ) -> None:
+        if by not in TOP_METRICS:
+            raise InvalidParameterError(
+                f"Can not order by {by}, use one of: {', '.join(TOP_METRICS)}"
+            )
+
+        self.aggregator = Aggregator(
+            dimensions=dimensions, group_by=group_by, max_keys=max_keys
+        )
+        self.n = n
+        self.by = by
+        self.page_count = 0
+        self._top: Optional[List[Dict[str, Any]]] = None
+
+    def append(self, page: List[Dict[str, Any]]) -> None:
+        self.aggregator.update(page)
+        self.page_count += 1
+
+    def __len__(self) -> int:
+        return self.page_count
+
+    def __iter__(self) -> Iterator[List[Dict[str, Any]]]:
+        if self._top is None:
+            # The merged rows can be read once, keep the result for the next exports.
+            self._top = heapq.nlargest(
+                self.n, self.aggregator, key=lambda row: row[self.by]
+            )
+        yield self._top
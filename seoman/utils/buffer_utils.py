@@ -0,0 +1,99 @@
+import marshal
+import os
+import shutil
+import sys
+import tempfile
+import weakref
+from typing import Any, Dict, Iterator, List, Optional
+
+Page = List[Dict[str, Any]]
+
+
+def estimate_size(page: Page, sample: int = 50) -> int:
+    """
+    Approximate memory used by a page of rows, from a sample of it.
+    """
+
+    if not page:
+        return 0
+
+    rows = page[:sample]
+    size = sum(
+        sys.getsizeof(row)
+        + sum(sys.getsizeof(value) for value in row.values())
+        + sum(sys.getsizeof(key) for key in row.get("keys", []))
+        for row in rows
+    )
+    return sys.getsizeof(page) + size * len(page) // len(rows)
+
+
+class RowBuffer:
+    """
+    Pages of rows that are written to segment files on disk once they use more
+    than max_memory bytes. Iterating gives the pages back in the order they were
+    appended, reading the segments one by one.
+    """
+
+    def __init__(self, max_memory: int, directory: Optional[str] = None) -> None:
+        self.max_memory = max_memory
+        self.directory = directory
+        self.pages: List[Page] = []
+        self.memory = 0
+        self.segments: List[str] = []
+        self.page_count = 0
+        self.row_count = 0
+        self._path: Optional[str] = None
+
+    def append(self, page: Page) -> None:
+        self.pages.append(page)
+        self.memory += estimate_size(page)
+        self.page_count += 1
+        self.row_count += len(page)
+
+        if self.memory > self.max_memory:
+            self.spill()
+
+    def spill(self) -> None:
+        """
+        Write the pages in memory to a new segment.
+        """
+
+        if not self.pages:
+            return
+
+        if self._path is None:
+            self._path = tempfile.mkdtemp(prefix="seoman-rows-", dir=self.directory)
+            # Remove the segments when the buffer is garbage collected or at exit.
+            weakref.finalize(self, shutil.rmtree, self._path, True)
+
+        segment = os.path.join(self._path, f"segment-{len(self.segments)}.bin")
+        with open(segment, "wb") as file:
+            for page in self.pages:
+                marshal.dump(page, file)
+
+        self.segments.append(segment)
+        self.pages = []
+        self.memory = 0
+
+    def _read(self, segment: str) -> Iterator[Page]:
+        with open(segment, "rb") as file:
+            while True:
+                try:
+                    yield marshal.load(file)
+                except EOFError:
+                    return
+
+    def __iter__(self) -> Iterator[Page]:
+        for segment in self.segments:
+            yield from self._read(segment)
+
+        yield from self.pages
+
+    def __len__(self) -> int:
+        return self.page_count
+
+    def close(self) -> None:
+        if self._path is not None:
+            shutil.rmtree(self._path, ignore_errors=True)
+            self._path = None
+            self.segments = []
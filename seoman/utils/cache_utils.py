@@ -0,0 +1,63 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from time import time
+from typing import Any, Dict, List, Optional
+
+DEFAULT_SITES_PATH = Path.home() / ".seoman" / "sites.json"
+
+SITES_TTL = 15 * 60
+
+
+def account_key(credentials: Any) -> str:
+    """
+    Identifies the account of the credentials without storing any secret,
+    by the OAuth client and refresh token or the service account email.
+    """
+
+    identity = "|".join(
+        str(getattr(credentials, name, "") or "")
+        for name in ["client_id", "refresh_token", "service_account_email"]
+    )
+    return hashlib.sha256(identity.encode()).hexdigest()[:16]
+
+
+class SitesCache:
+    """
+    Verified sites of each account, kept in a JSON file for ttl seconds.
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl: int = SITES_TTL) -> None:
+        self.path = Path(path) if path else DEFAULT_SITES_PATH
+        self.ttl = ttl
+
+    def _load(self) -> Dict[str, Any]:
+        try:
+            with self.path.open() as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, account: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Cached site entries, None if there are none or they are too old.
+        """
+
+        entry = self._load().get(account)
+
+        if entry is None or time() - entry["created"] > self.ttl:
+            return None
+
+        return entry["siteEntry"]
+
+    def set(self, account: str, sites: List[Dict[str, Any]]) -> None:
+        cache = self._load()
+        cache[account] = {"created": time(), "siteEntry": sites}
+
+        # Replaced atomically, other seoman processes may be reading it.
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = f"{self.path}.{os.getpid()}.tmp"
+        with open(temporary, "w") as file:
+            json.dump(cache, file, indent=4)
+        os.replace(temporary, self.path)
@@ -10,7 +10,23 @@ def dimensions() -> List[str]:
 
 
 def export_type() -> List[str]:
-    return ["json", "csv", "table", "excel", "tsv"]
+    return ["json", "csv", "table", "excel", "tsv", "feather"]
+
+
+def derived_metrics() -> List[str]:
+    return ["all", "ctrDelta", "positionBucket", "clickShare", "pageClickShare"]
+
+
+def comparisons() -> List[str]:
+    return ["previous-period", "previous-year"]
+
+
+def top_metrics() -> List[str]:
+    return ["clicks", "impressions"]
+
+
+def dataset_formats() -> List[str]:
+    return ["parquet", "csv"]
 
 
 def month_complete() -> List[str]:
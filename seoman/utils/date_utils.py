@@ -2,10 +2,13 @@ import json
 import sys
 from datetime import date, datetime, timedelta
 from typing import Dict, List, Optional, Union
+
 import dateparser
 import requests
 import typer  # type: ignore
 
+from ..exceptions import InvalidParameterError
+
 
 def get_start_date(days: int) -> str:
     """
@@ -30,6 +33,54 @@ def days_last_util(days: int) -> Dict[str, str]:
     return {"startDate": startDate, "endDate": endDate}
 
 
+def comparison_range(start: str, end: str, compare: str) -> Dict[str, str]:
+    """
+    Date range to compare start - end with, previous-period or previous-year.
+    """
+    start_date = datetime.strptime(start, "%Y-%m-%d").date()
+    end_date = datetime.strptime(end, "%Y-%m-%d").date()
+
+    if compare == "previous-period":
+        # Same number of days, ending the day before.
+        previous_end = start_date - timedelta(days=1)
+        previous_start = previous_end - (end_date - start_date)
+
+    elif compare == "previous-year":
+
+        def year_before(day: date) -> date:
+            try:
+                return day.replace(year=day.year - 1)
+            except ValueError:
+                # 29 February
+                return day.replace(year=day.year - 1, day=28)
+
+        previous_start, previous_end = year_before(start_date), year_before(end_date)
+
+    else:
+        raise InvalidParameterError(
+            f"Can not compare with {compare}, use previous-period or previous-year"
+        )
+
+    return {"startDate": str(previous_start), "endDate": str(previous_end)}
+
+
+def months_before(day: str, months: int) -> str:
+    """
+    The same day some months before, the last day of the month if it is shorter.
+    """
+    end = datetime.strptime(day, "%Y-%m-%d").date()
+    month = end.month - 1 - months
+    year, month = end.year + month // 12, month % 12 + 1
+
+    for last in [end.day, 30, 29, 28]:
+        try:
+            return str(end.replace(year=year, month=month, day=min(end.day, last)))
+        except ValueError:
+            continue
+
+    return str(end.replace(year=year, month=month, day=28))
+
+
 def create_date(year: int = None, month: int = None) -> str:
     """
     Create a datetime from given year and month if both params are None, use datetime.year.
@@ -75,8 +126,7 @@ def granularity_days(
                 0,
                 (
                     (
-                        datetime.strptime(
-                            dates[0], "%Y-%m-%d") - timedelta(days=1)
+                        datetime.strptime(dates[0], "%Y-%m-%d") - timedelta(days=1)
                     ).strftime("%Y-%m-%d")
                 ),
             )
@@ -85,8 +135,7 @@ def granularity_days(
                 0,
                 (
                     (
-                        datetime.strptime(
-                            dates[0], "%Y-%m-%d") + timedelta(days=1)
+                        datetime.strptime(dates[0], "%Y-%m-%d") + timedelta(days=1)
                     ).strftime("%Y-%m-%d")
                 ),
             )
@@ -104,8 +153,7 @@ def granularity_days(
                 0,
                 (
                     (
-                        datetime.strptime(
-                            dates[0], "%Y-%m-%d") - timedelta(days=4)
+                        datetime.strptime(dates[0], "%Y-%m-%d") - timedelta(days=4)
                     ).strftime("%Y-%m-%d")
                 ),
             )
@@ -138,10 +186,8 @@ def create_date_range(
                 day_interval = get_day_granularity(granularity)
 
         new_end, new_start = (
-            datetime.strptime(
-                end, "%Y-%m-%d").date() + timedelta(days=1),
-            datetime.strptime(
-                start, "%Y-%m-%d").date(),
+            datetime.strptime(end, "%Y-%m-%d").date() + timedelta(days=1),
+            datetime.strptime(start, "%Y-%m-%d").date(),
         )
 
         day_diff = (new_end - new_start).days
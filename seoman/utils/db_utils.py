@@ -0,0 +1,379 @@
+import json
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from ..exceptions import InvalidParameterError
+from .aggregate_utils import state_to_row
+
+DEFAULT_DB_PATH = Path.home() / ".seoman" / "seoman.db"
+
+INDEXED_DIMENSIONS = ["date", "page", "query"]
+
+METRICS = ["clicks", "impressions", "ctr", "position"]
+
+
+def table_name(dimensions: List[str]) -> str:
+    """
+    Every dimension set gets its own table, [query, date] -> rows_date_query
+    """
+
+    return "rows_" + ("_".join(sorted(dimensions)) or "total")
+
+
+def filters_key(body: Dict[Any, Any]) -> str:
+    """
+    Stable representation of the filters of a body.
+    """
+
+    return json.dumps(body.get("dimensionFilterGroups", []), sort_keys=True)
+
+
+class Store:
+    """
+    Local SQLite database for fetched Search Analytics rows.
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = Path(path) if path else DEFAULT_DB_PATH
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Workers of a shared queue write to it from several processes.
+        self.connection = sqlite3.connect(str(self.path), timeout=60)
+
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS partitions ("
+                "site TEXT, search_type TEXT, filters TEXT, dimensions TEXT, date TEXT, complete INTEGER, "
+                "PRIMARY KEY (site, search_type, filters, dimensions, date))"
+            )
+
+    def tables(self) -> Dict[str, List[str]]:
+        """
+        Map of the row tables to their dimensions.
+        """
+
+        names = [
+            name
+            for (name,) in self.connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'rows_%'"
+            )
+        ]
+        return {
+            name: [
+                column[1]
+                for column in self.connection.execute(f'PRAGMA table_info("{name}")')
+                if column[1]
+                not in ["site", "search_type", "filters", "start_date", "end_date"]
+                + METRICS
+            ]
+            for name in names
+        }
+
+    def create_table(self, dimensions: List[str]) -> str:
+        """
+        Create the table and its indexes for a dimension set.
+        """
+
+        name = table_name(dimensions)
+        columns = ", ".join(f'"{dim}" TEXT' for dim in sorted(dimensions))
+
+        with self.connection:
+            self.connection.execute(
+                f'CREATE TABLE IF NOT EXISTS "{name}" ('
+                "site TEXT, search_type TEXT, filters TEXT, start_date TEXT, end_date TEXT, "
+                + (columns + ", " if columns else "")
+                + "clicks INTEGER, impressions INTEGER, ctr REAL, position REAL)"
+            )
+            self.connection.execute(
+                f'CREATE INDEX IF NOT EXISTS "{name}_window" ON "{name}" (site, start_date, end_date)'
+            )
+            for dim in INDEXED_DIMENSIONS:
+                if dim in dimensions:
+                    self.connection.execute(
+                        f'CREATE INDEX IF NOT EXISTS "{name}_{dim}" ON "{name}" ("{dim}")'
+                    )
+
+        return name
+
+    def insert(
+        self, site: str, body: Dict[Any, Any], rows: List[Dict[str, Any]]
+    ) -> None:
+        """
+        Load a page of rows in a single transaction.
+
+        The first page of a window replaces whatever was stored for the same window before.
+        Single day windows are recorded as partitions, complete once the last page, the
+        one not cut by the row limit, is stored after every page before it.
+        """
+
+        dimensions = body.get("dimensions", [])
+        name = self.create_table(dimensions)
+
+        # Rows come in query order, columns are sorted.
+        order = [dimensions.index(dim) for dim in sorted(dimensions)]
+        window = (
+            site,
+            body.get("searchType", "web"),
+            filters_key(body),
+            body.get("startDate"),
+            body.get("endDate"),
+        )
+        placeholders = ", ".join("?" * (len(window) + len(order) + len(METRICS)))
+
+        with self.connection:
+            if not body.get("startRow"):
+                self.connection.execute(
+                    f'DELETE FROM "{name}" WHERE site = ? AND search_type = ? AND filters = ? '
+                    "AND start_date = ? AND end_date = ?",
+                    window,
+                )
+            self.connection.executemany(
+                f'INSERT INTO "{name}" VALUES ({placeholders})',
+                (
+                    window
+                    + tuple(row["keys"][idx] for idx in order)
+                    + (row["clicks"], row["impressions"], row["ctr"], row["position"])
+                    for row in rows
+                ),
+            )
+
+            if body.get("startDate") == body.get("endDate"):
+                last = len(rows) < body.get("rowLimit", 25000)
+                (stored,) = self.connection.execute(
+                    f'SELECT COUNT(*) FROM "{name}" WHERE site = ? AND search_type = ? '
+                    "AND filters = ? AND start_date = ? AND end_date = ?",
+                    window,
+                ).fetchone()
+                # A page before this one is missing if it failed.
+                complete = last and stored == body.get("startRow", 0) + len(rows)
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO partitions VALUES (?, ?, ?, ?, ?, ?)",
+                    window[:3] + (name, window[3], int(complete)),
+                )
+
+    def complete_dates(self, site: str, body: Dict[Any, Any]) -> Set[str]:
+        """
+        Days already stored completely for the dimensions and filters of a body.
+        """
+
+        return {
+            day
+            for (day,) in self.connection.execute(
+                "SELECT date FROM partitions WHERE site = ? AND search_type = ? AND filters = ? "
+                "AND dimensions = ? AND complete = 1",
+                (
+                    site,
+                    body.get("searchType", "web"),
+                    filters_key(body),
+                    table_name(body.get("dimensions", [])),
+                ),
+            )
+        }
+
+    def rollup(self, site: str, body: Dict[Any, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Answer a window from the stored single day partitions.
+
+        A [query] window can be rolled up from [query] or [date, query] partitions
+        if every day of the window is complete. Returns None if it can not.
+        """
+
+        dimensions = body.get("dimensions", [])
+        start, end = body["startDate"], body["endDate"]
+        days = (
+            datetime.strptime(end, "%Y-%m-%d") - datetime.strptime(start, "%Y-%m-%d")
+        ).days + 1
+        window = (site, body.get("searchType", "web"), filters_key(body))
+
+        names = [table_name(dimensions)]
+        if "date" not in dimensions:
+            names.append(table_name(dimensions + ["date"]))
+
+        for name in names:
+            (complete,) = self.connection.execute(
+                "SELECT COUNT(*) FROM partitions WHERE site = ? AND search_type = ? AND filters = ? "
+                "AND dimensions = ? AND date BETWEEN ? AND ? AND complete = 1",
+                window + (name, start, end),
+            ).fetchone()
+
+            if complete == days:
+                break
+        else:
+            return None
+
+        columns = ", ".join(f'"{dim}"' for dim in dimensions)
+        rows = self.connection.execute(
+            f"SELECT {columns + ', ' if columns else ''}SUM(clicks), SUM(impressions), "
+            f'SUM(position * impressions), SUM(position), COUNT(*) FROM "{name}" '
+            "WHERE site = ? AND search_type = ? AND filters = ? "
+            "AND start_date = end_date AND start_date BETWEEN ? AND ? "
+            + (f"GROUP BY {columns} " if columns else "")
+            + "ORDER BY SUM(clicks) DESC LIMIT ? OFFSET ?",
+            window + (start, end, body.get("rowLimit", 25000), body.get("startRow", 0)),
+        ).fetchall()
+
+        size = len(dimensions)
+        data = [
+            state_to_row(tuple(row[:size]), list(row[size:]))
+            for row in rows
+            if row[size] is not None
+        ]
+        return {"rows": data} if data else {}
+
+    def sql(
+        self, statement: str, params: Optional[List[Any]] = None
+    ) -> Tuple[List[str], List[Tuple[Any, ...]]]:
+        """
+        Run an SQL statement, return the headers and the rows.
+        """
+
+        try:
+            cursor = self.connection.execute(statement, params or [])
+        except sqlite3.Error as error:
+            raise InvalidParameterError(f"Query failed: {error}")
+
+        headers = [column[0] for column in cursor.description or []]
+        return headers, cursor.fetchall()
+
+    def top(
+        self,
+        dimension: str,
+        by: str = "clicks",
+        site: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        limit: int = 20,
+        search_type: str = "web",
+    ) -> Tuple[List[str], List[Tuple[Any, ...]]]:
+        """
+        Top values of a dimension, see _source for the rows it is read from.
+        """
+
+        if by not in ["clicks", "impressions"]:
+            raise InvalidParameterError(
+                "Results can be ordered by clicks or impressions."
+            )
+
+        source, params = self._source(
+            dimension, site, start_date, end_date, search_type
+        )
+
+        return self.sql(
+            f'SELECT value AS "{dimension}", SUM(clicks) AS clicks, SUM(impressions) AS impressions, '
+            "CAST(SUM(clicks) AS REAL) / SUM(impressions) AS ctr, "
+            "SUM(position * impressions) / SUM(impressions) AS position "
+            f"FROM ({source}) GROUP BY value ORDER BY {by} DESC LIMIT ?",
+            params + [limit],
+        )
+
+    def totals(
+        self,
+        dimension: str,
+        site: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        search_type: str = "web",
+        batch_size: int = 10000,
+    ) -> Iterator[List[Tuple[str, int, int, float]]]:
+        """
+        (value, clicks, impressions, position) of every value of a dimension,
+        in batches, see _source for the rows they are summed from. SQLite
+        groups them, on disk if they do not fit in memory.
+        """
+
+        source, params = self._source(
+            dimension, site, start_date, end_date, search_type
+        )
+        cursor = self.connection.execute(
+            "SELECT value, SUM(clicks), SUM(impressions), "
+            "COALESCE(SUM(position * impressions) / NULLIF(SUM(impressions), 0), AVG(position)) "
+            f"FROM ({source}) GROUP BY value",
+            params,
+        )
+
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield rows
+
+    def _source(
+        self,
+        dimension: str,
+        site: Optional[str],
+        start_date: Optional[str],
+        end_date: Optional[str],
+        search_type: str,
+    ) -> Tuple[str, List[Any]]:
+        """
+        Subquery of the (value, clicks, impressions, position) rows of a
+        dimension to sum, with its parameters.
+
+        Only single day windows of the search type without filters are read,
+        longer windows cover the same days again and filtered or other
+        search types are other data, summing them would count clicks twice.
+        Every day of a site is read from one table, the one with the fewest
+        dimensions that has rows of it, so days stored only with more
+        dimensions are still counted, once.
+        """
+
+        where = ["start_date = end_date", "search_type = ?", "filters = ?"]
+        params: List[Any] = [search_type, filters_key({})]
+
+        if site is not None:
+            where.append("site = ?")
+            params.append(site)
+        if start_date is not None:
+            where.append("start_date >= ?")
+            params.append(start_date)
+        if end_date is not None:
+            where.append("start_date <= ?")
+            params.append(end_date)
+
+        clause = " AND ".join(where)
+        candidates = sorted(
+            (len(dims), name)
+            for name, dims in self.tables().items()
+            if dimension in dims
+        )
+
+        with self.connection:
+            self.connection.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS source_days ("
+                "source TEXT, source_site TEXT, day TEXT, PRIMARY KEY (source_site, day))"
+            )
+            self.connection.execute("DELETE FROM source_days")
+            for _, name in candidates:
+                self.connection.execute(
+                    "INSERT OR IGNORE INTO source_days "
+                    f'SELECT DISTINCT ?, site, start_date FROM "{name}" WHERE {clause}',
+                    [name] + params,
+                )
+
+        sources = [
+            name
+            for (name,) in self.connection.execute(
+                "SELECT DISTINCT source FROM source_days ORDER BY source"
+            )
+        ]
+        if not sources:
+            raise InvalidParameterError(
+                f"There is no stored daily data with the {dimension} dimension"
+                + (f" for {site}" if site else "")
+                + f" and the {search_type} search type, fetch it with a daily granularity."
+            )
+
+        selects = [
+            f'SELECT "{dimension}" AS value, clicks, impressions, position FROM "{name}" '
+            "JOIN source_days ON source = ? AND source_site = site AND day = start_date "
+            f"WHERE {clause}"
+            for name in sources
+        ]
+        return (
+            " UNION ALL ".join(selects),
+            [value for name in sources for value in [name] + params],
+        )
+
+    def close(self) -> None:
+        self.connection.close()
@@ -0,0 +1,154 @@
+from operator import itemgetter
+from typing import Any, Dict, Iterator, List
+
+from ..exceptions import InvalidParameterError, MissingDependencyError
+
+DERIVED_METRICS = ["ctrDelta", "positionBucket", "clickShare", "pageClickShare"]
+
+# Upper bounds, positions are averages and rounded the way Search Console shows them.
+POSITION_BUCKETS = [3.5, 10.5, 20.5, 50.5]
+POSITION_LABELS = ["1-3", "4-10", "11-20", "21-50", "50+"]
+
+Page = List[Dict[str, Any]]
+
+
+def import_numpy() -> Any:
+    try:
+        import numpy  # type: ignore
+    except ImportError:
+        raise MissingDependencyError(
+            "numpy is needed for derived metrics, install it with: pip install seoman[analysis]"
+        )
+    return numpy
+
+
+def column(page: Page, key: str) -> Any:
+    """
+    A metric of every row of the page as a numpy array.
+    """
+
+    np = import_numpy()
+
+    return np.fromiter(map(itemgetter(key), page), float, len(page))
+
+
+class DerivedRows:
+    """
+    Pages of rows with derived metrics added as new columns.
+
+    A first pass over the pages sums what the derived columns depend on, the
+    clicks and impressions of the whole result and the clicks of every page
+    url, grouped with numpy page by page. The columns of a page are computed
+    with numpy when it is iterated, so only a page of them is in memory at
+    once and this works on spilled rows too.
+
+        ctrDelta        ctr of the row minus the ctr of the whole result
+        positionBucket  1-3, 4-10, 11-20, 21-50 or 50+
+        clickShare      share of the row in all clicks
+        pageClickShare  share of the row in the clicks of its page
+    """
+
+    def __init__(self, rows: Any, dimensions: List[str], metrics: List[str]) -> None:
+        unknown = [metric for metric in metrics if metric not in DERIVED_METRICS]
+        if unknown:
+            raise InvalidParameterError(
+                f"Unknown derived metrics: {', '.join(unknown)}, available ones are: {', '.join(DERIVED_METRICS)}"
+            )
+
+        if "pageClickShare" in metrics and "page" not in dimensions:
+            raise InvalidParameterError("pageClickShare needs the page dimension")
+
+        self.rows = rows
+        self.dimensions = dimensions
+        self.metrics = metrics
+        self.page_index = (
+            dimensions.index("page") if "pageClickShare" in metrics else None
+        )
+        self._totals()
+
+    def _urls(self, page: Page) -> List[str]:
+        return [row["keys"][self.page_index] for row in page]  # type: ignore
+
+    def _totals(self) -> None:
+        np = import_numpy()
+
+        self.total_clicks = 0.0
+        self.total_impressions = 0.0
+        urls, sums = [], []
+
+        for page in self.rows:
+            clicks = column(page, "clicks")
+            self.total_clicks += clicks.sum()
+            self.total_impressions += column(page, "impressions").sum()
+
+            if self.page_index is not None:
+                unique, inverse = np.unique(
+                    np.array(self._urls(page), dtype=str), return_inverse=True
+                )
+                urls.append(unique)
+                sums.append(np.bincount(inverse, weights=clicks, minlength=len(unique)))
+
+        # The sums of every page are reduced once more, by url.
+        unique, inverse = np.unique(
+            np.concatenate(urls) if urls else np.array([], dtype=str),
+            return_inverse=True,
+        )
+        totals = np.bincount(
+            inverse,
+            weights=np.concatenate(sums) if sums else None,
+            minlength=len(unique),
+        )
+        self.page_clicks: Dict[str, float] = dict(zip(unique.tolist(), totals.tolist()))
+
+    def _columns(self, page: Page) -> Dict[str, Any]:
+        np = import_numpy()
+
+        clicks = column(page, "clicks")
+        columns: Dict[str, Any] = {}
+
+        if "ctrDelta" in self.metrics:
+            overall = (
+                self.total_clicks / self.total_impressions
+                if self.total_impressions
+                else 0.0
+            )
+            columns["ctrDelta"] = column(page, "ctr") - overall
+
+        if "positionBucket" in self.metrics:
+            position = column(page, "position")
+            labels = np.array(POSITION_LABELS, dtype=object)
+            columns["positionBucket"] = labels[
+                np.searchsorted(POSITION_BUCKETS, position, side="left")
+            ]
+
+        if "clickShare" in self.metrics:
+            columns["clickShare"] = (
+                clicks / self.total_clicks
+                if self.total_clicks
+                else np.zeros_like(clicks)
+            )
+
+        if "pageClickShare" in self.metrics:
+            page_clicks = np.fromiter(
+                map(self.page_clicks.__getitem__, self._urls(page)), float, len(page)
+            )
+            columns["pageClickShare"] = np.divide(
+                clicks, page_clicks, out=np.zeros_like(clicks), where=page_clicks > 0,
+            )
+
+        # Plain Python values, the exports and json do not know numpy types.
+        return {name: values.tolist() for name, values in columns.items()}
+
+    def __iter__(self) -> Iterator[Page]:
+        for page in self.rows:
+            columns = self._columns(page)
+
+            # Written a column at a time, in the order of the metrics.
+            for name in self.metrics:
+                for row, value in zip(page, columns[name]):
+                    row[name] = value
+
+            yield page
+
+    def __len__(self) -> int:
+        return len(self.rows)
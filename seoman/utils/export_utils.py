@@ -1,22 +1,31 @@
 import csv
 import json
+import os
 import sys
 from collections import OrderedDict
 from time import time
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, Iterator, List, Optional, Union
 
 import typer  # type: ignore
 from halo import Halo  # type: ignore
 from pytablewriter import TsvTableWriter, UnicodeTableWriter  # type: ignore
 
+from .metrics_utils import BYTES_WRITTEN
+from .profile_utils import Profiler, stage
+
 
 class Export:
     def __init__(
-        self, data: Dict[Any, Any] = {}, keys: List[Any] = [], values: List[Any] = []
+        self,
+        data: Dict[Any, Any] = {},
+        keys: List[Any] = [],
+        values: List[Any] = [],
+        profiler: Optional[Profiler] = None,
     ) -> None:
         self.data = data
         self.keys = keys
         self.values = values
+        self.profiler = profiler
 
     def _flatten(self, data: Dict[Any, Any], sep="_") -> OrderedDict:
 
@@ -101,18 +110,107 @@ class Export:
 
                 self.values.append(value)
 
+    def _written(self, filename: str, file_format: str) -> None:
+        """
+        Count the size of an exported file.
+        """
+
+        BYTES_WRITTEN.inc(os.path.getsize(filename), format=file_format)
+
+    def _is_report(self) -> bool:
+        """
+        Search Analytics reports only have rows, they are streamed instead of flattened.
+        """
+
+        return isinstance(self.data, dict) and list(self.data.keys()) == ["rows"]
+
+    def _report_keys(self) -> List[str]:
+        """
+        Headers of a report from its first row [keys0, keys1, clicks, impressions, ...]
+        """
+
+        for page in self.data["rows"]:
+            for row in page:
+                keys: List[str] = []
+                for key, value in row.items():
+                    if key == "keys":
+                        keys.extend(f"keys{idx}" for idx in range(len(value)))
+                    else:
+                        keys.append(key)
+                return keys
+
+        return []
+
+    def _report_page(self, page: List[Dict[str, Any]]) -> List[List[Any]]:
+        rows: List[List[Any]] = []
+        for row in page:
+            values: List[Any] = []
+            for key, value in row.items():
+                if key == "keys":
+                    values.extend(value)
+                else:
+                    values.append(value)
+            rows.append(values)
+        return rows
+
+    def _report_rows(self) -> Iterator[List[Any]]:
+        for page in self.data["rows"]:
+            yield from self._report_page(page)
+
+    def _rows(self) -> Iterator[List[Any]]:
+        """
+        Rows to export, matching the keys.
+        """
+
+        if self._is_report():
+            return self._report_rows()
+
+        sub = len(self.keys)
+        return (self.values[ctr : ctr + sub] for ctr in range(0, len(self.values), sub))
+
     def __preprocess(self) -> None:
         """
         Preprocess the data.
         """
 
-        self._split_to_kv(self._flatten(self.data))
+        with stage(self.profiler, "convert"):
+            if self._is_report():
+                self.keys = self._report_keys()
+            else:
+                self._split_to_kv(self._flatten(self.data))
 
-    def export_to_table(self) -> None:
+    def _chunks(self) -> Iterator[List[List[Any]]]:
+        """
+        Rows a page at a time, for the writers that can write them in parts.
+        """
+
+        if not self._is_report():
+            yield list(self._rows())
+            return
+
+        for page in self.data["rows"]:
+            yield self._report_page(page)
+
+    def _matrix(self) -> List[List[Any]]:
+        """
+        All the rows at once, for the writers that need them in memory.
+        """
+
+        with stage(self.profiler, "convert"):
+            return list(self._rows())
+
+    def export_to_table(self, limit: Optional[int] = 100, pager: bool = False) -> None:
         """
         Export in Unicode Table format.
+
+        Reports show the first limit rows, or all of them through a pager, with
+        the row count and totals below.
         """
 
+        if self._is_report():
+            self._report_table(limit=limit, pager=pager)
+            return
+
         self.__preprocess()
 
         sub = len(self.keys)
@@ -125,9 +223,7 @@ class Export:
         writer.headers = self.keys
 
         if sub >= 1:
-            writer.value_matrix = [
-                self.values[ctr : ctr + sub] for ctr in range(0, len(self.values), sub)
-            ]
+            writer.value_matrix = self._matrix()
         else:
             typer.secho(
                 "An error occured please check your query.",
@@ -136,7 +232,77 @@ class Export:
             )
             sys.exit()
 
-        writer.write_table()
+        with stage(self.profiler, "write"):
+            writer.write_table()
+
+    def _report_table(self, limit: Optional[int], pager: bool) -> None:
+        """
+        Render a report lazily, the totals are counted while the rows go by.
+        """
+
+        from itertools import chain
+
+        from .aggregate_utils import Aggregator
+        from .table_utils import LazyTable
+
+        self.__preprocess()
+
+        if not self.keys:
+            typer.secho(
+                "An error occured please check your query.",
+                fg=typer.colors.RED,
+                bold=True,
+            )
+            sys.exit()
+
+        totals = Aggregator(dimensions=[], group_by=[])
+
+        def rows() -> Iterator[List[Any]]:
+            for page in self.data["rows"]:
+                totals.update(page)
+                for row in page:
+                    values: List[Any] = []
+                    for key, value in row.items():
+                        if key == "keys":
+                            values.extend(value)
+                        else:
+                            values.append(value)
+                    yield values
+
+        with stage(self.profiler, "write"):
+            table = LazyTable(self.keys, rows())
+
+            if pager:
+                typer.echo_via_pager(
+                    line + "\n" for line in chain(table.lines(), self._footer(totals))
+                )
+                return
+
+            for line in table.lines(limit=limit):
+                typer.echo(line)
+
+            # Count the rows that are not shown.
+            for _ in table.remaining():
+                pass
+
+            for line in self._footer(totals, shown=limit):
+                typer.secho(line, bold=True)
+
+    def _footer(self, totals: Any, shown: Optional[int] = None) -> Iterator[str]:
+        total = totals.totals()
+        shown = totals.rows if shown is None else min(shown, totals.rows)
+
+        yield f"{shown:,} of {totals.rows:,} rows" + (
+            ", use --pager to see all of them" if shown < totals.rows else ""
+        )
+
+        if "clicks" not in self.keys:
+            return
+
+        yield (
+            f"Total: {total['clicks']:,} clicks, {total['impressions']:,} impressions, "
+            f"{total['ctr']:.2%} CTR, {total['position']:.1f} average position"
+        )
 
     @Halo("Exporting to JSON", spinner="dots")
     def export_to_json(self, filename: str) -> None:
@@ -144,11 +310,29 @@ class Export:
         Export in JSON format.
         """
 
-        with open(filename, "w") as file:
-            json.dump(self.data, file, indent=4, ensure_ascii=False)
+        with stage(self.profiler, "write"), open(filename, "w") as file:
+            if self._is_report() and not isinstance(self.data["rows"], list):
+                self._dump_report(file)
+            else:
+                json.dump(self.data, file, indent=4, ensure_ascii=False)
+
+        self._written(filename, "json")
 
         print(f"Analytics successfully created in JSON format ✅")
 
+    def _dump_report(self, file: Any) -> None:
+        """
+        Write the report page by page, the same way json.dump writes it at once.
+        """
+
+        from textwrap import indent
+
+        file.write('{\n    "rows": [')
+        for idx, page in enumerate(self.data["rows"]):
+            file.write(",\n" if idx else "\n")
+            file.write(indent(json.dumps(page, indent=4, ensure_ascii=False), " " * 8))
+        file.write("\n    ]\n}" if self.data["rows"] else "]\n}")
+
     @Halo("Exporting to CSV", spinner="dots")
     def export_to_csv(self, filename: str) -> None:
         """
@@ -157,15 +341,14 @@ class Export:
 
         self.__preprocess()
 
-        sub = len(self.keys)
-
         from csv import writer
 
-        with open(filename, "w") as file:
+        with stage(self.profiler, "write"), open(filename, "w") as file:
             csv_writer = writer(file)
             csv_writer.writerow(self.keys)
-            for ctr in range(0, len(self.values), sub):
-                csv_writer.writerow(self.values[ctr : ctr + sub])
+            csv_writer.writerows(self._rows())
+
+        self._written(filename, "csv")
 
         typer.secho(
             "\nAnalytics successfully created in CSV format ✅", bold=True,
@@ -183,9 +366,7 @@ class Export:
         sub = len(self.keys)
 
         if sub >= 1:
-            data = [
-                self.values[ctr : ctr + sub] for ctr in range(0, len(self.values), sub)
-            ]
+            data = self._matrix()
         else:
             typer.secho(
                 "An error occured please check your query.",
@@ -196,16 +377,48 @@ class Export:
 
         data.insert(0, self.keys)
 
-        wb = Workbook()
+        with stage(self.profiler, "write"):
+            wb = Workbook()
+
+            ws = wb.new_sheet("Analytics", data=data)
 
-        ws = wb.new_sheet("Analytics", data=data)
+            wb.save(filename)
 
-        wb.save(filename)
+        self._written(filename, "xlsx")
 
         typer.secho(
             "\nAnalytics successfully created in XLSX format ✅", bold=True,
         )
 
+    @Halo("Exporting to Feather", spinner="dots")
+    def export_to_feather(self, filename: str, dimensions: List[str]) -> None:
+        """
+        Export a report in Feather format, through a DataFrame.
+        """
+
+        from ..exceptions import InvalidParameterError, MissingDependencyError
+        from .frame_utils import pages_to_dataframe
+
+        if not self._is_report():
+            raise InvalidParameterError("Only Search Analytics reports can be feather")
+
+        with stage(self.profiler, "convert"):
+            frame = pages_to_dataframe(self.data["rows"], dimensions)
+
+        with stage(self.profiler, "write"):
+            try:
+                frame.to_feather(filename)
+            except ImportError:
+                raise MissingDependencyError(
+                    "pyarrow is needed for feather, install it with: pip install seoman[analysis]"
+                )
+
+        self._written(filename, "feather")
+
+        typer.secho(
+            "\nAnalytics successfully created in Feather format ✅", bold=True,
+        )
+
     @Halo("Exporting to TSV", spinner="dots")
     def export_to_tsv(self, filename: str) -> None:
         """
@@ -220,9 +433,9 @@ class Export:
 
         writer.headers = self.keys
         if sub >= 1:
-            writer.value_matrix = [
-                self.values[ctr : ctr + sub] for ctr in range(0, len(self.values), sub)
-            ]
+            # Written a page at a time, until the pages run out.
+            writer.value_matrix = self._chunks()  # type: ignore
+            writer.iteration_length = -1
         else:
             typer.secho(
                 "An error occured please check your query.",
@@ -231,7 +444,11 @@ class Export:
             )
             sys.exit()
 
-        writer.dump(filename)
+        with stage(self.profiler, "write"), open(filename, "w") as file:
+            writer.stream = file
+            writer.write_table_iter()
+
+        self._written(filename, "tsv")
         typer.secho(
             "\nAnalytics successfully created in TSV format ✅", bold=True,
         )
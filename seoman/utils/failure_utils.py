@@ -0,0 +1,163 @@
+import asyncio
+import json
+import os
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from time import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_DEAD_LETTERS_PATH = Path.home() / ".seoman" / "dead_letters.json"
+
+
+class CircuitBreaker:
+    """
+    Pauses every request for a while once the API keeps failing.
+
+    After threshold failures in a row the breaker opens for cooldown
+    seconds. The first request after the pause decides: a success closes it,
+    another failure opens it again for twice as long, up to max_cooldown.
+    """
+
+    def __init__(
+        self, threshold: int = 5, cooldown: float = 30.0, max_cooldown: float = 600.0
+    ) -> None:
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.failures = 0
+        self.trips = 0
+        self.opened_until = 0.0
+        self._next_cooldown = cooldown
+
+    def delay(self) -> float:
+        return max(self.opened_until - time(), 0.0)
+
+    async def wait(self) -> None:
+        """
+        Sleep while the breaker is open.
+        """
+
+        delay = self.delay()
+        if delay:
+            await asyncio.sleep(delay)
+
+    def success(self) -> None:
+        self.failures = 0
+        self._next_cooldown = self.cooldown
+
+    def failure(self) -> bool:
+        """
+        Count a failure, returns whether it opened the breaker.
+        """
+
+        if self.delay():
+            # Requests that were already in flight when it opened.
+            return False
+
+        self.failures += 1
+        if self.failures < self.threshold:
+            return False
+
+        self.opened_until = time() + self._next_cooldown
+        self._next_cooldown = min(self._next_cooldown * 2, self.max_cooldown)
+        # Half open, a single failure after the pause opens it again.
+        self.failures = self.threshold - 1
+        self.trips += 1
+        return True
+
+
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """
+    Hold an exclusive lock on path, shared by every process of this host.
+    """
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a+b") as file:
+        try:
+            import fcntl
+        except ImportError:
+            import msvcrt  # type: ignore
+
+            file.seek(0)
+            # Retries for 10 seconds, then raises OSError.
+            msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)  # type: ignore
+            try:
+                yield
+            finally:
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)  # type: ignore
+            return
+
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+
+class DeadLetters:
+    """
+    Windows that still failed after every retry, kept in a JSON file so they
+    can be fetched again later.
+
+    Workers of a queue add to it from several processes, every change reads
+    and replaces the file holding a lock on a file next to it.
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = Path(path) if path else DEFAULT_DEAD_LETTERS_PATH
+        self.lock_path = self.path.with_name(f"{self.path.name}.lock")
+
+    def entries(self) -> List[Dict[str, Any]]:
+        try:
+            with self.path.open() as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return []
+
+    def _write(self, entries: List[Dict[str, Any]]) -> None:
+        # Replaced atomically, like the sites cache.
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = f"{self.path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(temporary, "w") as file:
+            json.dump(entries, file, indent=4)
+        os.replace(temporary, self.path)
+
+    def add(
+        self,
+        site: str,
+        query: str,
+        failures: List[Tuple[Dict[Any, Any], Optional[BaseException]]],
+        database: Optional[str] = None,
+    ) -> None:
+        """
+        Save the failed windows, database is the store they were fetched into.
+        """
+
+        failed = datetime.now().isoformat(timespec="seconds")
+
+        with file_lock(self.lock_path):
+            entries = self.entries()
+            entries.extend(
+                {
+                    "id": uuid.uuid4().hex,
+                    "site": site,
+                    "query": query,
+                    "body": body,
+                    "error": " ".join(str(error).split()) if error is not None else "",
+                    "failed": failed,
+                    "database": database,
+                }
+                for body, error in failures
+            )
+            self._write(entries)
+
+    def remove(self, ids: List[str]) -> None:
+        ids_set = set(ids)
+        with file_lock(self.lock_path):
+            self._write(
+                [entry for entry in self.entries() if entry["id"] not in ids_set]
+            )
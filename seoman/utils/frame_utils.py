@@ -0,0 +1,120 @@
+from array import array
+from typing import Any, Dict, Iterable, List
+
+from ..exceptions import MissingDependencyError
+
+# Dimensions with few distinct values compared to the rows, kept as categories.
+CATEGORICAL_DIMENSIONS = ["country", "device", "page", "query", "searchAppearance"]
+
+# Metrics the API always returns, and the typecodes of their arrays.
+METRIC_TYPES = {"clicks": "q", "impressions": "q", "ctr": "d", "position": "d"}
+
+
+def import_pandas() -> Any:
+    try:
+        import pandas  # type: ignore
+    except ImportError:
+        raise MissingDependencyError(
+            "pandas is needed for DataFrames, install it with: pip install seoman[analysis]"
+        )
+    return pandas
+
+
+def key_names(dimensions: List[str], width: int) -> List[str]:
+    """
+    Names of the keys of the rows, the dimensions of the body unless the rows
+    were merged by every dimension but date.
+    """
+
+    if width == len(dimensions):
+        return dimensions
+
+    merged = [dim for dim in dimensions if dim != "date"]
+    if width == len(merged):
+        return merged
+
+    return [f"keys{idx}" for idx in range(width)]
+
+
+def pages_to_dataframe(
+    pages: Iterable[List[Dict[str, Any]]], dimensions: List[str]
+) -> Any:
+    """
+    DataFrame of the rows of a report, in a single pass over the pages.
+
+    Dimension values are coded while reading them, categorical dimensions
+    become pandas categories from those codes and dates a datetime column.
+    Metrics are collected into typed arrays that numpy wraps without
+    copying, so no per-row dicts or intermediate files are built.
+    """
+
+    pd = import_pandas()
+    import numpy as np  # type: ignore
+
+    names: List[str] = []
+    codes: List[array] = []
+    indexes: List[Dict[str, int]] = []
+    metrics: Dict[str, Any] = {}
+
+    for page in pages:
+        if not page:
+            continue
+
+        if not names:
+            names = key_names(dimensions, len(page[0].get("keys", [])))
+            codes = [array("q") for _ in names]
+            indexes = [{} for _ in names]
+            for name, value in page[0].items():
+                if name == "keys":
+                    continue
+                if name in METRIC_TYPES:
+                    metrics[name] = array(METRIC_TYPES[name])
+                elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                    metrics[name] = array("d")
+                else:
+                    # Derived labels like positionBucket, coded like dimensions.
+                    metrics[name] = ([], {})
+
+        keys = [row["keys"] for row in page]
+        for idx, index in enumerate(indexes):
+            codes[idx].extend([index.setdefault(key[idx], len(index)) for key in keys])
+
+        for name, column in metrics.items():
+            if isinstance(column, tuple):
+                labels, index = column
+                labels.extend([index.setdefault(row[name], len(index)) for row in page])
+            elif column.typecode == "q":
+                column.extend([int(row[name]) for row in page])
+            else:
+                column.extend([row[name] for row in page])
+
+    columns: Dict[str, Any] = {}
+
+    for name, column, index in zip(names, codes, indexes):
+        values = np.frombuffer(column, dtype=np.int64)
+        categories = list(index)
+
+        if name == "date":
+            columns[name] = pd.to_datetime(categories).values.take(values)
+        elif name in CATEGORICAL_DIMENSIONS:
+            columns[name] = pd.Categorical.from_codes(values, categories=categories)
+        else:
+            columns[name] = np.array(categories, dtype=object).take(values)
+
+    for name, column in metrics.items():
+        if isinstance(column, tuple):
+            labels, index = column
+            columns[name] = pd.Categorical.from_codes(
+                np.array(labels, dtype=np.int64), categories=list(index)
+            )
+        else:
+            columns[name] = np.frombuffer(
+                column, dtype=np.int64 if column.typecode == "q" else np.float64
+            )
+
+    if not columns:
+        return pd.DataFrame(
+            columns=key_names(dimensions, len(dimensions)) + list(METRIC_TYPES)
+        )
+
+    return pd.DataFrame(columns, copy=False)
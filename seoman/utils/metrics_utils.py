@@ -0,0 +1,279 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from .profile_utils import LATENCY_BUCKETS
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: List[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+class Metric:
+    """
+    A metric family, its children are created per label values.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: List[str]) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = labels
+        self.lock = threading.Lock()
+        self.children: Dict[Tuple[str, ...], Any] = OrderedDict()
+
+    def _new_child(self) -> Any:
+        return [0.0]
+
+    def _child(self, **labels: str) -> Any:
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self.lock:
+            if key not in self.children:
+                self.children[key] = self._new_child()
+            return self.children[key]
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        with self.lock:
+            for key, child in self.children.items():
+                lines.append(
+                    f"{self.name}{_labels(self.label_names, key)} {_number(child[0])}"
+                )
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        child = self._child(**labels)
+        with self.lock:
+            child[0] += amount
+
+    def value(self, **labels: str) -> float:
+        return self._child(**labels)[0]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        child = self._child(**labels)
+        with self.lock:
+            child[0] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: List[str],
+        buckets: List[float] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self.buckets = buckets
+
+    def _new_child(self) -> Any:
+        # Bucket counts, then sum and count.
+        return [0.0] * (len(self.buckets) + 2)
+
+    def observe(self, value: float, **labels: str) -> None:
+        child = self._child(**labels)
+        with self.lock:
+            for idx, bound in enumerate(self.buckets):
+                if value <= bound:
+                    child[idx] += 1
+            child[-2] += value
+            child[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        with self.lock:
+            for key, child in self.children.items():
+                bounds = [f'le="{bound}"' for bound in self.buckets] + ['le="+Inf"']
+                counts = child[: len(self.buckets)] + [child[-1]]
+                for bound, count in zip(bounds, counts):
+                    lines.append(
+                        f"{self.name}_bucket{_labels(self.label_names, key, bound)} {_number(count)}"
+                    )
+                lines.append(
+                    f"{self.name}_sum{_labels(self.label_names, key)} {_number(child[-2])}"
+                )
+                lines.append(
+                    f"{self.name}_count{_labels(self.label_names, key)} {_number(child[-1])}"
+                )
+        return lines
+
+
+class Registry:
+    """
+    In-process metrics, rendered in the Prometheus text format.
+    """
+
+    def __init__(self) -> None:
+        self.metrics: Dict[str, Metric] = OrderedDict()
+
+    def register(self, metric: Any) -> Any:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, filename: str) -> None:
+        """
+        Write the metrics for node_exporter's textfile collector.
+
+        The file is replaced atomically so the collector never reads half of it.
+        """
+
+        temporary = f"{filename}.{os.getpid()}.tmp"
+        with open(temporary, "w") as file:
+            file.write(self.render())
+        os.replace(temporary, filename)
+
+    def serve(self, port: int, address: str = "") -> threading.Thread:
+        """
+        Serve the metrics over HTTP from a daemon thread.
+        """
+
+        from http.server import BaseHTTPRequestHandler, HTTPServer
+
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+        server = HTTPServer((address, port), Handler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+REGISTRY = Registry()
+
+API_CALLS = REGISTRY.register(
+    Counter("seoman_api_calls_total", "Search Console API calls.", ["query"])
+)
+API_ERRORS = REGISTRY.register(
+    Counter(
+        "seoman_api_errors_total", "Search Console API calls that failed.", ["query"]
+    )
+)
+QUOTA_ERRORS = REGISTRY.register(
+    Counter(
+        "seoman_quota_errors_total",
+        "Search Console API calls rejected because of quota or rate limits.",
+        ["query"],
+    )
+)
+QUOTA_WAIT = REGISTRY.register(
+    Counter(
+        "seoman_quota_wait_seconds_total",
+        "Time spent waiting for the quota shared with other seoman processes.",
+        ["query"],
+    )
+)
+DEAD_LETTERS = REGISTRY.register(
+    Counter(
+        "seoman_dead_letters_total",
+        "Windows that still failed after the final pass, saved to be fetched again.",
+        ["query"],
+    )
+)
+RETRIES = REGISTRY.register(
+    Counter(
+        "seoman_retries_total", "Search Console API calls that were retried.", ["query"]
+    )
+)
+ROWS_FETCHED = REGISTRY.register(
+    Counter(
+        "seoman_rows_fetched_total",
+        "Rows returned by the API or the local store.",
+        ["query"],
+    )
+)
+BYTES_WRITTEN = REGISTRY.register(
+    Counter("seoman_bytes_written_total", "Bytes written to export files.", ["format"])
+)
+CACHE_HITS = REGISTRY.register(
+    Counter(
+        "seoman_cache_hits_total", "Windows answered from the local store.", ["query"]
+    )
+)
+CACHE_MISSES = REGISTRY.register(
+    Counter(
+        "seoman_cache_misses_total",
+        "Windows sent to the API although a store was attached.",
+        ["query"],
+    )
+)
+CACHE_HIT_RATIO = REGISTRY.register(
+    Gauge(
+        "seoman_cache_hit_ratio",
+        "Share of windows answered from the local store.",
+        ["query"],
+    )
+)
+REQUEST_DURATION = REGISTRY.register(
+    Histogram(
+        "seoman_request_duration_seconds",
+        "Latency of Search Console API calls.",
+        ["query"],
+    )
+)
+QUERY_DURATION = REGISTRY.register(
+    Histogram(
+        "seoman_query_duration_seconds",
+        "Duration of a whole query, from planning to the last page.",
+        ["query"],
+        buckets=[1, 5, 15, 30, 60, 300, 900, 1800, 3600],
+    )
+)
+LAST_SUCCESS = REGISTRY.register(
+    Gauge(
+        "seoman_last_success_timestamp_seconds",
+        "When a query last finished.",
+        ["query"],
+    )
+)
+
+
+def update_cache_ratio(query: str) -> None:
+    hits, misses = CACHE_HITS.value(query=query), CACHE_MISSES.value(query=query)
+    if hits + misses:
+        CACHE_HIT_RATIO.set(hits / (hits + misses), query=query)
@@ -0,0 +1,107 @@
+import heapq
+import re
+from typing import Any, Dict, Iterable, List, Tuple
+
+from ..exceptions import InvalidParameterError
+from .aggregate_utils import TOP_METRICS, Aggregator, state_to_row
+
+TOKEN = re.compile(r"\w+")
+
+# (query, clicks, impressions, position) of a query, merged over every row of it.
+QueryTotals = Tuple[str, float, float, float]
+
+
+def tokenize(query: str) -> List[str]:
+    """
+    Words of a query, lowercased, punctuation is dropped.
+    """
+
+    return TOKEN.findall(query.lower())
+
+
+def query_ngrams(tokens: List[str], sizes: List[int]) -> List[Tuple[int, str]]:
+    """
+    (n, n-gram) of the tokens of a query, every n-gram once even if the query
+    repeats it, so its clicks are not counted twice.
+    """
+
+    grams: Dict[Tuple[int, str], None] = {}
+    for n in sizes:
+        for start in range(len(tokens) - n + 1):
+            grams[n, " ".join(tokens[start : start + n])] = None
+    return list(grams)
+
+
+class NgramCounter:
+    """
+    Clicks, impressions and position of the words and phrases of queries.
+
+    Queries should come merged, one row per distinct query, so each one is
+    tokenized once. The n-grams of a batch of queries are summed by the
+    Aggregator, which spills to disk past max_keys n-grams, and the top ones
+    are picked with a heap of limit rows per n, so memory stays bounded
+    whatever the number of queries.
+    """
+
+    def __init__(self, sizes: List[int], max_keys: int = 500000) -> None:
+        if not sizes or min(sizes) < 1:
+            raise InvalidParameterError("n-grams need n of at least 1")
+
+        self.sizes = sorted(set(sizes))
+        self.aggregator = Aggregator(
+            dimensions=["n", "ngram"], group_by=["n", "ngram"], max_keys=max_keys
+        )
+        self.queries = 0
+
+    def update(self, queries: Iterable[QueryTotals]) -> None:
+        """
+        Add a batch of merged queries.
+        """
+
+        rows = []
+        for query, clicks, impressions, position in queries:
+            metrics = {
+                "clicks": clicks,
+                "impressions": impressions,
+                "position": position,
+            }
+            for n, gram in query_ngrams(tokenize(query), self.sizes):
+                rows.append({"keys": [n, gram], **metrics})
+            self.queries += 1
+
+        self.aggregator.update(rows)
+
+    def top(self, limit: int, by: str = "clicks") -> Dict[int, List[Dict[str, Any]]]:
+        """
+        The limit n-grams with the most clicks or impressions, for every n.
+        The n-grams can be read once.
+        """
+
+        if limit < 1:
+            raise InvalidParameterError(f"Show at least 1 n-gram, not {limit}")
+
+        if by not in TOP_METRICS:
+            raise InvalidParameterError(
+                f"Can not order by {by}, use one of: {', '.join(TOP_METRICS)}"
+            )
+
+        metric = TOP_METRICS.index(by)
+        heaps: Dict[int, List[Tuple[float, str, Any]]] = {n: [] for n in self.sizes}
+
+        for (n, gram), state in self.aggregator.states():
+            heap = heaps[n]
+            item = (state[metric], gram, state)
+            if len(heap) < limit:
+                heapq.heappush(heap, item)
+            elif item[:2] > heap[0][:2]:
+                heapq.heapreplace(heap, item)
+
+        top: Dict[int, List[Dict[str, Any]]] = {}
+        for n, heap in heaps.items():
+            top[n] = []
+            for _, gram, state in sorted(heap, key=lambda item: item[:2], reverse=True):
+                row = state_to_row((), state)
+                # Rows of the aggregation are the queries that have the n-gram.
+                top[n].append({"ngram": gram, "queries": int(state[4]), **row})
+
+        return top
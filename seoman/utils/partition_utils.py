@@ -0,0 +1,194 @@
+import csv
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import quote
+
+from ..exceptions import InvalidParameterError, MissingDependencyError
+from .metrics_utils import BYTES_WRITTEN
+
+DATASET_FORMATS = ["parquet", "csv"]
+
+INTEGER_METRICS = ["clicks", "impressions"]
+FLOAT_METRICS = ["ctr", "position"]
+
+
+def query_description(body: Dict[Any, Any]) -> Dict[str, Any]:
+    """
+    What decides the columns and the meaning of the rows of a window.
+    """
+
+    return {
+        "dimensions": sorted(body.get("dimensions", [])),
+        "searchType": body.get("searchType", "web"),
+        "aggregationType": body.get("aggregationType", "auto"),
+        "dimensionFilterGroups": body.get("dimensionFilterGroups", []),
+    }
+
+
+def query_key(body: Dict[Any, Any]) -> str:
+    """
+    Short hash of the query description, windows of other dimensions,
+    search types or filters never share a partition.
+    """
+
+    description = json.dumps(query_description(body), sort_keys=True)
+    return hashlib.sha1(description.encode()).hexdigest()[:12]
+
+
+def partition_values(site: str, body: Dict[Any, Any]) -> List[List[str]]:
+    """
+    Partition keys of a window, the same ones for days and longer windows.
+    Values are escaped like Hive does.
+    """
+
+    return [
+        ["query", query_key(body)],
+        ["site", quote(site, safe="")],
+        ["start_date", body["startDate"]],
+        ["end_date", body["endDate"]],
+    ]
+
+
+class PartitionedWriter:
+    """
+    Writes every window as a directory of its own,
+
+        root/query=3f2a9c0d1b7e/site=sc-domain%3Aexample.com/
+            start_date=2020-03-01/end_date=2020-03-01/part-0.parquet
+
+    so readers can skip the partitions they do not need and a new run only
+    replaces the partitions of its windows. Each page of a window is a
+    part file. The first page builds the partition in a hidden directory
+    and swaps it with the old one, later pages are added to it with atomic
+    renames, so readers never see a file half written.
+
+    Every query=... directory holds windows of the same dimensions, search
+    type and filters, so its files share one schema, the dimensions sorted
+    then the metrics. Its _query.json tells which query it is. Partition
+    keys are left out of the files, as Hive readers expect.
+    """
+
+    def __init__(self, root: str, file_format: str = "parquet") -> None:
+        if file_format not in DATASET_FORMATS:
+            raise InvalidParameterError(
+                f"Unknown dataset format {file_format}, use one of: "
+                + ", ".join(DATASET_FORMATS)
+            )
+
+        if file_format == "parquet":
+            try:
+                import pyarrow  # type: ignore
+            except ImportError:
+                raise MissingDependencyError(
+                    "pyarrow is needed for parquet, install it with: pip install seoman[analysis]"
+                )
+
+        self.root = Path(root)
+        self.file_format = file_format
+        self.partitions = 0
+
+    def path(self, site: str, body: Dict[Any, Any]) -> Path:
+        return self.root.joinpath(
+            *(f"{key}={value}" for key, value in partition_values(site, body))
+        )
+
+    def _describe(self, body: Dict[Any, Any]) -> None:
+        directory = self.root / f"query={query_key(body)}"
+        description = directory / "_query.json"
+        if description.exists():
+            return
+
+        directory.mkdir(parents=True, exist_ok=True)
+        temporary = directory / f".{description.name}.{os.getpid()}.tmp"
+        with open(temporary, "w") as file:
+            json.dump(query_description(body), file, indent=4)
+        os.replace(temporary, description)
+
+    def _columns(
+        self, body: Dict[Any, Any], rows: List[Dict[str, Any]]
+    ) -> Dict[str, List[Any]]:
+        dimensions = body.get("dimensions", [])
+
+        columns: Dict[str, List[Any]] = {}
+        for name in sorted(dimensions):
+            idx = dimensions.index(name)
+            columns[name] = [row["keys"][idx] for row in rows]
+
+        for name in INTEGER_METRICS:
+            columns[name] = [int(row[name]) for row in rows]
+        for name in FLOAT_METRICS:
+            columns[name] = [float(row[name]) for row in rows]
+
+        return columns
+
+    def _write_part(self, filename: Path, columns: Dict[str, List[Any]]) -> None:
+        temporary = filename.with_name(f".{filename.name}.{os.getpid()}.tmp")
+
+        if self.file_format == "parquet":
+            import pyarrow  # type: ignore
+            import pyarrow.parquet  # type: ignore
+
+            types = {
+                **{name: pyarrow.string() for name in columns},
+                **{name: pyarrow.int64() for name in INTEGER_METRICS},
+                **{name: pyarrow.float64() for name in FLOAT_METRICS},
+            }
+            table = pyarrow.table(
+                {
+                    name: pyarrow.array(values, type=types[name])
+                    for name, values in columns.items()
+                }
+            )
+            pyarrow.parquet.write_table(table, str(temporary))
+        else:
+            with open(temporary, "w", newline="", encoding="utf-8") as file:
+                writer = csv.writer(file)
+                writer.writerow(list(columns))
+                writer.writerows(zip(*columns.values()))
+
+        BYTES_WRITTEN.inc(os.path.getsize(temporary), format=self.file_format)
+        os.replace(temporary, filename)
+
+    def write(
+        self, site: str, body: Dict[Any, Any], rows: List[Dict[str, Any]]
+    ) -> Path:
+        """
+        Write a page of a window, the first page replaces the partition.
+        """
+
+        partition = self.path(site, body)
+        start_row = body.get("startRow", 0)
+        # 24,999 and 25,000 both start the second page.
+        part = -(-start_row // body.get("rowLimit", 25000))
+        filename = f"part-{part}.{self.file_format}"
+        columns = self._columns(body, rows)
+
+        if part:
+            partition.mkdir(parents=True, exist_ok=True)
+            self._write_part(partition / filename, columns)
+            return partition
+
+        self._describe(body)
+        partition.parent.mkdir(parents=True, exist_ok=True)
+        suffix = f"{os.getpid()}.{uuid.uuid4().hex[:8]}"
+        staging = partition.with_name(f".{partition.name}.{suffix}.tmp")
+        staging.mkdir()
+        self._write_part(staging / filename, columns)
+
+        old: Optional[Path] = partition.with_name(f".{partition.name}.{suffix}.old")
+        try:
+            os.rename(partition, old)  # type: ignore
+        except FileNotFoundError:
+            old = None
+        os.rename(staging, partition)
+
+        if old is not None:
+            shutil.rmtree(old, ignore_errors=True)
+
+        self.partitions += 1
+        return partition
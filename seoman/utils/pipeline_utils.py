@@ -0,0 +1,175 @@
+import csv
+import io
+import json
+import os
+import queue
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from textwrap import indent
+from time import perf_counter
+from typing import Any, Dict, List, Optional
+
+from ..exceptions import InvalidParameterError
+from .metrics_utils import BYTES_WRITTEN
+from .profile_utils import Profiler
+
+FORMATS = ["csv", "json"]
+
+Page = List[Dict[str, Any]]
+
+
+def convert_header(row: Dict[str, Any]) -> str:
+    """
+    CSV header of a report from one of its rows [keys0, keys1, clicks, ...]
+    """
+
+    header: List[str] = []
+    for key, value in row.items():
+        if key == "keys":
+            header.extend(f"keys{idx}" for idx in range(len(value)))
+        else:
+            header.append(key)
+
+    buffer = io.StringIO(newline="")
+    csv.writer(buffer).writerow(header)
+    return buffer.getvalue()
+
+
+def convert_page(page: Page, file_format: str, first: bool) -> str:
+    """
+    Text of a page in the export format, run in the worker processes.
+
+    The output is the same as Export writes for the page, so the chunks can be
+    concatenated in order.
+    """
+
+    if file_format == "json":
+        text = indent(json.dumps(page, indent=4, ensure_ascii=False), " " * 8)
+        return ("\n" if first else ",\n") + text
+
+    buffer = io.StringIO(newline="")
+    writer = csv.writer(buffer)
+    for row in page:
+        values: List[Any] = []
+        for key, value in row.items():
+            if key == "keys":
+                values.extend(value)
+            else:
+                values.append(value)
+        writer.writerow(values)
+    return buffer.getvalue()
+
+
+class Pipeline:
+    """
+    Converts and writes pages to a file while the next ones are being fetched.
+
+    Pages are appended in order, the same way as to the rows list. Each one is
+    converted in a process pool and a writer thread writes the converted
+    chunks in the order the pages came in. At most queue_size pages wait for
+    the writer, appending blocks until there is room.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        file_format: str,
+        workers: Optional[int] = None,
+        queue_size: int = 8,
+        profiler: Optional[Profiler] = None,
+    ) -> None:
+        if file_format not in FORMATS:
+            raise InvalidParameterError(
+                f"Pipelined export supports {', '.join(FORMATS)}, not {file_format}"
+            )
+
+        self.filename = filename
+        self.file_format = file_format
+        self.profiler = profiler
+        self.page_count = 0
+        self.row_count = 0
+        self.header_written = False
+        self.error: Optional[BaseException] = None
+
+        self.file = open(filename, "w")
+        if file_format == "json":
+            self.file.write('{\n    "rows": [')
+
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.queue: "queue.Queue[Optional[Future]]" = queue.Queue(maxsize=queue_size)
+        self.writer = threading.Thread(target=self._write, daemon=True)
+        self.writer.start()
+
+    def _write(self) -> None:
+        while True:
+            future = self.queue.get()
+            if future is None:
+                return
+
+            try:
+                if self.error is None:
+                    self.file.write(future.result())
+            except BaseException as error:
+                # Keep draining the queue so append does not block, raise on close.
+                self.error = error
+
+    def append(self, page: Page) -> None:
+        if self.error is not None:
+            raise self.error
+
+        if page and self.file_format == "csv" and not self.header_written:
+            # Goes through the queue too, only the writer thread touches the file.
+            header: Future = Future()
+            header.set_result(convert_header(page[0]))
+            self.queue.put(header)
+            self.header_written = True
+
+        future = self.executor.submit(
+            convert_page, page, self.file_format, self.page_count == 0
+        )
+        self.queue.put(future)
+        self.page_count += 1
+        self.row_count += len(page)
+
+    def __len__(self) -> int:
+        return self.page_count
+
+    def __iter__(self) -> Any:
+        raise InvalidParameterError(
+            "Pages were written to the export file, they are not kept in memory"
+        )
+
+    def close(self) -> None:
+        """
+        Wait for the remaining pages and close the file.
+        """
+
+        started = perf_counter()
+
+        self.queue.put(None)
+        self.writer.join()
+        self.executor.shutdown()
+
+        if self.file_format == "json":
+            self.file.write("\n    ]\n}" if self.page_count else "]\n}")
+        self.file.close()
+
+        if self.profiler is not None:
+            # Conversion overlapped the fetch, only the tail is left to wait for.
+            self.profiler.stages["write"] += perf_counter() - started
+
+        if self.error is not None:
+            raise self.error
+
+        BYTES_WRITTEN.inc(os.path.getsize(self.filename), format=self.file_format)
+
+    def discard(self) -> None:
+        """
+        Close and remove the file, when nothing was fetched.
+        """
+
+        self.queue.put(None)
+        self.writer.join()
+        self.executor.shutdown()
+        self.file.close()
+        os.remove(self.filename)
@@ -0,0 +1,69 @@
+from time import time
+from typing import Any, List, Optional
+
+from ..exceptions import InvalidParameterError
+from .quota_utils import QuotaManager
+
+
+class PoolMember:
+    """
+    One of the credentials of a pool, with the service built for it.
+    """
+
+    def __init__(
+        self,
+        service: Any,
+        credentials: Any,
+        quota: Optional[QuotaManager] = None,
+        name: str = "",
+    ) -> None:
+        self.service = service
+        self.credentials = credentials
+        self.quota = quota
+        self.name = name
+        self.throttled_until = 0.0
+        self.queries = 0
+
+
+class CredentialPool:
+    """
+    Credentials of several accounts that can read the same properties, the
+    queries are spread over them in turn.
+
+    A member whose query hit its quota is skipped for cooldown seconds and
+    the query goes to the next one. When all of them are throttled the one
+    that is free soonest is used anyway.
+    """
+
+    def __init__(self, members: List[PoolMember], cooldown: float = 60.0) -> None:
+        if not members:
+            raise InvalidParameterError("A credential pool needs at least one member")
+
+        self.members = members
+        self.cooldown = cooldown
+        self._next = 0
+
+    def __len__(self) -> int:
+        return len(self.members)
+
+    def next(self) -> PoolMember:
+        """
+        The next member that is not throttled.
+        """
+
+        now = time()
+        count = len(self.members)
+
+        for offset in range(count):
+            member = self.members[(self._next + offset) % count]
+            if member.throttled_until <= now:
+                self._next = (self._next + offset + 1) % count
+                break
+        else:
+            member = min(self.members, key=lambda member: member.throttled_until)
+
+        member.queries += 1
+        return member
+
+    def throttle(self, member: PoolMember) -> None:
+        member.throttled_until = time() + self.cooldown
@@ -0,0 +1,200 @@
+import json
+import sys
+from collections import OrderedDict
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Any, Dict, Iterator, List, Optional
+
+import typer  # type: ignore
+
+LATENCY_BUCKETS = [0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+STAGES = ["plan", "fetch", "convert", "write"]
+
+
+def peak_rss() -> Optional[float]:
+    """
+    Peak resident memory of the process in MB, None where it is not available.
+    """
+
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+class Profiler:
+    """
+    Records request latencies, retries, rows per page and the time spent in each
+    stage of a run. Attach it to SearchAnalytics.profiler to collect a report.
+    """
+
+    def __init__(self, cprofile: Optional[str] = None) -> None:
+        self.latencies: List[float] = []
+        self.rows_per_page: List[int] = []
+        self.retries = 0
+        self.retry_sleep = 0.0
+        self.failures = 0
+        self.stages: Dict[str, float] = OrderedDict((stage, 0.0) for stage in STAGES)
+        self.cprofile = cprofile
+        self._cprofiler: Any = None
+
+        if cprofile is not None:
+            import cProfile
+
+            self._cprofiler = cProfile.Profile()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Time a stage, stages can be entered more than once.
+        """
+
+        started = perf_counter()
+        if self._cprofiler is not None:
+            self._cprofiler.enable()
+        try:
+            yield
+        finally:
+            if self._cprofiler is not None:
+                self._cprofiler.disable()
+            self.stages[name] = self.stages.get(name, 0.0) + perf_counter() - started
+
+    def request(self, seconds: float, rows: Optional[int] = None) -> None:
+        """
+        Record a finished API request.
+        """
+
+        self.latencies.append(seconds)
+        if rows is not None:
+            self.rows_per_page.append(rows)
+
+    def retry(self, sleep: float) -> None:
+        self.retries += 1
+        self.retry_sleep += sleep
+
+    def failure(self) -> None:
+        self.failures += 1
+
+    def histogram(self) -> Dict[str, int]:
+        """
+        Count of requests per latency bucket.
+        """
+
+        buckets: Dict[str, int] = OrderedDict(
+            (f"<={bound}s", 0) for bound in LATENCY_BUCKETS
+        )
+        buckets[f">{LATENCY_BUCKETS[-1]}s"] = 0
+
+        for latency in self.latencies:
+            for bound in LATENCY_BUCKETS:
+                if latency <= bound:
+                    buckets[f"<={bound}s"] += 1
+                    break
+            else:
+                buckets[f">{LATENCY_BUCKETS[-1]}s"] += 1
+
+        return buckets
+
+    def report(self) -> Dict[str, Any]:
+        latencies, rows = self.latencies, self.rows_per_page
+
+        return {
+            "stages": dict(self.stages),
+            "requests": {
+                "count": len(latencies),
+                "retries": self.retries,
+                "retry_sleep": self.retry_sleep,
+                "failures": self.failures,
+                "latency": {
+                    "total": sum(latencies),
+                    "p50": percentile(latencies, 0.5) if latencies else None,
+                    "p95": percentile(latencies, 0.95) if latencies else None,
+                    "max": max(latencies) if latencies else None,
+                    "histogram": self.histogram(),
+                },
+            },
+            "rows_per_page": {
+                "pages": len(rows),
+                "total": sum(rows),
+                "min": min(rows) if rows else None,
+                "max": max(rows) if rows else None,
+                "mean": sum(rows) / len(rows) if rows else None,
+            },
+            "peak_rss_mb": peak_rss(),
+        }
+
+    def print_report(self) -> None:
+        report = self.report()
+        requests, latency, rows = (
+            report["requests"],
+            report["requests"]["latency"],
+            report["rows_per_page"],
+        )
+
+        typer.secho("\nProfile", fg=typer.colors.BRIGHT_BLUE, bold=True)
+        for stage, seconds in report["stages"].items():
+            typer.echo(f"  {stage:<10}{seconds:10.2f}s")
+
+        typer.echo(
+            f"  {'requests':<10}{requests['count']:10} "
+            f"({requests['retries']} retried, {requests['retry_sleep']:.1f}s sleeping, {requests['failures']} failed)"
+        )
+        if requests["count"]:
+            typer.echo(
+                f"  {'latency':<10}{latency['total']:10.2f}s "
+                f"p50 {latency['p50']:.2f}s, p95 {latency['p95']:.2f}s, max {latency['max']:.2f}s"
+            )
+            typer.echo(
+                f"  {'':<10}"
+                + ", ".join(
+                    f"{bucket}: {count}"
+                    for bucket, count in latency["histogram"].items()
+                    if count
+                )
+            )
+        if rows["pages"]:
+            typer.echo(
+                f"  {'rows/page':<10}{rows['mean']:10.0f} "
+                f"min {rows['min']}, max {rows['max']}, {rows['total']} rows in {rows['pages']} pages"
+            )
+        if report["peak_rss_mb"] is not None:
+            typer.echo(f"  {'peak RSS':<10}{report['peak_rss_mb']:10.0f} MB")
+
+    def dump(self, filename: str) -> None:
+        """
+        Write the report as JSON.
+        """
+
+        with open(filename, "w") as file:
+            json.dump(self.report(), file, indent=4)
+
+    def dump_cprofile(self) -> None:
+        """
+        Write the cProfile stats of the profiled stages, if they were collected.
+        """
+
+        if self._cprofiler is not None and self.cprofile is not None:
+            self._cprofiler.dump_stats(self.cprofile)
+
+
+@contextmanager
+def stage(profiler: Optional[Profiler], name: str) -> Iterator[None]:
+    """
+    Profiler.stage that does nothing when there is no profiler.
+    """
+
+    if profiler is None:
+        yield
+    else:
+        with profiler.stage(name):
+            yield
@@ -0,0 +1,242 @@
+import json
+import os
+import socket
+import sqlite3
+import uuid
+from pathlib import Path
+from time import time
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+DEFAULT_QUEUE_PATH = Path.home() / ".seoman" / "queue.db"
+
+STATES = ["pending", "leased", "done", "failed"]
+
+
+def worker_name() -> str:
+    """
+    Name of this process among the workers of every host.
+    """
+
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class Task(NamedTuple):
+    """
+    A page of a window, leased by a worker.
+    """
+
+    id: int
+    site: str
+    body: Dict[Any, Any]
+    priority: int
+    attempts: int
+
+
+class WorkQueue:
+    """
+    Tasks shared by seoman processes through a SQLite file, on this host or
+    on the hosts that mount the same volume.
+
+    A worker leases tasks for lease_seconds and keeps them with heartbeat
+    while it works on them. A task whose lease ran out, because its worker
+    died or hung, is handed to the next worker that asks. Tasks are leased
+    by priority, then in the order they were published. A task that was
+    leased max_attempts times and still did not finish is left as failed,
+    the worker that finds it so is handed it in expired, to report it.
+
+    A task is a site and a body, publishing it again while it waits or runs
+    does nothing, so publishers can not make workers fetch a page twice.
+
+    Mind that SQLite locks are not reliable on every network file system.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        lease_seconds: float = 60.0,
+        max_attempts: int = 3,
+    ) -> None:
+        self.path = Path(path) if path else DEFAULT_QUEUE_PATH
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.expired: List[Task] = []
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Transactions are started by hand, BEGIN IMMEDIATE locks the file.
+        self.connection = sqlite3.connect(
+            str(self.path), timeout=60, isolation_level=None
+        )
+
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS tasks ("
+            "id INTEGER PRIMARY KEY, site TEXT, body TEXT, priority INTEGER, "
+            "rank INTEGER, state TEXT, worker TEXT, lease_until REAL, attempts INTEGER, "
+            "error TEXT)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS tasks_order ON tasks (state, priority, rank, id)"
+        )
+        self.connection.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS tasks_unique ON tasks (site, body)"
+        )
+
+    def _transaction(self, statements: Any) -> Any:
+        connection = self.connection
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            result = statements(connection)
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        return result
+
+    def _insert(
+        self,
+        connection: sqlite3.Connection,
+        tasks: Iterable[Tuple[int, str, Dict[Any, Any]]],
+        rank: int,
+    ) -> int:
+        # Tasks that already failed are tried again, the others are kept as they are.
+        return connection.executemany(
+            "INSERT INTO tasks (site, body, priority, rank, state, attempts, error) "
+            "VALUES (?, ?, ?, ?, 'pending', 0, '') "
+            "ON CONFLICT (site, body) DO UPDATE SET state = 'pending', priority = excluded.priority, "
+            "rank = excluded.rank, worker = NULL, lease_until = NULL, attempts = 0, error = '' "
+            "WHERE state = 'failed'",
+            [
+                (site, json.dumps(body, sort_keys=True), priority, rank)
+                for priority, site, body in tasks
+            ],
+        ).rowcount
+
+    def publish(self, tasks: Iterable[Tuple[int, str, Dict[Any, Any]]]) -> int:
+        """
+        Add (priority, site, body) tasks, lower priorities are leased first.
+        Returns how many were added, tasks already in the queue are skipped
+        unless they failed.
+        """
+
+        return self._transaction(
+            lambda connection: self._insert(connection, tasks, rank=1)
+        )
+
+    def lease(self, worker: str, count: int = 1) -> List[Task]:
+        """
+        Lease up to count tasks, pending ones or ones whose lease ran out.
+        """
+
+        def statements(connection: sqlite3.Connection) -> List[Task]:
+            now = time()
+            # Ran out of leases too often, their workers probably died on them.
+            expired = connection.execute(
+                "SELECT id, site, body, priority, attempts FROM tasks "
+                "WHERE state = 'leased' AND lease_until < ? AND attempts >= ?",
+                (now, self.max_attempts),
+            ).fetchall()
+            connection.executemany(
+                "UPDATE tasks SET state = 'failed', worker = ?, lease_until = NULL, "
+                "error = 'lease expired' WHERE id = ?",
+                [(worker, row[0]) for row in expired],
+            )
+            self.expired.extend(
+                Task(task_id, site, json.loads(body), priority, attempts)
+                for task_id, site, body, priority, attempts in expired
+            )
+            rows = connection.execute(
+                "SELECT id, site, body, priority, attempts FROM tasks "
+                "WHERE state = 'pending' OR (state = 'leased' AND lease_until < ?) "
+                "ORDER BY priority, rank, id LIMIT ?",
+                (now, count),
+            ).fetchall()
+            connection.executemany(
+                "UPDATE tasks SET state = 'leased', worker = ?, lease_until = ?, "
+                "attempts = attempts + 1 WHERE id = ?",
+                [(worker, now + self.lease_seconds, row[0]) for row in rows],
+            )
+            return [
+                Task(task_id, site, json.loads(body), priority, attempts + 1)
+                for task_id, site, body, priority, attempts in rows
+            ]
+
+        return self._transaction(statements)
+
+    def heartbeat(self, worker: str) -> int:
+        """
+        Extend the leases of the worker, returns how many it still holds.
+        """
+
+        return self._transaction(
+            lambda connection: connection.execute(
+                "UPDATE tasks SET lease_until = ? WHERE state = 'leased' AND worker = ?",
+                (time() + self.lease_seconds, worker),
+            ).rowcount
+        )
+
+    def complete(
+        self,
+        task: Task,
+        worker: str,
+        follow: Optional[List[Tuple[int, str, Dict[Any, Any]]]] = None,
+    ) -> bool:
+        """
+        Mark a task done and publish the tasks that follow it, like the next
+        page of a window, ahead of new ones of the same priority.
+
+        Returns False if the worker lost the lease, the task is someone
+        else's by now and nothing is changed.
+        """
+
+        def statements(connection: sqlite3.Connection) -> bool:
+            done = connection.execute(
+                "UPDATE tasks SET state = 'done', lease_until = NULL "
+                "WHERE id = ? AND state = 'leased' AND worker = ?",
+                (task.id, worker),
+            ).rowcount
+            if not done:
+                return False
+            self._insert(connection, follow or [], rank=0)
+            return True
+
+        return self._transaction(statements)
+
+    def fail(self, task: Task, worker: str, error: str) -> bool:
+        """
+        Give a task back to be tried again, or leave it failed after
+        max_attempts. Returns whether it failed for good, False if the worker
+        lost the lease, like complete.
+        """
+
+        final = task.attempts >= self.max_attempts
+        changed = self._transaction(
+            lambda connection: connection.execute(
+                "UPDATE tasks SET state = ?, lease_until = NULL, error = ? "
+                "WHERE id = ? AND state = 'leased' AND worker = ?",
+                ("failed" if final else "pending", error, task.id, worker),
+            ).rowcount
+        )
+        return final and bool(changed)
+
+    def counts(self) -> Dict[str, int]:
+        """
+        Tasks in every state.
+        """
+
+        counts = {state: 0 for state in STATES}
+        counts.update(
+            self.connection.execute(
+                "SELECT state, COUNT(*) FROM tasks GROUP BY state"
+            ).fetchall()
+        )
+        return counts
+
+    def unfinished(self) -> int:
+        """
+        Tasks that are pending or leased, by any worker.
+        """
+
+        counts = self.counts()
+        return counts["pending"] + counts["leased"]
+
+    def close(self) -> None:
+        self.connection.close()
@@ -0,0 +1,234 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from time import sleep, time
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_QUOTA_PATH = Path.home() / ".seoman" / "quota.db"
+
+# Search Console API limits, in queries per minute.
+SITE_QPM = 1200
+PROJECT_QPM = 40000
+
+# Processes that reserved a slot this recently share the site fairly.
+ACTIVE_SECONDS = 5.0
+
+
+def project_key(credentials: Any) -> str:
+    """
+    Identifies the Cloud project of the credentials, by the project of a
+    service account or the OAuth client, that belongs to a single project.
+    """
+
+    project = getattr(credentials, "project_id", None) or getattr(
+        credentials, "client_id", ""
+    )
+    return hashlib.sha256(str(project or "").encode()).hexdigest()[:16]
+
+
+class QuotaManager:
+    """
+    Token buckets of the API quota, shared by every seoman process through
+    a SQLite file.
+
+    Each bucket is kept as the time its next slot is free (GCRA), so a slot
+    is reserved in a single transaction and the caller only sleeps until it,
+    nothing polls the file. A request takes a slot of its site and of the
+    project at once. Slots are handed out in the order they are asked for,
+    at most horizon seconds ahead, so a process with many requests in
+    flight can not book the whole site for itself. On top of that, the
+    processes that used a site recently share it evenly: each one may only
+    use its part of the site's rate. The buckets of processes that stopped
+    using a site are dropped.
+
+    Waiting for the file lock blocks, acquire_async waits for it on a
+    thread of its own so the event loop keeps running.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        project: str = "default",
+        site_qpm: int = SITE_QPM,
+        project_qpm: int = PROJECT_QPM,
+        burst: int = 10,
+        horizon: float = 1.0,
+    ) -> None:
+        self.path = Path(path) if path else DEFAULT_QUOTA_PATH
+        self.project = project
+        self.site_qpm = site_qpm
+        self.project_qpm = project_qpm
+        self.site_interval = 60 / site_qpm
+        self.project_interval = 60 / project_qpm
+        self.burst = burst
+        self.horizon = horizon
+        self.pid = str(os.getpid())
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Transactions are started by hand, BEGIN IMMEDIATE locks the file.
+        self.connection = sqlite3.connect(
+            str(self.path), timeout=60, isolation_level=None, check_same_thread=False
+        )
+        # The connection is shared by the caller's thread and the executor's.
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, free_at REAL)"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS clients ("
+            "bucket TEXT, pid TEXT, seen REAL, PRIMARY KEY (bucket, pid))"
+        )
+
+    def _free_at(self, names: List[str]) -> Dict[str, float]:
+        placeholders = ", ".join("?" for _ in names)
+        free_at = dict(
+            self.connection.execute(
+                f"SELECT name, free_at FROM buckets WHERE name IN ({placeholders})",
+                names,
+            ).fetchall()
+        )
+        return {name: free_at.get(name, 0.0) for name in names}
+
+    def _reserve(self, site: str) -> Tuple[bool, float]:
+        """
+        Reserve a slot for a request to the site if there is one within the
+        horizon. Returns whether it was reserved and how long to sleep,
+        until the slot or until trying again.
+        """
+
+        # The site limit holds whichever project or account sends the queries.
+        site_bucket = f"site:{site}"
+        own_bucket = f"{site_bucket}:{self.pid}"
+        project_bucket = f"project:{self.project}"
+
+        with self._lock:
+            return self._reserve_locked(site_bucket, own_bucket, project_bucket)
+
+    def _reserve_locked(
+        self, site_bucket: str, own_bucket: str, project_bucket: str
+    ) -> Tuple[bool, float]:
+        connection = self.connection
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            now = time()
+            # Processes that stopped using a site, their own buckets are free by now.
+            connection.execute(
+                "DELETE FROM buckets WHERE name IN "
+                "(SELECT bucket || ':' || pid FROM clients WHERE seen < ?)",
+                (now - ACTIVE_SECONDS,),
+            )
+            connection.execute(
+                "DELETE FROM clients WHERE seen < ?", (now - ACTIVE_SECONDS,)
+            )
+            connection.execute(
+                "INSERT OR REPLACE INTO clients VALUES (?, ?, ?)",
+                (site_bucket, self.pid, now),
+            )
+            (active,) = connection.execute(
+                "SELECT COUNT(*) FROM clients WHERE bucket = ?", (site_bucket,)
+            ).fetchone()
+
+            intervals = {
+                site_bucket: self.site_interval,
+                own_bucket: self.site_interval * active,
+                project_bucket: self.project_interval,
+            }
+            free_at = self._free_at(list(intervals))
+
+            # A bucket allows a burst of slots before its next free one.
+            start = max(
+                [now]
+                + [
+                    free_at[name] - interval * (self.burst - 1)
+                    for name, interval in intervals.items()
+                ]
+            )
+
+            if start - now > self.horizon:
+                connection.execute("COMMIT")
+                return False, start - now - self.horizon
+
+            # Charged when reserved, not at the slot: a slot booked ahead by one
+            # bucket must not use up the free slots of the others before it.
+            connection.executemany(
+                "INSERT OR REPLACE INTO buckets VALUES (?, ?)",
+                [
+                    (name, max(free_at[name], now) + interval)
+                    for name, interval in intervals.items()
+                ],
+            )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+        return True, start - now
+
+    def acquire(self, site: str) -> float:
+        """
+        Wait for a slot of the site, returns the seconds waited.
+        """
+
+        waited = 0.0
+        while True:
+            reserved, delay = self._reserve(site)
+            sleep(delay)
+            waited += delay
+            if reserved:
+                return waited
+
+    async def acquire_async(self, site: str) -> float:
+        """
+        acquire, sleeping without blocking the event loop.
+        """
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+
+        loop = asyncio.get_running_loop()
+        waited = 0.0
+        while True:
+            reserved, delay = await loop.run_in_executor(
+                self._executor, self._reserve, site
+            )
+            await asyncio.sleep(delay)
+            waited += delay
+            if reserved:
+                return waited
+
+    def penalize(self, site: str, seconds: float = 10.0) -> None:
+        """
+        The API rejected a request anyway, hold the site back for every
+        process instead of each one finding out on its own.
+        """
+
+        site_bucket = f"site:{site}"
+
+        with self._lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                free_at = self._free_at([site_bucket])[site_bucket]
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO buckets VALUES (?, ?)",
+                    (
+                        site_bucket,
+                        max(
+                            free_at, time() + seconds + self.site_interval * self.burst
+                        ),
+                    ),
+                )
+                self.connection.execute("COMMIT")
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+        self.connection.close()
@@ -0,0 +1,152 @@
+import math
+import random
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..exceptions import InvalidParameterError
+
+# Two-sided 95% confidence.
+Z_95 = 1.96
+
+SAMPLED_METRICS = ["clicks", "impressions"]
+
+Window = Tuple[str, str]
+
+
+def window_key(body: Dict[Any, Any]) -> Window:
+    return body["startDate"], body["endDate"]
+
+
+class WindowSample:
+    """
+    Stratified sample of the windows of a query, with estimates of the
+    totals of every window from the ones that were fetched.
+
+    Windows are grouped by the weekday they start on, traffic differs more
+    between weekdays than within them. Every k-th window of each group is
+    taken from a random start, and every group gets at least one. Totals are
+    extrapolated per group and summed, the errors are the usual ones of a
+    stratified sample, with a finite population correction. A group with a
+    single window fetched borrows the pooled variance of the others.
+
+    A window whose last page came back full was cut at the row limit, its
+    totals and so the estimates are only lower bounds then.
+    """
+
+    def __init__(
+        self, bodies: List[Dict[Any, Any]], fraction: float, seed: Optional[int] = None,
+    ) -> None:
+        if not 0 < fraction <= 1:
+            raise InvalidParameterError(
+                f"--sample is the share of windows to fetch, between 0 and 1, not {fraction}"
+            )
+
+        self.fraction = fraction
+        self.total_windows = len(bodies)
+        self.strata: Dict[int, List[Dict[Any, Any]]] = {}
+
+        for body in bodies:
+            weekday = datetime.strptime(body["startDate"], "%Y-%m-%d").weekday()
+            self.strata.setdefault(weekday, []).append(body)
+
+        rng = random.Random(seed)
+        step = max(int(round(1 / fraction)), 1)
+        self.selected: List[Dict[Any, Any]] = []
+        self.stratum_of: Dict[Window, int] = {}
+
+        for weekday, stratum in self.strata.items():
+            start = rng.randrange(step)
+            chosen = stratum[start::step] or [rng.choice(stratum)]
+            self.selected.extend(chosen)
+            self.stratum_of.update((window_key(body), weekday) for body in chosen)
+
+        # Fetched in date order like the full plan.
+        self.selected.sort(key=lambda body: body["startDate"])
+        self.totals: Dict[Window, Dict[str, float]] = {}
+        self.truncated: Dict[Window, bool] = {}
+
+    def record(self, body: Dict[Any, Any], rows: List[Dict[str, Any]]) -> None:
+        """
+        Add the rows of a fetched page to the totals of its window.
+        """
+
+        totals = self.totals.setdefault(
+            window_key(body), {"clicks": 0.0, "impressions": 0.0, "position": 0.0},
+        )
+        # The pages of a window come in order, the last one tells.
+        self.truncated[window_key(body)] = len(rows) >= body.get("rowLimit", 25000)
+
+        for row in rows:
+            totals["clicks"] += row["clicks"]
+            totals["impressions"] += row["impressions"]
+            totals["position"] += row["position"] * row["impressions"]
+
+    def _strata_values(self, metric: str) -> Dict[int, List[float]]:
+        values: Dict[int, List[float]] = {weekday: [] for weekday in self.strata}
+        for window, totals in self.totals.items():
+            values[self.stratum_of[window]].append(totals[metric])
+        return values
+
+    def _estimate(self, metric: str) -> Tuple[float, Optional[float]]:
+        values = self._strata_values(metric)
+
+        def variance(sample: List[float]) -> float:
+            mean = sum(sample) / len(sample)
+            return sum((value - mean) ** 2 for value in sample) / (len(sample) - 1)
+
+        pooled_samples = [sample for sample in values.values() if len(sample) > 1]
+        pooled = (
+            sum(variance(sample) * (len(sample) - 1) for sample in pooled_samples)
+            / sum(len(sample) - 1 for sample in pooled_samples)
+            if pooled_samples
+            else None
+        )
+
+        estimate = 0.0
+        error: Optional[float] = 0.0
+
+        for weekday, sample in values.items():
+            size = len(self.strata[weekday])
+            if not sample:
+                # Every fetched window of it failed, nothing to extrapolate from.
+                error = None
+                continue
+
+            estimate += size * sum(sample) / len(sample)
+
+            spread = variance(sample) if len(sample) > 1 else pooled
+            if spread is None or error is None:
+                error = None
+                continue
+
+            correction = 1 - len(sample) / size
+            error += size ** 2 * correction * spread / len(sample)
+
+        return estimate, math.sqrt(error) if error is not None else None
+
+    def estimate(self) -> Dict[str, Any]:
+        """
+        Estimated totals of the whole range, with their 95% margins of error.
+
+        lowerBound is set when some of the windows were cut at the row limit.
+        """
+
+        truncated = sum(self.truncated.values())
+        estimates: Dict[str, Any] = {
+            "windows": len(self.totals),
+            "total_windows": self.total_windows,
+            "truncated_windows": truncated,
+            "lowerBound": truncated > 0,
+        }
+
+        for metric in SAMPLED_METRICS:
+            value, error = self._estimate(metric)
+            estimates[metric] = value
+            estimates[f"{metric}Margin"] = Z_95 * error if error is not None else None
+
+        weighted_position, _ = self._estimate("position")
+        impressions = estimates["impressions"]
+        estimates["ctr"] = estimates["clicks"] / impressions if impressions else 0.0
+        estimates["position"] = weighted_position / impressions if impressions else 0.0
+
+        return estimates
@@ -1,5 +1,5 @@
 from datetime import datetime, timedelta
-from typing import Any, Callable, Dict, List
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
 
 import typer  # type: ignore
 from google.auth.exceptions import RefreshError  # type: ignore
@@ -9,11 +9,15 @@ from .date_utils import create_date_range
 
 
 def create_body_list(
-    body: Dict[Any, Any], new_body: List[Dict[Any, Any]] = [], granularity: str = None,
+    body: Dict[Any, Any],
+    new_body: Optional[List[Dict[Any, Any]]] = None,
+    granularity: str = None,
 ) -> List[Dict[Any, Any]]:
     """
     Gets a body, and creates a new body from that.
     """
+    # Work on copies, the plan is created again when the granularity changes.
+    body, new_body = body.copy(), new_body if new_body is not None else []
     dates = create_date_range(
         start=body.get("startDate"), end=body.get("endDate"), granularity=granularity,
     )
@@ -66,6 +70,48 @@ def create_body_list(
     return new_body
 
 
+def is_quota_error(error: BaseException) -> bool:
+    """
+    Checks whether an HttpError is caused by the quota or the rate limits.
+    """
+
+    status = getattr(getattr(error, "resp", None), "status", None)
+    content = getattr(error, "content", b"") or b""
+
+    if isinstance(content, str):
+        content = content.encode()
+
+    return status == 429 or (
+        status == 403
+        and any(
+            reason in content
+            for reason in [b"rateLimitExceeded", b"quotaExceeded", b"RateLimitExceeded"]
+        )
+    )
+
+
+def sitemap_row(site: str, sitemap: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Flattens a sitemap resource into a report row, content counts are summed up.
+    """
+
+    contents = sitemap.get("contents", [])
+
+    return {
+        "site": site,
+        "path": sitemap.get("path", ""),
+        "type": sitemap.get("type", ""),
+        "isSitemapsIndex": sitemap.get("isSitemapsIndex", False),
+        "isPending": sitemap.get("isPending", False),
+        "lastSubmitted": sitemap.get("lastSubmitted", ""),
+        "lastDownloaded": sitemap.get("lastDownloaded", ""),
+        "errors": int(sitemap.get("errors", 0)),
+        "warnings": int(sitemap.get("warnings", 0)),
+        "submitted": sum(int(content.get("submitted", 0)) for content in contents),
+        "indexed": sum(int(content.get("indexed", 0)) for content in contents),
+    }
+
+
 def path_exists(filename: str) -> bool:
     """
     Checks for the given file path exists.
@@ -75,6 +121,33 @@ def path_exists(filename: str) -> bool:
     return Path(filename).exists()
 
 
+def query_errors() -> Tuple[Type[BaseException], ...]:
+    """
+    Errors a query can fail with: API errors, and the connection errors and
+    timeouts of both googleapiclient (httplib2) and the transport.
+    """
+    import asyncio
+
+    from googleapiclient.errors import HttpError  # type: ignore
+    from httplib2 import HttpLib2Error  # type: ignore
+
+    return (HttpError, HttpLib2Error, OSError, asyncio.TimeoutError)
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """
+    Checks whether an error means the API is failing for now, rather than
+    the request being wrong: quota, server and connection errors.
+    """
+
+    status = getattr(getattr(error, "resp", None), "status", None)
+
+    if status is None:
+        return True
+
+    return int(status) >= 500 or is_quota_error(error)
+
+
 def regenerate_credentials(method: Callable) -> Callable:
     """
     If query raises RefreshError(Expired token causes this.)
@@ -0,0 +1,118 @@
+from itertools import chain, islice
+from typing import Any, Iterable, Iterator, List, Optional
+
+MAX_DECIMALS = 4
+
+
+def _decimals(value: float) -> int:
+    text = repr(value)
+    if "e" in text or "." not in text:
+        return 0
+    return min(len(text.split(".")[1].rstrip("0")), MAX_DECIMALS)
+
+
+class LazyTable:
+    """
+    Unicode table that is rendered line by line.
+
+    Column widths, alignment and the decimals of float columns come from a
+    sample of the first rows, so nothing has to be measured in advance. Cells
+    wider than max_width, or than their column after the sample, are cut.
+    """
+
+    def __init__(
+        self,
+        headers: List[str],
+        rows: Iterable[List[Any]],
+        sample: int = 1000,
+        max_width: int = 60,
+        margin: int = 2,
+    ) -> None:
+        self.headers = headers
+        self.max_width = max_width
+        self.margin = margin
+
+        rows = iter(rows)
+        self.sample = list(islice(rows, sample))
+        self.rows: Iterator[List[Any]] = chain(self.sample, rows)
+
+        self.numeric = [
+            all(
+                isinstance(row[idx], (int, float)) and not isinstance(row[idx], bool)
+                for row in self.sample
+                if idx < len(row)
+            )
+            for idx in range(len(headers))
+        ]
+        self.decimals = [
+            max(
+                (
+                    _decimals(row[idx])
+                    for row in self.sample
+                    if idx < len(row) and isinstance(row[idx], float)
+                ),
+                default=0,
+            )
+            for idx in range(len(headers))
+        ]
+        self.widths = [
+            min(
+                max(
+                    [len(header)]
+                    + [len(self._format(idx, row[idx])) for row in self.sample]
+                ),
+                max_width,
+            )
+            for idx, header in enumerate(headers)
+        ]
+
+    def _format(self, idx: int, value: Any) -> str:
+        if isinstance(value, float) and self.numeric[idx]:
+            return f"{value:.{self.decimals[idx]}f}"
+        return str(value)
+
+    def _cell(self, idx: int, value: Any) -> str:
+        text = self._format(idx, value)
+        width = self.widths[idx]
+
+        if len(text) > width:
+            text = text[: width - 1] + "…"
+
+        return text.rjust(width) if self.numeric[idx] else text.ljust(width)
+
+    def _line(self, cells: List[str]) -> str:
+        pad = " " * self.margin
+        return "│" + "│".join(pad + cell + pad for cell in cells) + "│"
+
+    def _border(self, left: str, middle: str, right: str) -> str:
+        return (
+            left
+            + middle.join("─" * (width + 2 * self.margin) for width in self.widths)
+            + right
+        )
+
+    def lines(self, limit: Optional[int] = None) -> Iterator[str]:
+        """
+        Lines of the table, with at most limit rows.
+        """
+
+        yield self._border("┌", "┬", "┐")
+        yield self._line(
+            [
+                header[: self.widths[idx]].center(self.widths[idx])
+                for idx, header in enumerate(self.headers)
+            ]
+        )
+
+        for row in islice(self.rows, limit):
+            yield self._border("├", "┼", "┤")
+            yield self._line([self._cell(idx, value) for idx, value in enumerate(row)])
+
+        yield self._border("└", "┴", "┘")
+
+    def remaining(self) -> Iterator[List[Any]]:
+        """
+        Rows that were not rendered, for counting them.
+        """
+
+        return self.rows
@@ -0,0 +1,289 @@
+import asyncio
+import gzip
+import json
+import ssl
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote, urlsplit
+
+API_URL = "https://searchconsole.googleapis.com/webmasters/v3/"
+
+Connection = Tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+
+class ProtocolError(ConnectionError):
+    """
+    The server answered something that is not a valid HTTP/1.1 response.
+    """
+
+
+def _parse_int(value: bytes, base: int, what: str) -> int:
+    try:
+        number = int(value, base)
+    except ValueError:
+        number = -1
+    if number < 0:
+        raise ProtocolError(f"Malformed {what} in the response: {value[:100]!r}")
+    return number
+
+
+class AsyncTransport:
+    """
+    Non-blocking HTTP/1.1 client for the Search Analytics and Sitemaps endpoints.
+
+    Requests are sent over a pool of keep-alive connections from the running
+    event loop, at most `concurrency` of them at a time. Bodies and headers are
+    the same as the ones googleapiclient sends, failed requests raise HttpError
+    so the callers can handle them the same way. Broken connections raise
+    ConnectionError, malformed responses ProtocolError, a ConnectionError too.
+    """
+
+    def __init__(
+        self,
+        credentials: Any = None,
+        base_url: str = API_URL,
+        concurrency: int = 100,
+        timeout: float = 120.0,
+    ) -> None:
+        self.credentials = credentials
+        self.base_url = base_url if base_url.endswith("/") else base_url + "/"
+        self.concurrency = concurrency
+        self.timeout = timeout
+
+        parts = urlsplit(self.base_url)
+        self.scheme = parts.scheme
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.path = parts.path
+        self.ssl = ssl.create_default_context() if parts.scheme == "https" else None
+
+        self._idle: List[Connection] = []
+        # Created lazily, they belong to the loop the first request runs on.
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._refresh_lock: Optional[asyncio.Lock] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _bind_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # asyncio.run creates a new loop every time, old connections are unusable.
+            self._drop_idle()
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._refresh_lock = asyncio.Lock()
+
+    def _drop_idle(self) -> None:
+        for _, writer in self._idle:
+            try:
+                writer.close()
+            except RuntimeError:
+                # The loop they were opened on is already closed.
+                pass
+        self._idle = []
+
+    async def _auth_headers(self, credentials: Any) -> Dict[str, str]:
+        headers: Dict[str, str] = {}
+
+        if credentials is None:
+            return headers
+
+        if not credentials.valid:
+            async with self._refresh_lock:  # type: ignore
+                if not credentials.valid:
+                    from google.auth.transport.requests import Request  # type: ignore
+
+                    # Refreshing is blocking and rare, keep it off the loop.
+                    await asyncio.get_running_loop().run_in_executor(
+                        None, credentials.refresh, Request()
+                    )
+
+        credentials.apply(headers)
+        return headers
+
+    async def _connect(self) -> Tuple[Connection, bool]:
+        """
+        An idle connection from the pool if there is one, a new one otherwise.
+        """
+
+        while self._idle:
+            reader, writer = self._idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return (reader, writer), True
+            writer.close()
+
+        connection = await asyncio.open_connection(
+            self.host,
+            self.port,
+            ssl=self.ssl,
+            server_hostname=self.host if self.ssl else None,
+        )
+        return connection, False
+
+    async def _read_response(
+        self, reader: asyncio.StreamReader
+    ) -> Tuple[int, Dict[str, str], bytes]:
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Connection closed before the response")
+
+        parts = status_line.split()
+        if len(parts) < 2 or not parts[0].startswith(b"HTTP/"):
+            raise ProtocolError(f"Malformed status line: {status_line[:100]!r}")
+        status = _parse_int(parts[1], 10, "status")
+        headers: Dict[str, str] = {}
+
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                line = await reader.readline()
+                size = _parse_int(line.split(b";")[0].strip(), 16, "chunk size")
+                if size == 0:
+                    # Trailers, then the empty line.
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                if await reader.readexactly(2) != b"\r\n":
+                    raise ProtocolError("Chunk longer than its size")
+            content = b"".join(chunks)
+        elif "content-length" in headers:
+            length = headers["content-length"].encode("latin-1")
+            content = await reader.readexactly(_parse_int(length, 10, "content-length"))
+        else:
+            content = await reader.read()
+            headers["connection"] = "close"
+
+        if headers.get("content-encoding") == "gzip":
+            content = gzip.decompress(content)
+
+        return status, headers, content
+
+    async def _send(
+        self, method: str, path: str, payload: bytes, headers: Dict[str, str]
+    ) -> Tuple[int, Dict[str, str], bytes]:
+        request = [f"{method} {path} HTTP/1.1", f"Host: {self.host}"]
+        request.extend(f"{name}: {value}" for name, value in headers.items())
+        message = ("\r\n".join(request) + "\r\n\r\n").encode("latin-1") + payload
+
+        # A pooled connection may have been closed by the server meanwhile, that
+        # is only noticed when using it, so try once more on a fresh one.
+        for retry in (False, True):
+            (reader, writer), reused = await self._connect()
+            try:
+                writer.write(message)
+                await writer.drain()
+                status, response_headers, content = await self._read_response(reader)
+            except (ConnectionError, asyncio.IncompleteReadError) as error:
+                writer.close()
+                if not reused or retry:
+                    if isinstance(error, asyncio.IncompleteReadError):
+                        raise ProtocolError(
+                            "Connection closed in the middle of the response"
+                        ) from error
+                    raise
+                # The other idle connections are probably stale too.
+                self._drop_idle()
+                continue
+            except BaseException:
+                writer.close()
+                raise
+
+            if response_headers.get("connection", "").lower() == "close":
+                writer.close()
+            else:
+                self._idle.append((reader, writer))
+
+            break
+
+        return status, response_headers, content
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        body: Optional[Dict[Any, Any]] = None,
+        credentials: Any = None,
+    ) -> Dict[str, Any]:
+        """
+        Send a request relative to the base url and return the decoded JSON.
+
+        credentials override the transport's own ones for this request, the
+        connections are shared.
+        """
+
+        from googleapiclient.errors import HttpError  # type: ignore
+        from httplib2 import Response  # type: ignore
+
+        self._bind_loop()
+
+        payload = json.dumps(body).encode() if body is not None else b""
+        headers = {
+            "accept": "application/json",
+            "accept-encoding": "gzip",
+            "content-type": "application/json",
+            "content-length": str(len(payload)),
+            "user-agent": "seoman",
+        }
+
+        async with self._semaphore:  # type: ignore
+            headers.update(await self._auth_headers(credentials or self.credentials))
+            status, response_headers, content = await asyncio.wait_for(
+                self._send(method, self.path + path, payload, headers), self.timeout
+            )
+
+        uri = self.base_url + path
+        if status >= 300:
+            response_headers["status"] = str(status)
+            raise HttpError(Response(response_headers), content, uri=uri)
+
+        return json.loads(content) if content else {}
+
+    async def query(
+        self, url: str, body: Dict[Any, Any], credentials: Any = None
+    ) -> Dict[str, Any]:
+        """
+        searchanalytics().query(siteUrl=url, body=body).execute(), without blocking.
+        """
+
+        return await self.request(
+            "POST",
+            f"sites/{quote(url, safe='')}/searchAnalytics/query",
+            body,
+            credentials=credentials,
+        )
+
+    async def sitemaps(self, url: str) -> Dict[str, Any]:
+        """
+        sitemaps().list(siteUrl=url).execute(), without blocking.
+        """
+
+        return await self.request("GET", f"sites/{quote(url, safe='')}/sitemaps")
+
+    async def sitemap(self, url: str, feedpath: str) -> Dict[str, Any]:
+        """
+        sitemaps().get(siteUrl=url, feedpath=feedpath).execute(), without blocking.
+        """
+
+        return await self.request(
+            "GET", f"sites/{quote(url, safe='')}/sitemaps/{quote(feedpath, safe='')}"
+        )
+
+    async def aclose(self) -> None:
+        """
+        Close the pooled connections, call it before the event loop finishes.
+        """
+
+        idle, self._idle = self._idle, []
+        for _, writer in idle:
+            writer.close()
+        for _, writer in idle:
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, ssl.SSLError):
+                pass
@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# seoman.service can only be imported after seoman.main.
+import seoman.main  # noqa: E402,F401
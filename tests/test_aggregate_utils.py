@@ -0,0 +1,41 @@
+import pytest  # type: ignore
+
+from seoman.utils.aggregate_utils import Aggregator, JoinedPages
+
+
+def row(query, clicks):
+    return {
+        "keys": ["2020-03-01", query],
+        "clicks": clicks,
+        "impressions": 10 * clicks,
+        "ctr": 0.1,
+        "position": 2.0,
+    }
+
+
+def period(queries, max_keys):
+    aggregator = Aggregator(
+        dimensions=["date", "query"], group_by=["query"], max_keys=max_keys
+    )
+    aggregator.update([row(query, clicks) for query, clicks in queries.items()])
+    return aggregator
+
+
+@pytest.mark.parametrize("max_keys", [1, 100])
+def test_joined_pages(max_keys):
+    current = period({"a": 3, "b": 2}, max_keys)
+    previous = period({"b": 1, "c": 4}, max_keys)
+    joined = JoinedPages(current, previous, page_count=2, page_size=2)
+
+    for _ in range(2):
+        pages = list(joined)
+        assert [len(page) for page in pages] == [2, 1]
+        rows = {
+            tuple(item["keys"]): (item["clicks"], item["previousClicks"])
+            for page in pages
+            for item in page
+        }
+        assert rows == {("a",): (3, 0), ("b",): (2, 1), ("c",): (0, 4)}
+
+    assert len(joined) == 2
+    assert current.spilled == (max_keys == 1)
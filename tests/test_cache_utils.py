@@ -0,0 +1,31 @@
+from types import SimpleNamespace
+
+from seoman.utils.cache_utils import SitesCache, account_key
+
+
+def service_account(email):
+    return SimpleNamespace(service_account_email=email, project_id="project")
+
+
+def test_account_key():
+    first = service_account("first@project.iam.gserviceaccount.com")
+    second = service_account("second@project.iam.gserviceaccount.com")
+    oauth = SimpleNamespace(client_id="client", refresh_token="token")
+
+    keys = {account_key(credentials) for credentials in [first, second, oauth]}
+
+    assert len(keys) == 3
+    assert account_key(first) == account_key(
+        service_account("first@project.iam.gserviceaccount.com")
+    )
+
+
+def test_sites_of_service_accounts(tmp_path):
+    cache = SitesCache(path=str(tmp_path / "sites.json"))
+    first = account_key(service_account("first@project.iam.gserviceaccount.com"))
+    second = account_key(service_account("second@project.iam.gserviceaccount.com"))
+
+    cache.set(first, [{"siteUrl": "sc-domain:first.com"}])
+
+    assert cache.get(first) == [{"siteUrl": "sc-domain:first.com"}]
+    assert cache.get(second) is None
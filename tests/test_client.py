@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest  # type: ignore
+
+from benchmarks.fake_service import FakeService
+from benchmarks.stub_server import StubServer
+from seoman.client import PAGE_SIZE, Client
+from seoman.exceptions import InvalidParameterError
+from seoman.service import SearchAnalytics
+from seoman.utils.transport_utils import AsyncTransport
+
+SITE = "sc-domain:example.com"
+
+
+class WindowService(FakeService):
+    """
+    Windows of a fixed number of rows, paged by startRow and rowLimit.
+    """
+
+    def __init__(self, rows: int) -> None:
+        super().__init__()
+        self.rows = rows
+        self.bodies = []
+
+    def page(self, body):
+        self.bodies.append(body)
+        end = min(body["startRow"] + body["rowLimit"], self.rows)
+        return {
+            "rows": [
+                {
+                    "keys": [f"query-{idx}"],
+                    "clicks": 1,
+                    "impressions": 10,
+                    "ctr": 0.1,
+                    "position": 1.0,
+                }
+                for idx in range(body["startRow"], end)
+            ]
+        }
+
+
+def body(**extra):
+    return {
+        "startDate": "2020-03-01",
+        "endDate": "2020-03-03",
+        "dimensions": ["query"],
+        **extra,
+    }
+
+
+def test_pages_every_row():
+    fake = WindowService(rows=2 * PAGE_SIZE + 10)
+    client = Client(SearchAnalytics(fake, credentials=None))
+
+    pages = list(client.pages(SITE, body()))
+
+    assert [len(page) for page in pages] == [PAGE_SIZE, PAGE_SIZE, 10]
+    assert [request["startRow"] for request in fake.bodies] == [
+        0,
+        PAGE_SIZE,
+        2 * PAGE_SIZE,
+    ]
+
+
+@pytest.mark.parametrize(
+    "limit, sizes",
+    [(5, [5]), (PAGE_SIZE, [PAGE_SIZE]), (PAGE_SIZE + 5, [PAGE_SIZE, 5])],
+)
+def test_row_limit_caps_windows(limit, sizes):
+    fake = WindowService(rows=3 * PAGE_SIZE)
+    client = Client(SearchAnalytics(fake, credentials=None))
+
+    pages = list(client.pages(SITE, body(rowLimit=limit), granularity="daily"))
+
+    # Every day is a window of its own, the end date is left out.
+    assert [len(page) for page in pages] == sizes * 2
+    assert max(request["rowLimit"] for request in fake.bodies) <= PAGE_SIZE
+
+
+def test_row_limit_below_one():
+    client = Client(SearchAnalytics(WindowService(rows=1), credentials=None))
+
+    with pytest.raises(InvalidParameterError):
+        list(client.pages(SITE, body(rowLimit=0)))
+
+
+def test_apages_stopped_early():
+    with StubServer(WindowService(rows=30), latency=0.05) as stub:
+        service = SearchAnalytics(None, credentials=None)
+        service.transport = AsyncTransport(base_url=stub.base_url)
+        client = Client(service)
+
+        async def main():
+            pages = client.apages(
+                SITE, body(rowLimit=20), granularity="daily", concurrency=2
+            )
+            async for page in pages:
+                break
+            await pages.aclose()
+            return page, asyncio.all_tasks()
+
+        page, tasks = asyncio.run(main())
+
+    assert len(page) == 20
+    # The window fetched ahead was cancelled and waited for.
+    assert len(tasks) == 1
+    assert service.transport._idle == []
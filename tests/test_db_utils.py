@@ -0,0 +1,141 @@
+from datetime import date, timedelta
+
+import pytest  # type: ignore
+
+from seoman.exceptions import InvalidParameterError
+from seoman.utils.db_utils import Store
+
+SITE = "sc-domain:example.com"
+DAYS = [str(date(2020, 3, 1) + timedelta(days=offset)) for offset in range(7)]
+
+
+def body(start, end, search_type="web", **extra):
+    return {
+        "startDate": start,
+        "endDate": end,
+        "dimensions": ["query"],
+        "searchType": search_type,
+        "rowLimit": 25000,
+        **extra,
+    }
+
+
+def rows(clicks, impressions):
+    return [
+        {
+            "keys": ["shoes"],
+            "clicks": clicks,
+            "impressions": impressions,
+            "ctr": clicks / impressions,
+            "position": 3.0,
+        },
+        {
+            "keys": ["boots"],
+            "clicks": 1,
+            "impressions": 10,
+            "ctr": 0.1,
+            "position": 5.0,
+        },
+    ]
+
+
+def fill(store):
+    # The same week fetched daily, weekly, for images and with a filter.
+    for day in DAYS:
+        store.insert(SITE, body(day, day), rows(10, 100))
+    store.insert(SITE, body(DAYS[0], DAYS[-1]), rows(70, 700))
+    store.insert(SITE, body(DAYS[0], DAYS[-1], "image"), rows(50, 500))
+    for day in DAYS:
+        store.insert(SITE, body(day, day, "image"), rows(5, 50))
+    filtered = {
+        "dimensionFilterGroups": [
+            {"filters": [{"dimension": "country", "expression": "usa"}]}
+        ]
+    }
+    for day in DAYS:
+        store.insert(SITE, body(day, day, **filtered), rows(3, 30))
+
+
+def test_top_overlapping_windows(tmp_path):
+    store = Store(path=str(tmp_path / "seoman.db"))
+    fill(store)
+
+    headers, top = store.top("query", site=SITE)
+
+    assert headers[:3] == ["query", "clicks", "impressions"]
+    assert [row[:3] for row in top] == [("shoes", 70, 700), ("boots", 7, 70)]
+
+    _, images = store.top("query", site=SITE, search_type="image")
+    assert [row[:3] for row in images] == [("shoes", 35, 350), ("boots", 7, 70)]
+
+    _, days = store.top("query", start_date=DAYS[1], end_date=DAYS[2])
+    assert [row[:3] for row in days] == [("shoes", 20, 200), ("boots", 2, 20)]
+
+
+def test_totals_overlapping_windows(tmp_path):
+    store = Store(path=str(tmp_path / "seoman.db"))
+    fill(store)
+
+    totals = sorted(
+        row for batch in store.totals("query", batch_size=1) for row in batch
+    )
+
+    assert totals == [("boots", 7, 70, 5.0), ("shoes", 70, 700, 3.0)]
+
+
+def test_top_without_daily_rows(tmp_path):
+    store = Store(path=str(tmp_path / "seoman.db"))
+    store.insert(SITE, body(DAYS[0], DAYS[-1]), rows(70, 700))
+
+    with pytest.raises(InvalidParameterError):
+        store.top("query")
+
+
+def test_top_tables_of_different_days(tmp_path):
+    store = Store(path=str(tmp_path / "seoman.db"))
+
+    def detailed(day):
+        return {**body(day, day), "dimensions": ["date", "query", "page"]}
+
+    # Three days with every dimension, a fourth one with the query alone.
+    for day in DAYS[:3]:
+        store.insert(
+            SITE,
+            detailed(day),
+            [{**row, "keys": [day, "shoes", "/shoes"]} for row in rows(10, 100)[:1]],
+        )
+    store.insert(SITE, body(DAYS[3], DAYS[3]), rows(10, 100)[:1])
+
+    _, top = store.top("query", site=SITE)
+    assert [row[:3] for row in top] == [("shoes", 40, 400)]
+
+    # Days stored in both tables are read from the one with fewer dimensions.
+    store.insert(SITE, body(DAYS[0], DAYS[0]), rows(10, 100)[:1])
+    _, top = store.top("query", site=SITE)
+    assert [row[:3] for row in top] == [("shoes", 40, 400)]
+
+    totals = [row for batch in store.totals("page", site=SITE) for row in batch]
+    assert totals == [("/shoes", 30, 300, 3.0)]
+
+
+def test_partition_complete_after_every_page(tmp_path):
+    store = Store(path=str(tmp_path / "seoman.db"))
+    day = DAYS[0]
+    first, second = (
+        {**body(day, day), "rowLimit": 2},
+        {**body(day, day), "rowLimit": 2, "startRow": 2},
+    )
+
+    # The first page failed, the short second page does not complete the day.
+    store.insert(SITE, second, rows(10, 100)[:1])
+    assert store.complete_dates(SITE, first) == set()
+
+    store.insert(SITE, first, rows(10, 100))
+    assert store.complete_dates(SITE, first) == set()
+
+    store.insert(SITE, second, rows(10, 100)[:1])
+    assert store.complete_dates(SITE, first) == {day}
+
+    # A window that fits in its first page is complete at once.
+    store.insert(SITE, body(DAYS[1], DAYS[1]), rows(10, 100))
+    assert store.complete_dates(SITE, first) == {day, DAYS[1]}
@@ -0,0 +1,66 @@
+import pytest  # type: ignore
+
+from seoman.exceptions import InvalidParameterError
+from seoman.utils.derived_utils import DERIVED_METRICS, DerivedRows
+
+pytest.importorskip("numpy")
+
+
+def row(query, page, clicks, impressions, position):
+    return {
+        "keys": [query, page],
+        "clicks": clicks,
+        "impressions": impressions,
+        "ctr": clicks / impressions,
+        "position": position,
+    }
+
+
+class Pages:
+    """
+    Pages that can be read again, with fresh rows every time like spilled ones.
+    """
+
+    def __init__(self, pages):
+        self.pages = pages
+
+    def __iter__(self):
+        for page in self.pages:
+            yield [dict(item) for item in page]
+
+    def __len__(self):
+        return len(self.pages)
+
+
+def test_derived_metrics_over_pages():
+    pages = Pages(
+        [
+            [row("a", "/x", 6, 20, 2.0), row("b", "/y", 2, 20, 12.0)],
+            [],
+            [row("c", "/x", 2, 40, 60.0)],
+        ]
+    )
+
+    derived = DerivedRows(pages, ["query", "page"], DERIVED_METRICS)
+    rows = [item for page in derived for item in page]
+
+    assert [item["positionBucket"] for item in rows] == ["1-3", "11-20", "50+"]
+    assert [item["clickShare"] for item in rows] == [0.6, 0.2, 0.2]
+    assert [item["pageClickShare"] for item in rows] == [0.75, 1.0, 0.25]
+    assert [round(item["ctrDelta"], 3) for item in rows] == [0.175, -0.025, -0.075]
+    assert len(derived) == 3
+
+
+def test_without_clicks():
+    derived = DerivedRows(
+        Pages([[row("a", "/x", 0, 10, 1.0)]]), ["query", "page"], DERIVED_METRICS
+    )
+
+    (item,) = next(iter(derived))
+    assert item["clickShare"] == 0.0
+    assert item["pageClickShare"] == 0.0
+
+
+def test_page_click_share_needs_page():
+    with pytest.raises(InvalidParameterError):
+        DerivedRows(Pages([]), ["query"], ["pageClickShare"])
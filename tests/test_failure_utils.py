@@ -0,0 +1,44 @@
+import multiprocessing
+
+from seoman.utils.failure_utils import DeadLetters
+
+
+def add(path, site):
+    dead_letters = DeadLetters(path=path)
+    for day in range(1, 26):
+        body = {"startDate": f"2020-03-{day:02}", "endDate": f"2020-03-{day:02}"}
+        dead_letters.add(site=site, query="backfill", failures=[(body, None)])
+
+
+def test_processes_add_dead_letters(tmp_path):
+    path = str(tmp_path / "dead_letters.json")
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=add, args=(path, f"sc-domain:{idx}.com"))
+        for idx in range(4)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+
+    entries = DeadLetters(path=path).entries()
+    assert len(entries) == 100
+    assert len({entry["id"] for entry in entries}) == 100
+
+
+def test_remove(tmp_path):
+    dead_letters = DeadLetters(path=str(tmp_path / "dead_letters.json"))
+    dead_letters.add(
+        site="sc-domain:example.com",
+        query="manual",
+        failures=[
+            ({"startDate": "2020-03-01"}, ValueError("Backend  Error")),
+            ({}, None),
+        ],
+    )
+    first, second = dead_letters.entries()
+    assert first["error"] == "Backend Error"
+
+    dead_letters.remove([first["id"]])
+    assert dead_letters.entries() == [second]
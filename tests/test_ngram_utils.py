@@ -0,0 +1,80 @@
+import pytest  # type: ignore
+
+from seoman.exceptions import InvalidParameterError
+from seoman.utils.db_utils import Store
+from seoman.utils.ngram_utils import NgramCounter, query_ngrams, tokenize
+
+SITE = "sc-domain:example.com"
+
+
+def body(start, end):
+    return {
+        "startDate": start,
+        "endDate": end,
+        "dimensions": ["query"],
+        "rowLimit": 25000,
+    }
+
+
+def row(query, clicks, impressions, position):
+    return {
+        "keys": [query],
+        "clicks": clicks,
+        "impressions": impressions,
+        "ctr": clicks / impressions,
+        "position": position,
+    }
+
+
+def test_query_ngrams():
+    tokens = tokenize("Red shoes, red SHOES!")
+
+    assert tokens == ["red", "shoes", "red", "shoes"]
+    assert query_ngrams(tokens, [1, 2]) == [
+        (1, "red"),
+        (1, "shoes"),
+        (2, "red shoes"),
+        (2, "shoes red"),
+    ]
+
+
+def test_ngrams_overlapping_windows(tmp_path):
+    store = Store(path=str(tmp_path / "seoman.db"))
+    for day in ["2020-03-01", "2020-03-02"]:
+        store.insert(
+            SITE,
+            body(day, day),
+            [row("red shoes", 10, 100, 2.0), row("blue shoes", 5, 100, 4.0)],
+        )
+    # The same days again as one window, they must not be counted twice.
+    store.insert(
+        SITE,
+        body("2020-03-01", "2020-03-02"),
+        [row("red shoes", 20, 200, 2.0), row("blue shoes", 10, 200, 4.0)],
+    )
+
+    counter = NgramCounter(sizes=[1, 2], max_keys=2)
+    for batch in store.totals("query", batch_size=1):
+        counter.update(batch)
+    top = counter.top(limit=2)
+
+    assert counter.queries == 2
+    assert [(row["ngram"], row["clicks"], row["impressions"]) for row in top[1]] == [
+        ("shoes", 30, 400),
+        ("red", 20, 200),
+    ]
+    assert top[1][0]["queries"] == 2
+    assert top[1][0]["position"] == pytest.approx(3.0)
+    assert [(row["ngram"], row["clicks"]) for row in top[2]] == [
+        ("red shoes", 20),
+        ("blue shoes", 10),
+    ]
+
+
+@pytest.mark.parametrize("limit", [0, -1])
+def test_top_limit(limit):
+    counter = NgramCounter(sizes=[1])
+    counter.update([("red shoes", 1, 10, 1.0)])
+
+    with pytest.raises(InvalidParameterError):
+        counter.top(limit=limit)
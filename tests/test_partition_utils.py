@@ -0,0 +1,102 @@
+import csv
+import json
+
+import pytest  # type: ignore
+
+from seoman.utils.partition_utils import PartitionedWriter, query_key
+
+SITE = "sc-domain:example.com"
+
+
+def body(start, end, **extra):
+    return {
+        "startDate": start,
+        "endDate": end,
+        "dimensions": ["query", "date"],
+        "rowLimit": 2,
+        **extra,
+    }
+
+
+def rows(day, count=2):
+    return [
+        {
+            "keys": [f"query-{idx}", day],
+            "clicks": idx,
+            "impressions": 10,
+            "ctr": idx / 10,
+            "position": 1.5,
+        }
+        for idx in range(count)
+    ]
+
+
+def test_layout(tmp_path):
+    writer = PartitionedWriter(str(tmp_path), file_format="csv")
+
+    daily = writer.write(SITE, body("2020-03-01", "2020-03-01"), rows("2020-03-01"))
+    weekly = writer.write(SITE, body("2020-03-01", "2020-03-07"), rows("2020-03-02"))
+    images = writer.write(
+        SITE, body("2020-03-01", "2020-03-01", searchType="image"), rows("2020-03-01")
+    )
+
+    key = query_key(body("2020-03-01", "2020-03-01"))
+    assert daily.relative_to(tmp_path).parts == (
+        f"query={key}",
+        "site=sc-domain%3Aexample.com",
+        "start_date=2020-03-01",
+        "end_date=2020-03-01",
+    )
+    assert weekly.parent.parent == daily.parent.parent
+    # Another search type is another query, even for the same site and day.
+    assert images.parts[-4] != daily.parts[-4]
+
+    with open(tmp_path / f"query={key}" / "_query.json") as file:
+        assert json.load(file)["dimensions"] == ["date", "query"]
+
+    for partition in [daily, weekly]:
+        with open(partition / "part-0.csv") as file:
+            assert next(csv.reader(file)) == [
+                "date",
+                "query",
+                "clicks",
+                "impressions",
+                "ctr",
+                "position",
+            ]
+
+
+def test_pages_and_rewrites(tmp_path):
+    writer = PartitionedWriter(str(tmp_path), file_format="csv")
+    first = body("2020-03-01", "2020-03-01")
+
+    writer.write(SITE, first, rows("2020-03-01"))
+    partition = writer.write(SITE, {**first, "startRow": 2}, rows("2020-03-01", 1))
+    assert sorted(path.name for path in partition.iterdir()) == [
+        "part-0.csv",
+        "part-1.csv",
+    ]
+
+    # A new run of the window replaces its pages.
+    writer.write(SITE, first, rows("2020-03-01", 1))
+    assert [path.name for path in partition.iterdir()] == ["part-0.csv"]
+    assert writer.partitions == 2
+
+
+def test_parquet_dataset(tmp_path):
+    dataset = pytest.importorskip("pyarrow.dataset")
+
+    writer = PartitionedWriter(str(tmp_path))
+    for day in ["2020-03-01", "2020-03-02"]:
+        writer.write(SITE, body(day, day), rows(day))
+    writer.write(SITE, body("2020-03-01", "2020-03-07"), rows("2020-03-03"))
+
+    table = dataset.dataset(str(tmp_path), partitioning="hive").to_table()
+
+    assert table.num_rows == 6
+    assert set(table.column("end_date").to_pylist()) == {
+        "2020-03-01",
+        "2020-03-02",
+        "2020-03-07",
+    }
+    assert table.column_names[:2] == ["date", "query"]
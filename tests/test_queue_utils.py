@@ -0,0 +1,100 @@
+import multiprocessing
+from collections import Counter
+
+from seoman.utils.queue_utils import WorkQueue
+
+SITES = ["sc-domain:a.com", "sc-domain:b.com"]
+DAYS = [f"2020-03-{day:02}" for day in range(1, 11)]
+
+
+def tasks():
+    return [
+        (
+            -idx,
+            site,
+            {"startDate": day, "endDate": day, "startRow": 0, "rowLimit": 25000},
+        )
+        for idx, day in enumerate(DAYS)
+        for site in SITES
+    ]
+
+
+def test_publish_skips_queued_tasks(tmp_path):
+    queue = WorkQueue(path=str(tmp_path / "queue.db"), max_attempts=1)
+
+    assert queue.publish(tasks()) == 20
+    assert queue.publish(tasks()) == 0
+
+    task = queue.lease("worker")[0]
+    assert queue.fail(task, "worker", "error")
+    assert queue.counts()["failed"] == 1
+
+    # Failed tasks are given back to the queue when published again.
+    assert queue.publish(tasks()) == 1
+    assert queue.counts() == {"pending": 20, "leased": 0, "done": 0, "failed": 0}
+
+
+def test_lost_lease(tmp_path):
+    queue = WorkQueue(path=str(tmp_path / "queue.db"), lease_seconds=0, max_attempts=1)
+    queue.publish(tasks()[:1])
+
+    task = queue.lease("first")[0]
+    # Its lease ran out max_attempts times, the next worker reports it.
+    assert queue.lease("second") == []
+    assert queue.expired == [task._replace(attempts=1)]
+    assert queue.counts()["failed"] == 1
+
+    assert not queue.fail(task, "first", "error")
+    assert not queue.complete(task, "first")
+
+
+def work(queue_path, base_url, database, dead_letters):
+    import seoman.main  # noqa: F401
+    from seoman.service import SearchAnalytics
+    from seoman.utils.db_utils import Store
+    from seoman.utils.failure_utils import DeadLetters
+    from seoman.utils.transport_utils import AsyncTransport
+
+    service = SearchAnalytics(None, credentials=None)
+    service.store = Store(path=database)
+    service.dead_letters = DeadLetters(path=dead_letters)
+    service.transport = AsyncTransport(base_url=base_url, concurrency=2)
+    service.work(WorkQueue(path=queue_path), workers=2, wait=0.1)
+
+
+def test_workers_share_queue(tmp_path):
+    from benchmarks.fake_service import FakeService
+    from benchmarks.stub_server import StubServer
+    from seoman.utils.db_utils import Store
+
+    queue_path = str(tmp_path / "queue.db")
+    database = str(tmp_path / "seoman.db")
+    WorkQueue(path=queue_path).publish(tasks())
+
+    context = multiprocessing.get_context("spawn")
+    with StubServer(FakeService(page_size=10), latency=0.05) as stub:
+        processes = [
+            context.Process(
+                target=work,
+                args=(queue_path, stub.base_url, database, str(tmp_path / "dead.json")),
+            )
+            for _ in range(3)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(60)
+
+    assert [process.exitcode for process in processes] == [0, 0, 0]
+    queue = WorkQueue(path=queue_path)
+    assert queue.counts()["done"] == 20
+    workers = queue.connection.execute("SELECT DISTINCT worker FROM tasks").fetchall()
+    assert len(workers) > 1
+
+    fetched = Counter((site, body["startDate"]) for site, body, _ in stub.requests)
+    assert len(fetched) == 20
+    assert set(fetched.values()) == {1}
+
+    store = Store(path=database)
+    for site in SITES:
+        assert store.complete_dates(site, tasks()[0][2]) == set(DAYS)
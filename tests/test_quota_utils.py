@@ -0,0 +1,63 @@
+import asyncio
+import sqlite3
+import threading
+
+from seoman.utils.quota_utils import ACTIVE_SECONDS, QuotaManager
+
+SITE = "sc-domain:example.com"
+
+
+def test_reserve_within_rate(tmp_path):
+    quota = QuotaManager(path=str(tmp_path / "quota.db"), site_qpm=600, burst=2)
+
+    waits = [quota.acquire(SITE) for _ in range(4)]
+
+    # Two slots of the burst, then one every 0.1 seconds.
+    assert waits[:2] == [0.0, 0.0]
+    assert 0.05 < sum(waits) < 0.5
+
+
+def test_prune_stopped_processes(tmp_path):
+    path = str(tmp_path / "quota.db")
+    first = QuotaManager(path=path)
+    first.pid = "1"
+    first.acquire(SITE)
+    first.connection.execute("UPDATE clients SET seen = seen - ?", (ACTIVE_SECONDS,))
+
+    second = QuotaManager(path=path)
+    second.pid = "2"
+    second.acquire(SITE)
+
+    buckets = {
+        name for (name,) in second.connection.execute("SELECT name FROM buckets")
+    }
+    assert f"site:{SITE}:1" not in buckets
+    assert f"site:{SITE}:2" in buckets
+    assert second.connection.execute("SELECT pid FROM clients").fetchall() == [("2",)]
+
+
+def test_acquire_async_does_not_block_the_loop(tmp_path):
+    path = str(tmp_path / "quota.db")
+    quota = QuotaManager(path=path)
+
+    # Another process holds the file lock for a while.
+    other = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    other.execute("BEGIN IMMEDIATE")
+    threading.Timer(0.3, lambda: other.execute("COMMIT")).start()
+
+    async def main():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.ensure_future(tick())
+        await quota.acquire_async(SITE)
+        ticker.cancel()
+        return ticks
+
+    assert asyncio.run(main()) > 10
+    quota.close()
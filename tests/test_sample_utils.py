@@ -0,0 +1,44 @@
+from seoman.utils.sample_utils import WindowSample
+
+
+def bodies(days):
+    return [
+        {
+            "startDate": f"2020-03-{day:02}",
+            "endDate": f"2020-03-{day:02}",
+            "rowLimit": 2,
+        }
+        for day in range(1, days + 1)
+    ]
+
+
+def rows(count):
+    return [{"clicks": 1, "impressions": 10, "position": 1.0}] * count
+
+
+def test_complete_windows():
+    sample = WindowSample(bodies(14), fraction=1)
+    for body in sample.selected:
+        sample.record(body, rows(1))
+
+    estimates = sample.estimate()
+    assert estimates["clicks"] == 14
+    assert not estimates["lowerBound"]
+
+
+def test_cut_windows_are_lower_bounds():
+    sample = WindowSample(bodies(14), fraction=1)
+    first, *others = sample.selected
+
+    sample.record(first, rows(2))
+    for body in others:
+        sample.record(body, rows(1))
+    estimates = sample.estimate()
+    assert estimates["truncated_windows"] == 1
+    assert estimates["lowerBound"]
+
+    # The next page of the window was fetched and came back short.
+    sample.record({**first, "startRow": 2}, rows(1))
+    estimates = sample.estimate()
+    assert estimates["truncated_windows"] == 0
+    assert estimates["clicks"] == 16
@@ -0,0 +1,112 @@
+import typer  # type: ignore
+
+from benchmarks.fake_service import FakeService
+from seoman.service import SearchAnalytics
+from seoman.utils.db_utils import Store
+
+SITE = "sc-domain:example.com"
+
+
+class WindowService(FakeService):
+    """
+    A window of a fixed number of distinct rows, paged by startRow and rowLimit.
+    """
+
+    def __init__(self, rows: int) -> None:
+        super().__init__()
+        self.rows = rows
+
+    def page(self, body):
+        end = min(body["startRow"] + body["rowLimit"], self.rows)
+        return {
+            "rows": [
+                {
+                    "keys": [f"query-{idx}"],
+                    "clicks": 1,
+                    "impressions": 10,
+                    "ctr": 0.1,
+                    "position": 1.0,
+                }
+                for idx in range(body["startRow"], end)
+            ]
+        }
+
+
+def service(tmp_path, rows):
+    service = SearchAnalytics(WindowService(rows=rows), credentials=None)
+    service.store = Store(path=str(tmp_path / "seoman.db"))
+    service.dead_letters.path = tmp_path / "dead_letters.json"
+    service.update_body(
+        {"startDate": "2020-03-01", "endDate": "2020-03-01", "dimensions": ["query"]}
+    )
+    return service
+
+
+def test_second_page_stored_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(typer, "confirm", lambda *args, **kwargs: True)
+    fetched = service(tmp_path, rows=30000)
+
+    fetched.concurrent_query_asyncio(url=SITE, single_window=True)
+
+    assert sum(len(page) for page in fetched.data["rows"]) == 30000
+    _, counts = fetched.store.sql(
+        "SELECT COUNT(*), COUNT(DISTINCT query), SUM(clicks) FROM rows_query"
+    )
+    assert counts == [(30000, 30000, 30000)]
+
+
+class UnreachableService(WindowService):
+    """
+    A service whose host can not be resolved, like googleapiclient offline.
+    """
+
+    def page(self, body):
+        from httplib2 import ServerNotFoundError  # type: ignore
+
+        raise ServerNotFoundError("Unable to find the server at www.googleapis.com")
+
+
+def test_connection_errors_reach_dead_letters(tmp_path, monkeypatch):
+    import asyncio
+
+    async def no_sleep(delay):
+        pass
+
+    monkeypatch.setattr(asyncio, "sleep", no_sleep)
+    unreachable = service(tmp_path, rows=0)
+    unreachable.service = UnreachableService(rows=0)
+
+    unreachable.concurrent_query_asyncio(url=SITE, single_window=True)
+
+    assert len(unreachable.failed) == 1
+    [entry] = unreachable.dead_letters.entries()
+    assert entry["site"] == SITE
+    assert "Unable to find the server" in entry["error"]
+    # Retried into the store it was fetched for.
+    assert entry["database"] == str(tmp_path / "seoman.db")
+
+
+def test_pipeline_waits_outside_the_loop(tmp_path, monkeypatch):
+    import threading
+
+    from seoman.utils.pipeline_utils import Pipeline
+
+    threads = []
+
+    class Recorded(Pipeline):
+        def append(self, page):
+            threads.append(threading.current_thread())
+            super().append(page)
+
+    monkeypatch.setattr(typer, "confirm", lambda *args, **kwargs: True)
+    fetched = service(tmp_path, rows=30000)
+    filename = tmp_path / "rows.csv"
+    fetched.data["rows"] = Recorded(str(filename), "csv", workers=1, queue_size=1)
+
+    fetched.concurrent_query_asyncio(url=SITE, single_window=True)
+    fetched.data["rows"].close()
+
+    assert threads and threading.main_thread() not in threads
+    lines = filename.read_text().splitlines()
+    assert lines[1].startswith("query-0,") and lines[-1].startswith("query-29999,")
+    assert len(lines) == 30001
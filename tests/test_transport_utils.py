@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest  # type: ignore
+from googleapiclient.errors import HttpError  # type: ignore
+
+from benchmarks.fake_service import FakeService
+from benchmarks.stub_server import StubServer
+from seoman.utils.transport_utils import AsyncTransport, ProtocolError
+
+SITE = "sc-domain:example.com"
+BODY = {"startDate": "2020-03-01", "endDate": "2020-03-01", "dimensions": ["query"]}
+
+
+def query(stub, count=1, concurrency=1):
+    transport = AsyncTransport(base_url=stub.base_url, concurrency=concurrency)
+
+    async def main():
+        try:
+            pages = []
+            for _ in range(count):
+                pages.append(await transport.query(SITE, BODY))
+            return pages
+        finally:
+            await transport.aclose()
+
+    return asyncio.run(main())
+
+
+@pytest.mark.parametrize("framing", StubServer.FRAMINGS)
+def test_framing(framing):
+    fake = FakeService(page_size=200, pool_size=1)
+
+    with StubServer(fake, framing=framing) as stub:
+        pages = query(stub, count=3)
+
+    assert pages == [fake.page(BODY)] * 3
+    assert [body for _, body, _ in stub.requests] == [BODY] * 3
+    # Connections are only kept when the length of the response is known.
+    reused = framing in ["content-length", "chunked"]
+    assert stub.connections == (1 if reused else 3)
+
+
+def test_stale_keep_alive():
+    with StubServer(FakeService(page_size=10), drop_reused=True) as stub:
+        pages = query(stub, count=3)
+
+    assert len(pages) == 3
+    # Every second request found its connection closed and was sent again.
+    assert stub.dropped == 2
+    assert len(stub.requests) == 3
+
+
+@pytest.mark.parametrize("status", [400, 403, 429, 500, 503])
+def test_error_status(status):
+    with StubServer(FakeService(page_size=10), error_statuses=[status]) as stub:
+        with pytest.raises(HttpError) as error:
+            query(stub)
+
+    assert error.value.resp.status == status
+    assert b"Stub error" in error.value.content
+
+
+@pytest.mark.parametrize(
+    "raw",
+    [
+        b"garbage\r\n\r\n",
+        b"HTTP/1.1\r\n\r\n",
+        b"HTTP/1.1 OK 200\r\n\r\n",
+        b"HTTP/1.1 200 OK\r\nContent-Length: ten\r\n\r\n",
+        b"HTTP/1.1 200 OK\r\nContent-Length: 10\r\n\r\n{}",
+        b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\nzz\r\n{}\r\n",
+        b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n1\r\n{}\r\n0\r\n\r\n",
+    ],
+)
+def test_malformed_response(raw):
+    with StubServer(FakeService(page_size=10), raw_responses=[raw]) as stub:
+        with pytest.raises(ProtocolError):
+            query(stub)